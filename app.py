@@ -1,15 +1,34 @@
-from flask import Flask, jsonify, send_from_directory, request,render_template
-import requests
+from flask import Flask, Request, Response, jsonify, request,render_template
 import os
 from pathlib import Path
 import pymysql
-import json, hashlib
+import json, hashlib, hmac
+import atexit
+import tempfile
+import threading
+import time
+import uuid
+from functools import partial, wraps
+from concurrent.futures import BrokenExecutor, TimeoutError as InferenceTimeout
 from datetime import date, timedelta
 from datetime import datetime, timezone
-from math import sin, pi
-from werkzeug.security import generate_password_hash, check_password_hash
-from werkzeug.utils import secure_filename  # you use this in /pest-detect
 from flask import session, redirect,abort, url_for  # you already import request above
+from pymysql.constants import CLIENT
+from db_pool import ConnectionPool
+import wallet
+import metrics
+from catalog import JsonCatalog, build_tasks, task_id
+import plants
+from cache import LRUCache, seconds_until_midnight
+from lunar import local_moon, day_noon_utc, calendar as lunar_calendar, phase_codes, PHASE_NAMES
+from upstream import CircuitBreaker, SWRCache, http_session
+from chat_store import ChatWriter, history_page
+from chat_engine import StreamStats, count_tokens, load_generator
+from passwords import Hasher, Saturated
+from leaderboard import WeeklyBoard, streak_view, week_bounds
+from assets import AssetStore
+from media import ImageDerivatives
+import stickers
 
 
 
@@ -20,9 +39,38 @@ DB = {
     "password": "",        
     "database": "bloom_garden",
     "cursorclass": pymysql.cursors.DictCursor,
-    "autocommit": True
+    "autocommit": True,
 }
-def db(): return pymysql.connect(**DB)
+
+# wallet.py sends each reward/purchase transaction as one multi-statement
+# batch. Only the batch pool's connections accept that; everything else
+# stays single-statement, so a "; ..." slipped into SQL can't stack.
+DB_BATCH = dict(DB, client_flag=CLIENT.MULTI_STATEMENTS)
+
+# Pooled connections: `with db() as con` checks a connection out and hands
+# it back on exit instead of closing it. Sizes are tunable from the env.
+DB_POOL = ConnectionPool(
+    lambda: pymysql.connect(**DB),
+    min_size=int(os.getenv("DB_POOL_MIN", "1")),
+    max_size=int(os.getenv("DB_POOL_MAX", "10")),
+    timeout=float(os.getenv("DB_POOL_TIMEOUT", "5")),
+    idle_timeout=float(os.getenv("DB_POOL_IDLE", "300")),
+)
+DB_BATCH_POOL = ConnectionPool(
+    lambda: pymysql.connect(**DB_BATCH),
+    min_size=0,
+    max_size=int(os.getenv("DB_BATCH_POOL_MAX", "5")),
+    timeout=float(os.getenv("DB_POOL_TIMEOUT", "5")),
+    idle_timeout=float(os.getenv("DB_POOL_IDLE", "300")),
+)
+# Checkout and every query are timed; see metrics.py
+def db(): return metrics.traced(DB_POOL.connection())
+def batch_db(): return metrics.traced(DB_BATCH_POOL.connection())
+
+metrics.Gauge("db_pool_connections", "Open pooled DB connections.", ("pool", "state"),
+              lambda: {(name, k): v
+                       for name, pool in (("default", DB_POOL), ("batch", DB_BATCH_POOL))
+                       for k, v in pool.stats().items() if k in ("in_use", "idle")})
 
 
 # --------------------------------------------------------------------
@@ -33,13 +81,39 @@ TEMPLATE_DIR = BASE_DIR / "template"
 STATIC_DIR   = BASE_DIR / "static"   
 DATA_DIR    = STATIC_DIR / "data" 
 TASKS_PATH  = DATA_DIR/ "tasks.json"
-STICKERS_DIR = DATA_DIR / "stickers"
-STICKERS_PATH = STICKERS_DIR / "stickers.json"
+STICKERS_PATH = DATA_DIR / "stickers.json"
+PLANTS_PATH = DATA_DIR / "indoor_plants.json"
+
+# Parsed once, re-parsed only when the file changes; see catalog.py
+TASKS    = JsonCatalog(TASKS_PATH, build_tasks)
+STICKERS = JsonCatalog(STICKERS_PATH, partial(stickers.build_index, static_dir=STATIC_DIR))
+PLANTS   = JsonCatalog(PLANTS_PATH, plants.build_index)
+
+# Hashed + precompressed static/ and template/ files; see assets.py.
+# Built lazily per file; `python assets.py` prebuilds at deploy time.
+ASSETS = AssetStore({"static": STATIC_DIR, "template": TEMPLATE_DIR},
+                    BASE_DIR / ".build" / "assets")
+
+# Thumbnails (WebP + PNG, content-hashed names) for images shown small;
+# see media.py. `python stickers.py` prebuilds the sticker set.
+MEDIA = {
+    "stickers": ImageDerivatives(STATIC_DIR, BASE_DIR / ".build" / "media" / "stickers",
+                                 "/media/stickers", widths=(96, 192, 384)),
+    "plants": ImageDerivatives(STATIC_DIR, BASE_DIR / ".build" / "media" / "plants",
+                               "/media/plants", widths=plants.IMAGE_WIDTHS,
+                               formats=("webp",), lqip_width=plants.LQIP_WIDTH),
+}
 
 DAILY_MOON_BONUS = 2
-app = Flask(__name__, static_folder="static")  
+# static_folder=None: Flask's own /static rule would shadow static_files()
+app = Flask(__name__, static_folder=None)
 app.secret_key = os.getenv("SECRET_KEY", "dev-change-me")
 
+# Route latency histograms for /metrics; SLOW_REQUEST_MS=500 also prints
+# the db/upstream breakdown of every request slower than that.
+SLOW_REQUEST_MS = os.getenv("SLOW_REQUEST_MS")
+metrics.install(app, slow_ms=float(SLOW_REQUEST_MS) if SLOW_REQUEST_MS else None)
+
 # Load key from env (safer) or fallback for testing
 IPGEO_KEY = os.getenv("IPGEO_KEY", "23f93f8fd38e4ba3ba47396b69dc3398")
 OPENWEATHER_KEY = os.getenv("OPENWEATHER_KEY")  # no fallback here on purpose
@@ -50,96 +124,377 @@ def get_user_id():
     return session.get('user_id')
 
 
+# /metrics and the /api/*/stats endpoints expose internals (pool sizes,
+# breaker state, queue depths): only for requests carrying
+# "Authorization: Bearer $METRICS_TOKEN". Without METRICS_TOKEN they are off.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+def internal_only(view):
+    @wraps(view)
+    def _wrap(*args, **kwargs):
+        given = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+        if not METRICS_TOKEN or not hmac.compare_digest(given.encode(), METRICS_TOKEN.encode()):
+            abort(404)
+        return view(*args, **kwargs)
+    return _wrap
+
+
+# Pool sizing: in-use/idle counts, waits and checkout latency
+@app.get("/api/db/pool")
+@internal_only
+def db_pool_stats():
+    return jsonify({"default": DB_POOL.stats(), "batch": DB_BATCH_POOL.stats()})
+
+# Prometheus scrape target: request/DB/upstream/JSON-load histograms
+@app.get("/metrics")
+@internal_only
+def metrics_endpoint():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
 # Lunar notice page
 @app.route("/notice")
 @app.route("/notice.html")
 def notice():
-    return send_from_directory(TEMPLATE_DIR, "notice.html")
+    return ASSETS.send("template", "notice.html")
 
 # --------------------------------------------------------------------
 # API: Moon data
 # --------------------------------------------------------------------
+# Upstream is only a nicety: the phase is computed locally anyway. Cache per
+# UTC date, refresh stale entries in the background, and stop calling it
+# for a while after repeated failures.
+IPGEO_URL   = os.getenv("IPGEO_URL", "https://api.ipgeolocation.io/astronomy")
+MOON_TTL    = float(os.getenv("MOON_TTL", "3600"))
+MOON_STALE  = float(os.getenv("MOON_STALE", "86400"))
+MOON_LATLON = (16.8409, 96.1735)  # Yangon (location isn’t critical for phase)
+
+# one keep-alive pool for all third-party calls (moon, weather)
+HTTP = http_session(pool_maxsize=int(os.getenv("UPSTREAM_POOL", "16")))
+
+def _fetch_moon_upstream(day):
+    """ipgeolocation astronomy for `day` (ISO string) → normalized dict. Raises on failure."""
+    lat, lon = MOON_LATLON
+    with metrics.upstream("moon"):
+        res = HTTP.get(IPGEO_URL, timeout=2, params={
+            "apiKey": IPGEO_KEY, "lat": lat, "long": lon, "date": day,
+        })
+        res.raise_for_status()
+    data = res.json()
+
+    # Phase string straight through
+    phase = data.get("moon_phase") or data.get("phase") or "Unknown"
+
+    # Illumination may come as "57" or "57.3" or as 0..1 fraction on some APIs
+    illum_raw = (
+        data.get("moon_illumination") or
+        data.get("illumination") or
+        data.get("moon_illumination_fraction")
+    )
+    illum_pct = None
+    if illum_raw is not None:
+        try:
+            f = float(illum_raw)
+            illum_pct = int(round(f if f > 1 else f * 100))
+        except Exception:
+            pass
+
+    if illum_pct is None or phase == "Unknown":
+        # use local values to fill any gaps
+        fallback = _local_moon_for(day)
+        phase = phase if phase != "Unknown" else fallback["phase"]
+        illum_pct = illum_pct if illum_pct is not None else fallback["illumination"]
+
+    return {"phase": phase, "illumination": int(illum_pct)}
+
+def _local_moon_for(day):
+    if day == datetime.now(timezone.utc).date().isoformat():
+        return local_moon()
+    return local_moon(day_noon_utc(date.fromisoformat(day)))
+
+MOON_CACHE = SWRCache(_fetch_moon_upstream, ttl=MOON_TTL, stale_ttl=MOON_STALE,
+                      breaker=CircuitBreaker(failures=3, reset_after=60))
+
 @app.route("/moon")
 def moon():
     """
     Returns: {"phase": <string>, "illumination": <int percent 0..100>}
-    - Tries ipgeolocation quickly (2s timeout).
+    - Optional ?date=YYYY-MM-DD (defaults to today, UTC).
+    - Served from MOON_CACHE; ipgeolocation is asked (2s timeout) only on
+      a cold miss or in the background once an entry goes stale.
     - Falls back to a precise local calculation so the UI never breaks.
     """
-    # --- helper: local, dependency-free moon calc ---
-    def local_moon():
-        # Reference epoch & synodic month length
-        ref = datetime(2001, 1, 1, tzinfo=timezone.utc)
-        synodic_days = 29.530588853  # mean synodic month
-        days = (datetime.now(timezone.utc) - ref).total_seconds() / 86400.0
-        phase = (days % synodic_days) / synodic_days  # 0..1 (0=new, 0.5=full)
-        # illum fraction ≈ sin^2(pi * phase)
-        illum_pct = int(round((sin(pi * phase) ** 2) * 100))
-
-        # Name buckets (kept flexible so your JS normalizePhase() still matches)
-        eps = 0.03  # ~0.9 day tolerance around the quarter phases
-        if phase < eps or phase > 1 - eps:
-            name = "New Moon"
-        elif abs(phase - 0.25) < eps:
-            name = "First Quarter"
-        elif abs(phase - 0.50) < eps:
-            name = "Full Moon"
-        elif abs(phase - 0.75) < eps:
-            name = "Last Quarter"
-        elif phase < 0.25:
-            name = "Waxing Crescent Moon"
-        elif phase < 0.50:
-            name = "Waxing Gibbous Moon"
-        elif phase < 0.75:
-            name = "Waning Gibbous Moon"
-        else:
-            name = "Waning Crescent Moon"
+    day = (request.args.get("date") or "").strip()
+    if day:
+        try:
+            day = date.fromisoformat(day).isoformat()
+        except ValueError:
+            return jsonify({"error": "date must be YYYY-MM-DD"}), 400
+    else:
+        day = datetime.now(timezone.utc).date().isoformat()
+
+    return jsonify(MOON_CACHE.get(day, _local_moon_for))
+
+
+# Phases for a whole date range in one call; memoized per range
+MOON_CALENDAR_MAX_DAYS = 3660
+_MOON_CALENDARS = LRUCache(maxsize=256)
+
+@app.get("/moon/calendar")
+def moon_calendar():
+    """
+    ?start=YYYY-MM-DD&end=YYYY-MM-DD (inclusive; default: today + 29 days)
+    Returns {"start", "end", "names": [...], "phase": [code per day], "illumination": [pct per day]}
+    where phase codes index into names.
+    """
+    try:
+        start = date.fromisoformat(request.args.get("start") or datetime.now(timezone.utc).date().isoformat())
+        end = date.fromisoformat(request.args["end"]) if request.args.get("end") else start + timedelta(days=29)
+    except ValueError:
+        return jsonify({"error": "start/end must be YYYY-MM-DD"}), 400
+    if end < start or (end - start).days >= MOON_CALENDAR_MAX_DAYS:
+        return jsonify({"error": f"need start <= end and at most {MOON_CALENDAR_MAX_DAYS} days"}), 400
+
+    key = (start, end)
+    out = _MOON_CALENDARS.get(key)
+    if out is None:
+        out = lunar_calendar(start, end)
+        _MOON_CALENDARS.set(key, out)
+    resp = jsonify(out)
+    # pure function of the range
+    resp.headers["Cache-Control"] = "public, max-age=86400"
+    return resp
+
 
-        return {"phase": name, "illumination": illum_pct}
+# --------------------------------------------------------------------
+# API: Plant catalog search (indexes are rebuilt only when the file changes)
+# --------------------------------------------------------------------
+def _arg_bool(name):
+    v = (request.args.get(name) or "").strip().lower()
+    if v in ("1", "true", "yes"):
+        return True
+    if v in ("0", "false", "no"):
+        return False
+    return None
 
-    # --- fast attempt: ipgeolocation (if available), then normalize ---
+def _arg_phase(name):
+    """Phase label -> single code, or None. Broad labels ("waxing") are ambiguous."""
+    codes = phase_codes(request.args.get(name))
+    return next(iter(codes)) if len(codes) == 1 else None
+
+@app.get("/api/plants")
+def api_plants():
+    """
+    ?category=&indoor=&edible=&growing=&resting=&q=&page=&per_page=
+    growing/resting take a phase label ("Full Moon", "waxing_gibbous").
+    Returns {"total", "page", "per_page", "items": [lean plant...]}; each
+    item's "media" holds its WebP srcset + LQIP (null until built).
+    """
+    view = PLANTS.get()
+    for name in ("growing", "resting"):
+        if request.args.get(name) and _arg_phase(name) is None:
+            return jsonify({"error": f"unknown {name} phase"}), 400
     try:
-        lat, lon = 16.8409, 96.1735  # Yangon (location isn’t critical for phase)
-        url = f"https://api.ipgeolocation.io/astronomy?apiKey={IPGEO_KEY}&lat={lat}&long={lon}"
-        res = requests.get(url, timeout=2)
-        res.raise_for_status()
-        data = res.json()
+        page = max(1, int(request.args.get("page", 1)))
+        per_page = min(100, max(1, int(request.args.get("per_page", 20))))
+    except ValueError:
+        return jsonify({"error": "page/per_page must be integers"}), 400
+
+    hits = plants.search(
+        view,
+        category=request.args.get("category"),
+        indoor=_arg_bool("indoor"),
+        edible=_arg_bool("edible"),
+        growing=_arg_phase("growing"),
+        resting=_arg_phase("resting"),
+        q=request.args.get("q"),
+    )
+    items = view["items"]
+    page_hits = hits[(page - 1) * per_page: page * per_page]
+    return jsonify({
+        "total": len(hits),
+        "page": page,
+        "per_page": per_page,
+        "items": [dict(plants.lean(items[i]), media=plants.media(items[i], MEDIA["plants"]))
+                  for i in page_hits],
+    })
 
-        # Phase string straight through
-        phase = data.get("moon_phase") or data.get("phase") or "Unknown"
+@app.get("/api/recommendations")
+def api_recommendations():
+    """
+    ?date=YYYY-MM-DD (default today, UTC) &type=edible|ornamental|inedible
+    Lunar phase for the date (cached, see /moon) + the precomputed plant
+    buckets for that phase: {"date", "phase", "illumination", "grow", "harvest", "rest", "neutral"}.
+    """
+    day = (request.args.get("date") or "").strip()
+    try:
+        day = date.fromisoformat(day).isoformat() if day else datetime.now(timezone.utc).date().isoformat()
+    except ValueError:
+        return jsonify({"error": "date must be YYYY-MM-DD"}), 400
+    kind = (request.args.get("type") or "").strip().lower()
+    flt = {"edible": "edible", "ornamental": "ornamental", "inedible": "ornamental"}.get(kind, "all")
+
+    moon = MOON_CACHE.get(day, _local_moon_for)
+    codes = phase_codes(moon.get("phase"))
+    if len(codes) != 1:
+        # upstream label we can't place on the 8-phase wheel: use the local one
+        moon = _local_moon_for(day)
+        codes = phase_codes(moon["phase"])
+    code = next(iter(codes))
+
+    buckets = PLANTS.get()["reco"][code][flt]
+    return jsonify({
+        "date": day,
+        "phase": PHASE_NAMES[code],
+        "illumination": moon.get("illumination"),
+        "type": flt,
+        **buckets,
+    })
 
-        # Illumination may come as "57" or "57.3" or as 0..1 fraction on some APIs
-        illum_raw = (
-            data.get("moon_illumination") or
-            data.get("illumination") or
-            data.get("moon_illumination_fraction")
-        )
-        illum_pct = None
-        if illum_raw is not None:
-            try:
-                f = float(illum_raw)
-                illum_pct = int(round(f if f > 1 else f * 100))
-            except Exception:
-                pass
-
-        if illum_pct is None or phase == "Unknown":
-            # use local values to fill any gaps
-            fallback = local_moon()
-            phase = phase if phase != "Unknown" else fallback["phase"]
-            illum_pct = illum_pct if illum_pct is not None else fallback["illumination"]
-
-        return jsonify({"phase": phase, "illumination": int(illum_pct)})
+@app.get("/api/plants/categories")
+def api_plant_categories():
+    return jsonify({"categories": [{"name": c, "count": n} for c, n in PLANTS.get()["categories"]]})
 
-    except Exception:
-        # Total fallback: dependency-free, guaranteed to work
-        return jsonify(local_moon())
+@app.get("/api/plants/<plant_id>")
+def api_plant(plant_id):
+    p = PLANTS.get()["by_id"].get(plant_id)
+    if not p:
+        return jsonify({"error": "not_found"}), 404
+    return jsonify(dict(p, media=plants.media(p, MEDIA["plants"])))
 
 
 # --------------------------------------------------------------------
 # Pest Detection
-UPLOAD_FOLDER = "uploads"
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
+#   Uploads never touch uploads/: werkzeug streams the multipart body in
+#   chunks into a SpooledTemporaryFile (RAM below PEST_SPOOL_BYTES, an
+#   anonymous temp file above), which is closed and gone when the request
+#   ends. Results are cached by the image's sha256.
+# --------------------------------------------------------------------
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(8 * 1024 * 1024)))
+PEST_SPOOL_BYTES = int(os.getenv("PEST_SPOOL_BYTES", str(1024 * 1024)))
+app.config["MAX_CONTENT_LENGTH"] = MAX_UPLOAD_BYTES
+
+class SpooledUploadRequest(Request):
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return tempfile.SpooledTemporaryFile(max_size=PEST_SPOOL_BYTES, mode="rb+")
+
+app.request_class = SpooledUploadRequest
+
+# sha256 -> result, so re-uploading the same photo skips inference
+PEST_RESULTS = LRUCache(maxsize=2048, ttl=24 * 3600)
+
+def _sha256_stream(stream, chunk_size=64 * 1024):
+    h = hashlib.sha256()
+    stream.seek(0)
+    for chunk in iter(lambda: stream.read(chunk_size), b""):
+        h.update(chunk)
+    stream.seek(0)
+    return h.hexdigest()
+
+# Inference runs in warm worker processes with micro-batching (pest_inference.py).
+# PEST_MODEL is "module:Class" of a PestModel; PEST_WORKERS=0 runs it in-process.
+PEST_MODEL   = os.getenv("PEST_MODEL", "pest_inference:ReferenceModel")
+PEST_WORKERS = int(os.getenv("PEST_WORKERS", "2"))
+_pest_engine = None
+_pest_engine_lock = threading.Lock()
+
+def get_pest_engine():
+    """The shared InferenceEngine, started on first use; None if numpy/Pillow are missing."""
+    global _pest_engine
+    if _pest_engine is None:
+        with _pest_engine_lock:
+            if _pest_engine is None:
+                try:
+                    from pest_inference import InferenceEngine
+                except ImportError as e:
+                    print("pest inference disabled:", e)
+                    _pest_engine = False
+                else:
+                    _pest_engine = InferenceEngine(
+                        PEST_MODEL, workers=PEST_WORKERS,
+                        max_batch=int(os.getenv("PEST_MAX_BATCH", "8")),
+                        window_ms=float(os.getenv("PEST_BATCH_WINDOW_MS", "10")))
+    return _pest_engine or None
+
+def _detect_pests(stream):
+    engine = get_pest_engine()
+    if engine is None:
+        # no inference deps installed: keep the old mock response
+        return {
+            "detected": True,
+            "pests": ["aphids", "spider mites"],
+            "recommendations": [
+                "Spray neem oil weekly",
+                "Introduce ladybugs to control aphids"
+            ]
+        }
+    return engine.predict(stream.read())
+
+def _size_label(n):
+    """8388608 -> "8 MB", 524288 -> "512 KB", 900 -> "900 bytes"."""
+    for unit, size in (("MB", 1024 * 1024), ("KB", 1024)):
+        if n >= size:
+            return f"{round(n / size, 1):g} {unit}"
+    return f"{n} bytes"
+
+@app.errorhandler(413)
+def too_large(e):
+    return jsonify({"error": f"File too large (max {_size_label(MAX_UPLOAD_BYTES)})"}), 413
+
+# Async mode: POST /pest-detect?async=1 answers 202 {"job_id"} right away and
+# the engine's future fills the job in; clients poll GET /pest-detect/<job_id>.
+# Jobs live in this process (sticky sessions if you run several workers).
+PEST_JOBS = LRUCache(maxsize=10000, ttl=3600)   # job_id -> job dict
+_pest_inflight = {}                              # sha256 -> job_id being computed
+_pest_jobs_lock = threading.Lock()
+
+def _job_view(job):
+    out = {"job_id": job["job_id"], "status": job["status"]}
+    if job["status"] == "done":
+        out["result"] = job["result"]
+    elif job["status"] == "error":
+        out["error"] = job["error"]
+    return out
+
+def _start_pest_job(digest, stream):
+    """New (or already running / cached) job for this image content."""
+    with _pest_jobs_lock:
+        running = _pest_inflight.get(digest)
+        job = PEST_JOBS.get(running) if running else None
+        if job:
+            return job
+
+        job = {"job_id": uuid.uuid4().hex, "status": "pending", "created": time.time()}
+        PEST_JOBS.set(job["job_id"], job)
+        cached = PEST_RESULTS.get(digest)
+        if cached is not None:
+            job.update(status="done", result=cached)
+            return job
+        _pest_inflight[digest] = job["job_id"]
+
+    def finish(result=None, error=None):
+        with _pest_jobs_lock:
+            _pest_inflight.pop(digest, None)
+            if error is not None:
+                job.update(status="error", error=error)
+            elif "error" in result:
+                job.update(status="error", error=result["error"])
+            else:
+                PEST_RESULTS.set(digest, result)
+                job.update(status="done", result=result)
+
+    engine = get_pest_engine()
+    if engine is None:
+        finish(_detect_pests(stream))
+        return job
+
+    def on_done(fut):
+        try:
+            finish(fut.result())
+        except Exception as e:
+            finish(error=str(e) or "inference failed")
+    engine.submit(stream.read()).add_done_callback(on_done)
+    return job
 
 @app.route("/pest-detect", methods=["POST"])
 def pest_detect():
@@ -150,50 +505,101 @@ def pest_detect():
     if file.filename == "":
         return jsonify({"error": "Empty filename"}), 400
 
-    # save temporarily (optional: you could skip if you process in-memory)
-    filename = secure_filename(file.filename)
-    filepath = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-    file.save(filepath)
-
-    # TODO: Replace this with real ML model inference
-    # Here we return a mock response
-    fake_results = {
-        "detected": True,
-        "pests": ["aphids", "spider mites"],
-        "recommendations": [
-            "Spray neem oil weekly",
-            "Introduce ladybugs to control aphids"
-        ]
-    }
-    return jsonify(fake_results)
+    digest = _sha256_stream(file.stream)
+    if (request.args.get("async") or request.form.get("async") or "").lower() in ("1", "true", "yes"):
+        job = _start_pest_job(digest, file.stream)
+        return jsonify(_job_view(job)), (200 if job["status"] == "done" else 202)
+
+    result = PEST_RESULTS.get(digest)
+    if result is None:
+        try:
+            result = _detect_pests(file.stream)
+        except (InferenceTimeout, BrokenExecutor):
+            # queue too long for the predict timeout, or a worker died (the
+            # engine starts a fresh pool): the next try can succeed
+            return (jsonify({"error": "Pest detection is busy, please try again shortly."}),
+                    503, {"Retry-After": "5"})
+        if "error" in result:
+            return jsonify(result), 400
+        PEST_RESULTS.set(digest, result)
+    return jsonify(result)
+
+@app.get("/pest-detect/<job_id>")
+def pest_job(job_id):
+    job = PEST_JOBS.get(job_id)
+    if not job:
+        return jsonify({"error": "unknown or expired job"}), 404
+    return jsonify(_job_view(job))
+
+@app.get("/api/pest/stats")
+@internal_only
+def pest_stats():
+    engine = get_pest_engine()
+    return jsonify({"engine": engine.stats() if engine else None, "cache": PEST_RESULTS.stats(),
+                    "jobs": PEST_JOBS.stats(), "inflight": len(_pest_inflight)})
 
 # --------------------------------------------------------------------
 # API: Weather data
 # --------------------------------------------------------------------
+# Readings are shared per grid cell: lat/lon are snapped to WEATHER_GRID
+# degrees (0.05 ~ 5 km), so neighbours in one town cost one upstream call
+# per WEATHER_TTL. Concurrent misses for a cell wait on the same call. If
+# OpenWeather errors or takes longer than WEATHER_SLOW_S, the cell's last
+# known reading is served (and the call finishes in the background).
+WEATHER_URL     = os.getenv("WEATHER_URL", "https://api.openweathermap.org/data/2.5/weather")
+WEATHER_GRID    = float(os.getenv("WEATHER_GRID", "0.05"))
+WEATHER_TTL     = float(os.getenv("WEATHER_TTL", "600"))
+WEATHER_STALE   = float(os.getenv("WEATHER_STALE", "1800"))
+WEATHER_SLOW_S  = float(os.getenv("WEATHER_SLOW_S", "1.5"))
+WEATHER_TIMEOUT = float(os.getenv("WEATHER_TIMEOUT", "5"))
+
+def weather_cell(lat, lon):
+    """Centre of the grid cell containing (lat, lon); also the cache key."""
+    g = WEATHER_GRID
+    return round(round(lat / g) * g, 4), round(round(lon / g) * g, 4)
+
+def _fetch_weather_upstream(cell):
+    lat, lon = cell
+    with metrics.upstream("weather"):
+        res = HTTP.get(WEATHER_URL, timeout=WEATHER_TIMEOUT, params={
+            "lat": lat, "lon": lon, "appid": OPENWEATHER_KEY, "units": "metric",
+        })
+        res.raise_for_status()
+    data = res.json()
+    # Keep only necessary/safe fields
+    return {
+        "name": data.get("name"),
+        "main": data.get("main"),
+        "weather": data.get("weather"),
+    }
+
+WEATHER_CACHE = SWRCache(_fetch_weather_upstream, ttl=WEATHER_TTL, stale_ttl=WEATHER_STALE,
+                         breaker=CircuitBreaker(failures=3, reset_after=30),
+                         maxsize=4096, slow_after=WEATHER_SLOW_S)
+
 @app.route("/weather")
 def weather_api():
-    """OpenWeather proxy (supply ?lat=..&lon=..)"""
-    lat = request.args.get("lat")
-    lon = request.args.get("lon")
-    if not (lat and lon and OPENWEATHER_KEY):
+    """OpenWeather proxy (supply ?lat=..&lon=..), cached per grid cell"""
+    try:
+        lat = float(request.args.get("lat", ""))
+        lon = float(request.args.get("lon", ""))
+    except ValueError:
+        lat = lon = None
+    if lat is None or not OPENWEATHER_KEY:
         return jsonify({"error": "Missing lat/lon or OPENWEATHER_KEY"}), 400
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return jsonify({"error": "lat/lon out of range"}), 400
 
-    url = (
-        "https://api.openweathermap.org/data/2.5/weather"
-        f"?lat={lat}&lon={lon}&appid={OPENWEATHER_KEY}&units=metric"
-    )
-    try:
-        res = requests.get(url, timeout=10)
-        res.raise_for_status()
-        data = res.json()
-        # Return only necessary/safe fields
-        return jsonify({
-            "name": data.get("name"),
-            "main": data.get("main"),
-            "weather": data.get("weather"),
-        })
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    data = WEATHER_CACHE.get(weather_cell(lat, lon), lambda cell: None)
+    if data is None:
+        return jsonify({"error": "weather unavailable"}), 503
+    return jsonify(data)
+
+# Hit/miss/coalesced/degraded counts and breaker state per upstream
+@app.get("/api/upstream/stats")
+@internal_only
+def upstream_stats():
+    return jsonify({"moon": MOON_CACHE.stats(), "weather": WEATHER_CACHE.stats()})
 
 
 # --------------------------------------------------------------------
@@ -202,41 +608,51 @@ def weather_api():
 @app.route("/")
 def home():
     # landing page
-    return send_from_directory(TEMPLATE_DIR, "landing.html")
+    return ASSETS.send("template", "landing.html")
 
 # move the unprotected route out of the way to avoid collision
 @app.route("/chatbot-plain", endpoint="chatbot_plain")
 def chatbot_plain():
-    return send_from_directory(TEMPLATE_DIR, "chatbot.html")
+    return ASSETS.send("template", "chatbot.html")
 
 
 # Plant FAQ (explicit route)
 @app.route("/plantfaq")
 @app.route("/plantfaq.html")
 def plantfaq():
-    return send_from_directory(TEMPLATE_DIR, "plantfaq.html")
+    return ASSETS.send("template", "plantfaq.html")
 
 # Moon page (explicit route) — NOTE: /moon is already used by the API
 @app.route("/moon.html")
 @app.route("/moonview")
 def moon_page():
-    return send_from_directory(TEMPLATE_DIR, "moon.html")
+    return ASSETS.send("template", "moon.html")
 
 
 # --------------------------------------------------------------------
 # Static passthrough (CSS, JS, images, JSON data)
 #   - Your JS references /static/data/indoor_plants.json
+#   - served via ASSETS: gzip/br variants, strong ETags, 304s; pages link
+#     fingerprinted /static/ URLs that are cached as immutable
 # --------------------------------------------------------------------
 @app.route("/static/<path:filename>")
 def static_files(filename):
-    return send_from_directory(STATIC_DIR, filename)
+    return ASSETS.send("static", filename)
+
+# Derived images; names are content hashes so they never change
+@app.route("/media/<kind>/<path:name>")
+def media_files(kind, name):
+    store = MEDIA.get(kind)
+    if store is None:
+        abort(404)
+    return store.send(name)
 
 # Optional: serve any other file under /template directly by name
 @app.route("/<path:filename>")
 def template_passthrough(filename):
     if filename.startswith("api/"):
             abort(404)
-    return send_from_directory(TEMPLATE_DIR, filename)
+    return ASSETS.send("template", filename)
 # --------------------------------------------------------------------
 # ChatBot
 # --------------------------------------------------------------------
@@ -248,26 +664,203 @@ def create_session():
         sid = cur.lastrowid
     return jsonify({"session_id": sid})
 
+# Messages go through a write-behind buffer (one multi-row INSERT per batch
+# instead of a round trip per message); history is keyset paginated.
+# See chat_store.py.
+CHAT_LOG = ChatWriter(db, max_batch=int(os.getenv("CHAT_BATCH", "200")),
+                      flush_every=float(os.getenv("CHAT_FLUSH_S", "0.25")))
+atexit.register(CHAT_LOG.close)
+CHAT_HISTORY_MAX = 200
+
 @app.get("/api/chat/history")
 def history():
-    sid = int(request.args.get("session_id"))
-    with db() as con, con.cursor() as cur:
-        cur.execute("""SELECT role, content, model, tokens_in, tokens_out, latency_ms, sources
-                       FROM chat_messages
-                       WHERE session_id=%s ORDER BY id ASC""", (sid,))
-        rows = cur.fetchall()
-    return jsonify({"messages": rows})
+    """
+    ?session_id=&before_id=&limit=  -> {"messages", "has_more", "next_before_id"}
+    Newest page by default; pass next_before_id back to load older ones.
+    """
+    try:
+        sid = int(request.args.get("session_id", ""))
+        before_id = int(request.args["before_id"]) if request.args.get("before_id") else None
+        limit = min(CHAT_HISTORY_MAX, max(1, int(request.args.get("limit", 50))))
+    except ValueError:
+        return jsonify({"error": "session_id, before_id and limit must be integers"}), 400
+
+    def read():
+        with db() as con, con.cursor() as cur:
+            return history_page(cur, sid, before_id, limit)
+
+    if before_id is None:
+        # messages still in the write buffer go after the table's newest;
+        # read_with_pending keeps a batch flushed meanwhile from showing twice
+        (rows, has_more), pending = CHAT_LOG.read_with_pending(sid, read)
+    else:
+        (rows, has_more), pending = read(), []
+    messages = rows + [{k: v for k, v in r.items() if k != "session_id"} for r in pending]
+    if len(messages) > limit:
+        messages = messages[-limit:]
+        has_more = True
+    next_before_id = None
+    if has_more:
+        ids = [m["id"] for m in messages if m["id"] is not None]
+        # a page of buffered messages only: the older page is the table's newest
+        next_before_id = ids[0] if ids else (rows[-1]["id"] + 1 if rows else None)
+    return jsonify({
+        "messages": messages,
+        "has_more": next_before_id is not None,
+        "next_before_id": next_before_id,
+    })
+
+# Answers come from a pluggable generator (chat_engine.py); the default
+# stub echoes, CHAT_STUB_DELAY_MS slows it down for streaming tests.
+CHAT_GEN = load_generator(os.getenv("CHAT_GENERATOR", "chat_engine:ExtractiveGenerator"))
+CHAT_STATS = StreamStats()
+
+# BM25 over the plant FAQ (retrieval.py); re-indexed when the JSON changes,
+# re-tokenising only the plants that changed. Needs NumPy.
+CHAT_TOP_K = int(os.getenv("CHAT_TOP_K", "4"))
+try:
+    import retrieval
+    PLANT_SEARCH = JsonCatalog(PLANTS_PATH, retrieval.IncrementalBuilder())
+except ImportError as e:
+    print(f"[chat] retrieval disabled ({e})")
+    PLANT_SEARCH = None
+
+def _retrieve(text):
+    """-> (hits, sources JSON for chat_messages.sources or None)"""
+    if PLANT_SEARCH is None:
+        return [], None
+    hits = PLANT_SEARCH.get()["index"].search(text, k=CHAT_TOP_K)
+    sources = [{k: h[k] for k in ("plant_id", "plant", "field", "score")} for h in hits]
+    return hits, (json.dumps(sources) if sources else None)
+
+# Answers for equivalent questions (same retrieval.question_key) are reused:
+# a hit skips retrieval and generation. Entries belong to one load of
+# indoor_plants.json and the cache is emptied when it changes.
+CHAT_ANSWERS = LRUCache(int(os.getenv("CHAT_CACHE_SIZE", "5000")),
+                        ttl=float(os.getenv("CHAT_CACHE_TTL", "3600")))
+_answers_state = {"loads": None, "invalidations": 0}
+_answers_lock = threading.Lock()
+
+def _answer_key(text):
+    if PLANT_SEARCH is None or not getattr(CHAT_GEN, "cacheable", False):
+        return None
+    PLANT_SEARCH.get()   # picks up a changed file before we compare
+    with _answers_lock:
+        if _answers_state["loads"] != PLANT_SEARCH.loads:
+            if _answers_state["loads"] is not None:
+                CHAT_ANSWERS.clear()
+                _answers_state["invalidations"] += 1
+            _answers_state["loads"] = PLANT_SEARCH.loads
+    q = retrieval.question_key(text)
+    return (PLANT_SEARCH.loads, q) if q else None
+
+def _answer(text):
+    """-> (reply chunks, sources JSON or None, served from cache?)"""
+    key = _answer_key(text)
+    if key is not None:
+        hit = CHAT_ANSWERS.get(key)
+        if hit is not None:
+            reply, sources = hit
+            return iter([reply]), sources, True
+    hits, sources = _retrieve(text)
+    chunks = CHAT_GEN.stream(text, hits)
+    if key is None:
+        return chunks, sources, False
+
+    def remember():
+        parts = []
+        for chunk in chunks:
+            parts.append(chunk)
+            yield chunk
+        CHAT_ANSWERS.set(key, ("".join(parts), sources))   # complete replies only
+    return remember(), sources, False
+
+def _chat_args():
+    data = request.get_json(force=True, silent=True) or {}
+    try:
+        sid = int(data.get("session_id") or 0)
+    except (TypeError, ValueError):
+        sid = 0
+    return sid, (data.get("message") or "").strip()
+
+@app.get("/api/chat/stats")
+@internal_only
+def chat_stats():
+    return jsonify({"writer": CHAT_LOG.stats(), "replies": CHAT_STATS.stats(),
+                    "answer_cache": dict(CHAT_ANSWERS.stats(),
+                                         invalidations=_answers_state["invalidations"])})
 
 @app.post("/api/chat")
 def chat():
-    data = request.get_json(force=True) or {}
-    sid = int(data.get("session_id", 0))
-    text = (data.get("message") or "").strip()
+    sid, text = _chat_args()
     if not sid or not text:
         return jsonify({"reply":"missing session_id or message"}), 400
 
-    # TODO: save to DB if you want
-    return jsonify({"reply": f"you said: {text}"})
+    started = time.perf_counter()
+    chunks, sources, _ = _answer(text)
+    reply = "".join(chunks)
+    latency_ms = int((time.perf_counter() - started) * 1000)
+    tokens_in, tokens_out = count_tokens(text), count_tokens(reply)
+    CHAT_LOG.add(sid, "user", text, tokens_in=tokens_in)
+    CHAT_LOG.add(sid, "assistant", reply, model=CHAT_GEN.model, tokens_in=tokens_in,
+                 tokens_out=tokens_out, latency_ms=latency_ms, sources=sources)
+    CHAT_STATS.record(latency_ms, tokens_out=tokens_out)
+    return jsonify({"reply": reply, "sources": json.loads(sources) if sources else []})
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/api/chat/stream")
+def chat_stream():
+    """
+    Same input as /api/chat; the reply arrives as Server-Sent Events:
+        event: token  data: {"t": "<chunk>"}          (repeated)
+        event: done   data: {"reply", "sources", "latency_ms", "ttft_ms", "tokens_in", "tokens_out", "cached"}
+        event: error  data: {"error"}
+    The reply is saved once the stream ends, or with what was sent so far if
+    the client goes away.
+    """
+    sid, text = _chat_args()
+    if not sid or not text:
+        return jsonify({"reply":"missing session_id or message"}), 400
+
+    def events():
+        started = time.perf_counter()
+        parts, ttft_ms, finished, failed = [], None, False, False
+        tokens_in = count_tokens(text)
+        CHAT_LOG.add(sid, "user", text, tokens_in=tokens_in)
+        sources = cached = None
+        try:
+            chunks, sources, cached = _answer(text)
+            for chunk in chunks:
+                if ttft_ms is None:
+                    ttft_ms = int((time.perf_counter() - started) * 1000)
+                parts.append(chunk)
+                yield _sse("token", {"t": chunk})
+            finished = True
+        except Exception as e:
+            failed = True
+            print(f"[chat] generator failed: {e}")
+            yield _sse("error", {"error": "generation_failed"})
+        finally:
+            # runs on normal end, on error and on client disconnect (GeneratorExit)
+            reply = "".join(parts)
+            latency_ms = int((time.perf_counter() - started) * 1000)
+            tokens_out = count_tokens(reply)
+            if reply:
+                CHAT_LOG.add(sid, "assistant", reply, model=CHAT_GEN.model, tokens_in=tokens_in,
+                             tokens_out=tokens_out, latency_ms=latency_ms, sources=sources)
+            CHAT_STATS.record(latency_ms, ttft_ms, tokens_out, streamed=True,
+                              aborted=not finished and not failed, error=failed)
+        if not failed:
+            yield _sse("done", {"reply": reply, "sources": json.loads(sources) if sources else [],
+                                "latency_ms": latency_ms, "ttft_ms": ttft_ms,
+                                "tokens_in": tokens_in, "tokens_out": tokens_out, "cached": cached})
+
+    return Response(events(), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",   # nginx: pass tokens through as they come
+    })
 
 # in app.py
 from functools import wraps
@@ -284,20 +877,48 @@ def login_required(view):
 @app.route("/chatbot")
 @login_required
 def chatbot():
-     return send_from_directory(TEMPLATE_DIR, "chatbot.html")
+     return ASSETS.send("template", "chatbot.html")
 
 # after successful login/signup
 
 @app.get("/login")
 def login_page():
-    return send_from_directory(TEMPLATE_DIR, "login.html")
+    return ASSETS.send("template", "login.html")
 
 @app.get("/signup")
 def signup_page():
-    return send_from_directory(TEMPLATE_DIR, "signup.html")
+    return ASSETS.send("template", "signup.html")
 
 import re
-from werkzeug.security import generate_password_hash
+
+# Hashing runs on a bounded pool (passwords.py): at most PASSWORD_WORKERS
+# hashes at once, PASSWORD_QUEUE more may wait briefly, the rest get 429.
+HASHER = Hasher(workers=int(os.getenv("PASSWORD_WORKERS", str(os.cpu_count() or 2))),
+                max_queue=int(os.getenv("PASSWORD_QUEUE", "16")))
+
+def _busy():
+    return "Too many sign-ins right now, please try again in a moment.", 429, {"Retry-After": "1"}
+
+# Hot queries live in module constants (here, wallet.py, chat_store.py) so
+# tests/test_query_plans.py can EXPLAIN exactly what runs.
+_USER_BY_EMAIL = "SELECT id, password_hashed FROM users WHERE email=%s LIMIT 1"
+_USER_BY_USERNAME = "SELECT id, password_hashed FROM users WHERE username=%s LIMIT 1"
+_REHASH = "UPDATE users SET password_hashed=%s WHERE id=%s AND password_hashed=%s"
+
+def _find_user(cur, login):
+    """Look up by email or username: one equality on one unique index, no OR."""
+    if "@" in login:
+        cur.execute(_USER_BY_EMAIL, (login,))
+        row = cur.fetchone()
+        if row:
+            return row
+    cur.execute(_USER_BY_USERNAME, (login,))
+    return cur.fetchone()
+
+@app.get("/api/auth/stats")
+@internal_only
+def auth_stats():
+    return jsonify(HASHER.stats())
 
 EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
 PW_RE    = re.compile(r"^(?=.*[A-Z])(?=.*\d)(?=.*[^A-Za-z0-9]).{8,}$")
@@ -328,22 +949,28 @@ def signup_post():
     if pw != pw2:
         return _signup_err("password2", "Passwords do not match.", username, email)
 
-    # unique checks (username or email)
+    # hash before taking a DB connection: it is the slow part
+    try:
+        pwd_hash = HASHER.hash(pw)
+    except Saturated:
+        return _busy()
+
+    # the unique keys on Username / Email (migrations/001) reject a taken
+    # name; no separate check, so two signups can't race past it
     with db() as con, con.cursor() as cur:
-      cur.execute("SELECT 1 FROM users WHERE Username=%s OR Email=%s LIMIT 1", (username, email))
-      if cur.fetchone():
+      try:
+        cur.execute(
+          "INSERT INTO users (Username, Email, Password_hashed) VALUES (%s,%s,%s)",
+          (username, email, pwd_hash)
+        )
+      except pymysql.err.IntegrityError:
           return _signup_err("email", "Username or email already exists.", username, email)
-      pwd_hash = generate_password_hash(pw, method="pbkdf2:sha256", salt_length=16)
-      cur.execute(
-        "INSERT INTO users (Username, Email, Password_hashed) VALUES (%s,%s,%s)",
-        (username, email, pwd_hash)
-      )
       new_id = cur.lastrowid
 
       # ensure wallet row exists (optional)
       try:
         cur.execute(
-          "INSERT IGNORE INTO user_wallet (user_id, beans, moons, beans_lifetime) VALUES (%s,0,0,0)",
+          "INSERT IGNORE INTO user_wallet (user_id, leaves, plants, beans_lifetime) VALUES (%s,0,0,0)",
           (new_id,)
         )
       except Exception:
@@ -363,11 +990,7 @@ def do_login():
         return "Missing fields", 400
 
     with db() as con, con.cursor() as cur:
-        cur.execute(
-            "SELECT id, password_hashed FROM users WHERE username=%s OR email=%s LIMIT 1",
-            (u_or_e, u_or_e)
-        )
-        row = cur.fetchone()
+        row = _find_user(cur, u_or_e)
 
     if not row:
         return "Account not found", 404
@@ -375,8 +998,21 @@ def do_login():
     uid   = row["id"]
     hash_ = row["password_hashed"]
 
-    if not check_password_hash(hash_, pw):
-        return "Invalid credentials", 401
+    try:
+        if not HASHER.verify(hash_, pw):
+            return "Invalid credentials", 401
+    except Saturated:
+        return _busy()
+
+    # stored with older hash parameters: upgrade now that we know the password
+    if HASHER.needs_rehash(hash_):
+        try:
+            new_hash = HASHER.hash(pw)
+        except Saturated:
+            pass   # next login will try again
+        else:
+            with db() as con, con.cursor() as cur:
+                cur.execute(_REHASH, (new_hash, uid, hash_))
 
     session["user_id"] = uid
     return redirect(next_url)
@@ -385,20 +1021,23 @@ def do_login():
 @app.get("/tasks.html")
 @login_required
 def tasks_page():
-    return send_from_directory(TEMPLATE_DIR, "tasks.html")
+    return ASSETS.send("template", "tasks.html")
 
 @app.get("/profile")
 @login_required
 def profile_page():
     # (Create template/profile.html when you’re ready)
-    return send_from_directory(TEMPLATE_DIR, "profile.html")
+    return ASSETS.send("template", "profile.html")
 # ===== Beans/Moons Tasks API (minimal, matches tasks.html JS) =====
 DATA_DIR = STATIC_DIR / "data"
 TASKS_PATH = DATA_DIR / "tasks.json"
 
+_WALLET = "SELECT leaves, plants, beans_lifetime FROM user_wallet WHERE user_id=%s"
+_USERNAME = "SELECT Username FROM users WHERE ID=%s"
+
 def _get_wallet(user_id: int):
      with db() as con, con.cursor() as cur:
-        cur.execute("SELECT leaves, plants, beans_lifetime FROM user_wallet WHERE user_id=%s", (user_id,))
+        cur.execute(_WALLET, (user_id,))
         w = cur.fetchone()
         if not w:
             return {"leaves": 0, "plants": 0, "beans_lifetime": 0}
@@ -417,56 +1056,76 @@ def _add_wallet(user_id: int, leaves=0, plants=0, lifetime=0):
 
 def _today(): return date.today().isoformat()
 
-def _load_tasks_doc():
-    doc = json.loads(TASKS_PATH.read_text(encoding="utf-8"))
-    return {
-        "rules": doc.get("rules", {}),
-        "tasks": doc.get("tasks", [])
-    }
-
-def _pick_today_tasks(user_id: int):
-    """Deterministic daily selection using a stable hash; avoids tasks used in the last N days."""
-    doc = _load_tasks_doc()
-    rules = doc["rules"]; tasks = doc["tasks"]
-    slots = int(rules.get("daily_slots", 3))
+# (user_id, day) -> picked task dicts; every key dies at local midnight
+_TODAY_PICKS = LRUCache(maxsize=20000)
+_DAY_RANKS = LRUCache(maxsize=4)
+
+def _day_ranks(doc, day):
+    """task id -> 64-bit sha256 rank for `day`, hashed once per day for the pool."""
+    hit = _DAY_RANKS.get(day)
+    if hit and hit[0] is doc:
+        return hit[1]
+    ranks = {task_id(t): int.from_bytes(hashlib.sha256(f"{day}|{task_id(t)}".encode()).digest()[:8], "big")
+             for t in doc["pool"]}
+    _DAY_RANKS.set(day, (doc, ranks))
+    return ranks
+
+_M64 = (1 << 64) - 1
+
+# tasks done within the no-repeat window, not counting today
+# args: user_id, first day of the window, today
+_RECENT_TASKS = """
+SELECT DISTINCT task_id FROM user_task_log
+WHERE user_id=%s AND task_date >= %s AND task_date < %s
+"""
+
+def _mix64(x):
+    """splitmix64 finalizer: cheap integer scramble so per-user orders differ."""
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _M64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _M64
+    return x ^ (x >> 31)
+
+def _pick_today_tasks(user_id: int, cur=None):
+    """Deterministic daily selection using a stable hash; avoids tasks done in the
+    previous `no_repeat_within_days` days. Memoized per (user, day) until midnight,
+    so only the first call of the day touches user_task_log. Pass `cur` to reuse
+    an open connection."""
+    doc = TASKS.get()
+    day = _today()
+    key = (user_id, day)
+    hit = _TODAY_PICKS.get(key)
+    if hit and hit[0] is doc:
+        return hit[1]
+
+    rules = doc["rules"]; tasks = doc["pool"]
+    slots = int(rules.get("daily_count", rules.get("daily_slots", 3)))
     no_repeat = int(rules.get("no_repeat_within_days", 3))
 
-    # tasks to avoid (done within window)
+    # tasks to avoid (done within window, not counting today so ticking a
+    # task doesn't reshuffle the list)
     avoid = set()
-    with db() as con, con.cursor() as cur:
-        cur.execute("""
-          SELECT task_id FROM user_task_log
-          WHERE user_id=%s AND task_date >= %s
-        """, (user_id, (date.today() - timedelta(days=no_repeat)).isoformat()))
-        for r in cur.fetchall(): avoid.add(r["task_id"])
-
-    # stable ordering by hash
-    def key_fn(t):
-        h = hashlib.sha256(f"{user_id}|{_today()}|{t['id']}".encode()).hexdigest()
-        return h
-
-    pool = [t for t in tasks if t.get("id") not in avoid] or tasks
-    pool.sort(key=key_fn)
+    if no_repeat > 0:
+        args = (user_id, (date.today() - timedelta(days=no_repeat)).isoformat(), day)
+        if cur is None:
+            with db() as con, con.cursor() as c:
+                c.execute(_RECENT_TASKS, args)
+                rows = c.fetchall()
+        else:
+            cur.execute(_RECENT_TASKS, args)
+            rows = cur.fetchall()
+        avoid = {str(r["task_id"]) for r in rows}
+
+    # stable per-user ordering: the day's ranks mixed with a per-user salt
+    ranks = _day_ranks(doc, day)
+    salt = _mix64(int(user_id) & _M64)
+    pool = [t for t in tasks if task_id(t) not in avoid]
+    if len(pool) < slots:
+        pool = list(tasks)
+    pool.sort(key=lambda t: _mix64(ranks[task_id(t)] ^ salt))
     picked = pool[:slots]
 
-    # mark done for today
-    done_ids = set()
-    with db() as con, con.cursor() as cur:
-        cur.execute("""
-          SELECT task_id FROM user_task_log WHERE user_id=%s AND task_date=%s
-        """, (user_id, _today()))
-        rows = cur.fetchall() or []
-        done_ids = {r["task_id"] for r in cur.fetchall()}
-
-    items = [{
-        "id": t["id"],
-        "title": t.get("title",""),
-        "leaves": int(t.get("leaves", 0)),
-        "done": t["id"] in done_ids
-    } for t in picked]
-
-    all_done = all(x["done"] for x in items) and len(items) > 0
-    return items, all_done, rules
+    _TODAY_PICKS.set(key, (doc, picked), ttl=seconds_until_midnight())
+    return picked
 
 @app.get("/api/wallet")
 @login_required
@@ -475,7 +1134,7 @@ def api_wallet():
     w = _get_wallet(uid)
     # if you want username in header chip:
     with db() as con, con.cursor() as cur:
-        cur.execute("SELECT Username FROM users WHERE ID=%s", (uid,))
+        cur.execute(_USERNAME, (uid,))
         u = cur.fetchone() or {}
     return jsonify({
         "username": u.get("Username"),
@@ -492,10 +1151,83 @@ from pathlib import Path
 
 BASE_DIR   = Path(__file__).resolve().parent
 TASKS_PATH = BASE_DIR / "static" / "data" / "tasks.json"
-import random
 from datetime import date
 
 
+def _shape_tasks(picked, done_ids, leaves_per_task):
+    out = []
+    for t in picked:
+        tid    = task_id(t)
+        title  = t.get("title") or t.get("label") or tid
+        leaves = int(t.get("leaves") or leaves_per_task)
+        out.append({
+            "id": tid,
+            "title": title,
+            "done": (tid in done_ids),
+            "leaves": leaves,
+        })
+    return out
+
+def _select_sets(cur, sql, args):
+    """Run several ;-separated SELECTs in one round trip -> list of row lists.
+    Needs a batch_db() cursor."""
+    cur.execute(sql, args)
+    sets = [cur.fetchall()]
+    while cur.nextset():
+        sets.append(cur.fetchall())
+    return sets
+
+# args: user_id; user_id; user_id, today; user_id, today; user_id
+_DASHBOARD = """
+SELECT Username FROM users WHERE ID=%s;
+SELECT leaves, plants, beans_lifetime FROM user_wallet WHERE user_id=%s;
+SELECT task_id FROM user_task_log WHERE user_id=%s AND task_date=%s;
+SELECT 1 FROM user_daily_bonus WHERE user_id=%s AND bonus_date=%s LIMIT 1;
+SELECT sticker_id FROM user_stickers WHERE user_id=%s ORDER BY sticker_id
+"""
+
+@app.get("/api/dashboard")
+@login_required
+def api_dashboard():
+    """Everything the profile/tasks header needs in one call and one connection.
+    Answers 304 when the client's ETag still matches."""
+    uid   = session["user_id"]
+    today = _today()
+    doc   = TASKS.get()
+    rules = doc["rules"]
+    leaves_per_task = int(rules.get("leaves_per_task", 3))
+
+    with batch_db() as con, con.cursor() as cur:
+        picked = _pick_today_tasks(uid, cur)   # cached; queries only on first call of the day
+        users, wallets, done, bonus, stickers = _select_sets(
+            cur, _DASHBOARD, (uid, uid, uid, today, uid, today, uid))
+
+    w = wallets[0] if wallets else {}
+    tasks = _shape_tasks(picked, {str(r["task_id"]) for r in done}, leaves_per_task)
+
+    resp = jsonify({
+        "username": users[0]["Username"] if users else None,
+        "date": today,
+        "wallet": {
+            "leaves": int(w.get("leaves") or 0),
+            "plants": int(w.get("plants") or 0),
+            "xp": int(w.get("beans_lifetime") or 0),
+        },
+        "tasks": tasks,
+        "all_done": bool(tasks) and all(t["done"] for t in tasks),
+        "bonus_claimed": bool(bonus),
+        "all_done_bonus_plants": int(rules.get("all_done_bonus_plants", 1)),
+        "max_daily_leaves": int(rules.get("daily_leaves_cap", 10)),
+        "stickers": [str(r["sticker_id"]) for r in stickers],
+    })
+    resp.headers["Cache-Control"] = "private, no-cache"
+    resp.add_etag()
+    return resp.make_conditional(request)
+
+
+_TODAY_DONE = "SELECT task_id FROM user_task_log WHERE user_id=%s AND task_date=%s"
+_BALANCES = "SELECT leaves, plants FROM user_wallet WHERE user_id=%s"
+
 @app.get("/api/tasks/today")
 @login_required
 def api_tasks_today():
@@ -503,69 +1235,35 @@ def api_tasks_today():
 
     # ----- 1) load tasks.json -----
     try:
-        with open(TASKS_PATH, "r", encoding="utf-8") as f:
-            raw = json.load(f)
+        doc = TASKS.get()
     except Exception as e:
         print("tasks.json load error:", e)
         return jsonify({"tasks": [], "all_done": False, "leaves_per_task": 3})
 
-    pool = (raw.get("daily")
-            or raw.get("tasks")
-            or raw.get("pool")
-            or raw.get("items")
-            or [])
-
-    rules           = raw.get("rules") or {}
-    daily_count     = int(rules.get("daily_count", 3))
+    rules           = doc["rules"]
     leaves_per_task = int(rules.get("leaves_per_task", 3))
     leaves_cap      = int(rules.get("daily_leaves_cap", 10))
     bonus_plants    = int(rules.get("all_done_bonus_plants", 1))
 
-    base_pool = list(pool)
-    if len(base_pool) > daily_count:
-        pool = random.sample(base_pool, daily_count)
-    else:
-        pool = base_pool
-
-    # ----- 2) which tasks are already done today? -----
+    # ----- 2) today's picks (cached) + which are already done -----
     done_ids = set()
-    today = date.today().isoformat()
-    try:
-        with db() as con, con.cursor() as cur:
-            cur.execute(
-                """
-                SELECT task_id
-                FROM user_task_log
-                WHERE user_id=%s AND task_date=%s
-                """,
-                (uid, today),
-            )
+    today = _today()
+    w = {"leaves": 0, "plants": 0}
+    with db() as con, con.cursor() as cur:
+        pool = _pick_today_tasks(uid, cur)
+        try:
+            cur.execute(_TODAY_DONE, (uid, today))
             for r in cur.fetchall():
                 done_ids.add(str(r["task_id"]))
-    except Exception as e:
-        print("tasks_today DB warn:", e)
-
-    # ----- 3) shape for frontend -----
-    out = []
-    for t in pool:
-        tid    = str(t.get("id") or t.get("key") or t.get("slug") or t.get("title"))
-        title  = t.get("title") or t.get("label") or tid
-        leaves = int(t.get("leaves") or leaves_per_task)
-        out.append({
-            "id": tid,
-            "title": title,
-            "done": (tid in done_ids),
-            "leaves": leaves,
-        })
+        except Exception as e:
+            print("tasks_today DB warn:", e)
 
-    # ----- 4) current wallet -----
-    with db() as con, con.cursor() as cur:
-        cur.execute(
-            "SELECT leaves, plants FROM user_wallet WHERE user_id=%s",
-            (uid,),
-        )
-        w = cur.fetchone() or {"leaves": 0, "plants": 0}
+        # current wallet
+        cur.execute(_BALANCES, (uid,))
+        w = cur.fetchone() or w
 
+    # ----- 3) shape for frontend -----
+    out = _shape_tasks(pool, done_ids, leaves_per_task)
     all_done = bool(out) and all(x["done"] for x in out)
 
     return jsonify({
@@ -592,83 +1290,30 @@ def complete_task():
 
     today = date.today().isoformat()
 
-    # read leaves_per_task from tasks.json (fallback 3)
+    # reward as shown on the card: task's own leaves, else rules (fallback 3)
     try:
-        with open(TASKS_PATH, "r", encoding="utf-8") as f:
-            raw = json.load(f)
+        doc = TASKS.get()
     except Exception:
         leaves_per_task = 3
     else:
-        rules = raw.get("rules") or {}
-        leaves_per_task = int(rules.get("leaves_per_task", 3))
-
-    with db() as con, con.cursor() as cur:
-        # is there already a log row for today?
-        cur.execute(
-            """
-            SELECT awarded_plants
-            FROM user_task_log
-            WHERE user_id=%s AND task_id=%s AND task_date=%s
-            """,
-            (uid, task_id, today),
-        )
-        row = cur.fetchone()
+        leaves_per_task = int(doc["rules"].get("leaves_per_task", 3))
+        task = doc["by_id"].get(task_id)
+        if task and task.get("leaves"):
+            leaves_per_task = int(task["leaves"])
 
+    with batch_db() as con, con.cursor() as cur:
         if done:
-            # mark as completed → insert row if not exists, add leaves
-            if not row:
-                cur.execute(
-                    """
-                    INSERT INTO user_task_log (user_id, task_id, task_date, awarded_plants)
-                    VALUES (%s, %s, %s, %s)
-                    """,
-                    (uid, task_id, today, leaves_per_task),
-                )
-                cur.execute(
-                    """
-                    UPDATE user_wallet
-                    SET leaves = leaves + %s
-                    WHERE user_id = %s
-                    """,
-                    (leaves_per_task, uid),
-                )
-                awarded = leaves_per_task
-            else:
-                # already completed earlier today → no extra reward
-                awarded = 0
+            # insert-if-absent + pay in one transaction; re-ticks award 0
+            res = wallet.complete_task(cur, uid, task_id, today, leaves_per_task)
         else:
-            # un-tick: remove row if exists, subtract leaves
-            if row:
-                awarded = int(row["awarded_plants"])
-                cur.execute(
-                    """
-                    DELETE FROM user_task_log
-                    WHERE user_id=%s AND task_id=%s AND task_date=%s
-                    """,
-                    (uid, task_id, today),
-                )
-                cur.execute(
-                    """
-                    UPDATE user_wallet
-                    SET leaves = GREATEST(0, leaves - %s)
-                    WHERE user_id = %s
-                    """,
-                    (awarded, uid),
-                )
-            else:
-                awarded = 0
-
-        # updated wallet
-        cur.execute(
-            "SELECT leaves, plants FROM user_wallet WHERE user_id=%s",
-            (uid,),
-        )
-        w = cur.fetchone() or {"leaves": 0, "plants": 0}
+            # un-tick: remove today's row and take back what it paid
+            res = wallet.undo_task(cur, uid, task_id, today)
+    LEADERBOARD.add(uid, today, res["awarded"] if done else -res["awarded"])
 
     return jsonify({
-        "awarded_leaves": awarded,
-        "leaves": int(w["leaves"]),
-        "plants": int(w["plants"]),
+        "awarded_leaves": res["awarded"],
+        "leaves": res["leaves"],
+        "plants": res["plants"],
     })
 
 @app.post("/api/tasks/claim_all_done_bonus")
@@ -679,72 +1324,106 @@ def claim_all_done_bonus():
 
     # read rules from tasks.json
     try:
-        with open(TASKS_PATH, "r", encoding="utf-8") as f:
-            raw = json.load(f)
+        rules = TASKS.get()["rules"]
     except Exception:
-        raw = {}
+        rules = {}
 
-    rules        = raw.get("rules") or {}
     daily_count  = int(rules.get("daily_count", 3))
     bonus_plants = int(rules.get("all_done_bonus_plants", 1))
 
-    with db() as con, con.cursor() as cur:
-        # already claimed today?
-        cur.execute(
-            """
-            SELECT 1
-            FROM user_daily_bonus
-            WHERE user_id=%s AND bonus_date=%s
-            LIMIT 1
-            """,
-            (uid, today),
-        )
-        if cur.fetchone():
+    with batch_db() as con, con.cursor() as cur:
+        res = wallet.claim_bonus(cur, uid, today, daily_count, bonus_plants)
+
+    if not res["awarded"]:
+        if res["already_claimed"]:
             return jsonify({"error": "already_claimed"}), 400
+        return jsonify({"error": "not_all_done"}), 400
 
-        # number of completed tasks today
-        cur.execute(
-            """
-            SELECT COUNT(*) AS c
-            FROM user_task_log
-            WHERE user_id=%s AND task_date=%s
-            """,
-            (uid, today),
-        )
-        row = cur.fetchone() or {"c": 0}
-        if int(row["c"]) < daily_count:
-            return jsonify({"error": "not_all_done"}), 400
+    return jsonify({
+        "awarded_plants": res["awarded"],
+        "leaves": res["leaves"],
+        "plants": res["plants"],
+    })
 
-        # award plants
-        cur.execute(
-            """
-            UPDATE user_wallet
-            SET plants = plants + %s
-            WHERE user_id = %s
-            """,
-            (bonus_plants, uid),
-        )
+# --------------------------------------------------------------------
+# API: Leaderboard + streaks
+# --------------------------------------------------------------------
+# Both read the aggregates wallet.py maintains (user_daily_stats,
+# user_streaks), never user_task_log. The week's ranking lives in memory;
+# see leaderboard.py.
+LEADERBOARD_MAX = 100
+
+# args: monday, sunday
+_WEEK_SCORES = """
+SELECT s.user_id, SUM(s.leaves_earned) AS leaves, u.Username
+FROM user_daily_stats s JOIN users u ON u.ID = s.user_id
+WHERE s.stat_date BETWEEN %s AND %s
+GROUP BY s.user_id, u.Username
+"""
+# {} -> one %s per id
+_USERNAMES = "SELECT ID, Username FROM users WHERE ID IN ({})"
+# args: user_id; user_id, monday
+_STREAK_WEEK = """
+SELECT current_streak, longest_streak, last_active_date FROM user_streaks WHERE user_id=%s;
+SELECT stat_date, tasks_done, leaves_earned, bonus_plants FROM user_daily_stats
+  WHERE user_id=%s AND stat_date >= %s ORDER BY stat_date
+"""
+
+def _load_week_scores(monday, sunday):
+    with db() as con, con.cursor() as cur:
+        cur.execute(_WEEK_SCORES, (monday, sunday))
+        return {r["user_id"]: (int(r["leaves"] or 0), r["Username"]) for r in cur.fetchall()}
 
-        cur.execute(
-            """
-            INSERT INTO user_daily_bonus (user_id, bonus_date, awarded_plants)
-            VALUES (%s, %s, %s)
-            """,
-            (uid, today, bonus_plants),
-        )
+LEADERBOARD = WeeklyBoard(_load_week_scores,
+                          reload_every=float(os.getenv("LEADERBOARD_RELOAD_S", "300")))
 
-        cur.execute(
-            "SELECT leaves, plants FROM user_wallet WHERE user_id=%s",
-            (uid,),
-        )
-        w = cur.fetchone() or {"leaves": 0, "plants": 0}
+@app.get("/api/leaderboard")
+def api_leaderboard():
+    """
+    This week's (Mon-Sun) top players by leaves earned from tasks.
+    ?limit=10 (max 100). "me" is the caller's rank when logged in.
+    """
+    today = _today()
+    try:
+        limit = min(max(int(request.args.get("limit", 10)), 1), LEADERBOARD_MAX)
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+
+    top = LEADERBOARD.top(today, limit)
+    # players who joined the board since the last load: one lookup for all
+    missing = LEADERBOARD.missing_names([r["user_id"] for r in top])
+    if missing:
+        with db() as con, con.cursor() as cur:
+            cur.execute(_USERNAMES.format(",".join(["%s"] * len(missing))), missing)
+            LEADERBOARD.set_names({r["ID"]: r["Username"] for r in cur.fetchall()})
+        top = LEADERBOARD.top(today, limit)
 
+    uid = session.get("user_id")
+    monday, sunday = week_bounds(today)
     return jsonify({
-        "awarded_plants": bonus_plants,
-        "leaves": int(w["leaves"]),
-        "plants": int(w["plants"]),
+        "week_start": monday,
+        "week_end": sunday,
+        "top": [{"rank": r["rank"], "username": r["username"], "leaves": r["leaves"],
+                 "me": r["user_id"] == uid} for r in top],
+        "me": LEADERBOARD.rank(today, uid) if uid else None,
     })
 
+@app.get("/api/streak")
+@login_required
+def api_streak():
+    """Current / longest streak plus this week's per-day totals (two primary-key reads)."""
+    uid = session["user_id"]
+    today = _today()
+    monday, _ = week_bounds(today)
+    with batch_db() as con, con.cursor() as cur:
+        streaks, days = _select_sets(cur, _STREAK_WEEK, (uid, uid, monday))
+    return jsonify(dict(
+        streak_view(streaks[0] if streaks else None, today),
+        week=[{"date": str(r["stat_date"]), "tasks_done": int(r["tasks_done"]),
+               "leaves": int(r["leaves_earned"]), "bonus_plants": int(r["bonus_plants"])}
+              for r in days],
+    ))
+
 #profile page
 @login_required
 def profile_page():
@@ -753,13 +1432,50 @@ import json
 from datetime import date
 
 def _load_sticker(sticker_id: str):
-    with open("static/data/stickers.json", "r", encoding="utf-8") as f:
-        items = json.load(f)
-    # find by id
-    for s in items:
-        if str(s.get("id")) == str(sticker_id):
-            return s
-    return None
+    return STICKERS.get()["by_id"].get(str(sticker_id))
+
+def _sticker_price(stk):
+    """-> (currency, cost). stickers.json uses leaves_cost / plants_cost;
+    older entries used cost like "25" (leaves) or "2m" (plants)."""
+    if stk.get("plants_cost") is not None:
+        return "plants", int(stk["plants_cost"])
+    if stk.get("leaves_cost") is not None:
+        return "leaves", int(stk["leaves_cost"])
+    cost_raw = str(stk.get("cost", "")).lower().strip()
+    if cost_raw.endswith("m"):
+        return "plants", int(cost_raw[:-1])
+    return "leaves", int(cost_raw or "0")
+
+# Shop catalog. Each sticker carries a small `image` plus WebP/PNG srcsets,
+# so the grid downloads a few KB per card instead of the multi-MB originals.
+# Until thumbnails exist (built in the background) `image` is the original.
+STICKER_THUMB_WIDTH = 192
+
+@app.get("/api/stickers")
+def api_stickers():
+    view = STICKERS.get()
+    thumbs = MEDIA["stickers"]
+    out = []
+    for stk in view["items"]:
+        sid = str(stk.get("id"))
+        currency, cost = _sticker_price(stk)
+        rel = view["src"].get(sid)
+        item = {"id": sid, "name": stk.get("name"), "price": cost, "currency": currency,
+                "image": None, "srcset": None}
+        if rel:
+            e = thumbs.get(rel)
+            if e:
+                item.update(image=thumbs.url(e, "png", STICKER_THUMB_WIDTH),
+                            srcset={"webp": thumbs.srcset(e, "webp"), "png": thumbs.srcset(e, "png")},
+                            width=e["width"], height=e["height"])
+            else:
+                item["image"] = ASSETS.url(rel)
+        out.append(item)
+
+    resp = jsonify(out)
+    resp.headers["Cache-Control"] = "public, no-cache"
+    resp.add_etag()
+    return resp.make_conditional(request)
 
 @app.post("/api/stickers/redeem")
 def api_stickers_redeem():
@@ -773,48 +1489,19 @@ def api_stickers_redeem():
     if not stk:
         return jsonify({"ok":False, "error":"unknown_sticker"}), 400
 
-    # cost can be like "25" (beans) or "2m" (moons)
-    cost_raw = str(stk.get("cost", "")).lower().strip()
-    use_moons = cost_raw.endswith("m")
-    cost = int(cost_raw[:-1]) if use_moons else int(cost_raw or "0")
-
-    with db() as con, con.cursor() as cur:
-        # already owned?
-        cur.execute("SELECT 1 FROM user_stickers WHERE user_id=%s AND sticker_id=%s LIMIT 1", (uid, sid))
-        if cur.fetchone():
-            # return wallet unchanged
-            cur.execute("SELECT leaves, plants FROM user_wallet WHERE user_id=%s", (uid,))
-            w = cur.fetchone() or {"leaves":0, "plants":0}
-            return jsonify({"ok":True, "already_owned":True, "leaves":int(w.get("leaves",0)), "plants":int(w.get("plants",0))})
-
-        # check wallet
-        cur.execute("SELECT leaves, plants FROM user_wallet WHERE user_id=%s LIMIT 1", (uid,))
-        w = cur.fetchone() or {"leaves":0, "plants":0}
-        leaves = int(w.get("leaves", 0))
-        plants = int(w.get("plants", 0))
-
-        if use_moons:
-            if plants < cost:
-                return jsonify({"ok":False, "error":"insufficient_plants", "leaves":leaves, "plants":plants}), 400
-            # deduct moons
-            cur.execute("UPDATE user_wallet SET plants = plants - %s WHERE user_id=%s", (cost, uid))
-        else:
-            if leaves < cost:
-                return jsonify({"ok":False, "error":"insufficient_leaves", "leaves":leaves, "plants":plants}), 400
-            # deduct beans
-            cur.execute("UPDATE user_wallet SET leaves = leaves - %s WHERE user_id=%s", (cost, uid))
-
-        # grant sticker
-        cur.execute(
-            "INSERT INTO user_stickers (user_id, sticker_id, acquired_at) VALUES (%s,%s,%s)",
-            (uid, sid, date.today())
-        )
+    currency, cost = _sticker_price(stk)
 
-        # new wallet values
-        cur.execute("SELECT leaves, plants FROM user_wallet WHERE user_id=%s", (uid,))
-        w2 = cur.fetchone() or {"leaves":0, "plants":0}
+    with batch_db() as con, con.cursor() as cur:
+        # grant + conditional charge in one transaction; no double-spend
+        res = wallet.redeem_sticker(cur, uid, sid, currency, cost, date.today())
 
-    return jsonify({"ok":True, "leaves":int(w2.get("leaves",0)), "plants":int(w2.get("plants",0))})
+    leaves, plants = res["leaves"], res["plants"]
+    if res["status"] == "already_owned":
+        # return wallet unchanged
+        return jsonify({"ok":True, "already_owned":True, "leaves":leaves, "plants":plants})
+    if res["status"] == "insufficient":
+        return jsonify({"ok":False, "error":f"insufficient_{currency}", "leaves":leaves, "plants":plants}), 400
+    return jsonify({"ok":True, "leaves":leaves, "plants":plants})
 
 
 
@@ -822,6 +1509,12 @@ def api_stickers_redeem():
 # Dev entry
 # --------------------------------------------------------------------
 if __name__ == "__main__":
+    import sys, types
+    # pest_inference's spawn workers re-import __main__ before they start;
+    # hand them an empty one so they don't run this file's start-up (DB
+    # pools, catalogs, sticker build) again. gunicorn / flask run are not
+    # affected: their __main__ is their own launcher.
+    sys.modules["__main__"] = types.ModuleType("__main__")
     # Use host='0.0.0.0' if running in a container
     app.run(debug=True)
 
@@ -0,0 +1,222 @@
+"""
+Fingerprinted, precompressed serving for static/ and template/.
+
+For every file the store keeps a content hash and, for text types, gzip
+and brotli variants written under .build/assets/. HTML pages are rewritten
+so their /static/... references point at fingerprinted URLs
+(/static/js/main.3f9a0c1d2b4e.js); those are served with
+`Cache-Control: immutable`, everything else with `no-cache` plus a strong
+ETag so repeat visits get 304s. Accept-Encoding picks br > gzip > identity.
+
+Entries are (re)built lazily when a file's mtime/size changes, so editing
+a file in dev just works. A rebuild (brotli at quality 11 included) holds
+only that file's lock: other requests keep being served meanwhile, and
+the variants of the replaced version are deleted once the new one is in.
+Run `python assets.py` at deploy time to build everything up front.
+
+brotli is optional; without it only gzip variants are produced.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+from pathlib import Path
+
+from flask import abort, request, send_file
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+HASH_LEN = 12
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+_COMPRESSIBLE = ("text/", "application/javascript", "application/json",
+                 "image/svg+xml", "application/xml")
+_FINGERPRINT_RE = re.compile(r"^(?P<stem>.+)\.(?P<hash>[0-9a-f]{%d})(?P<ext>\.[^./]+)$" % HASH_LEN)
+# "/static/x" and the relative "static/x" the templates mostly use; both are
+# rewritten to the absolute fingerprinted URL.
+_STATIC_REF_RE = re.compile(r"""(?P<q>["'(])/?static/(?P<path>[^"')?#\s]+)""")
+
+
+class _Entry:
+    __slots__ = ("sig", "hash", "mimetype", "files", "deps")
+
+    def __init__(self, sig, hash_, mimetype, files, deps):
+        self.sig = sig            # (mtime_ns, size) of the source file
+        self.hash = hash_         # sha256 prefix of the served (identity) bytes
+        self.mimetype = mimetype
+        self.files = files        # encoding -> path on disk ("identity", "gzip", "br")
+        self.deps = deps          # [(rel, hash)] static files an HTML page links to
+
+
+class AssetStore:
+    def __init__(self, roots, out_dir, min_size=512):
+        """
+        roots     {"static": Path, "template": Path}; HTML in any root is
+                  rewritten against the "static" root
+        out_dir   where rewritten files and compressed variants go
+        """
+        self.roots = {k: Path(v) for k, v in roots.items()}
+        self.out_dir = Path(out_dir)
+        self.min_size = min_size
+        self._entries = {}
+        self._building = {}              # (root, rel) -> lock held while that file is rebuilt
+        self._lock = threading.Lock()    # guards the two dicts only
+
+    # ---- public API -------------------------------------------------
+
+    def build(self):
+        """Hash and compress every file now. Returns the number of files."""
+        n = 0
+        for root, base in self.roots.items():
+            for path in sorted(base.rglob("*")):
+                if path.is_file():
+                    self.entry(root, path.relative_to(base).as_posix())
+                    n += 1
+        return n
+
+    def url(self, rel):
+        """Fingerprinted URL for a file under static/ (plain URL if missing)."""
+        e = self.entry("static", rel)
+        if e is None:
+            return f"/static/{rel}"
+        stem, ext = os.path.splitext(rel)
+        return f"/static/{stem}.{e.hash}{ext}"
+
+    def send(self, root, rel):
+        """Response for root/rel, honouring fingerprints, encodings and 304s."""
+        immutable = False
+        e = self.entry(root, rel)
+        if e is None:
+            m = _FINGERPRINT_RE.match(rel)
+            if not m:
+                abort(404)
+            e = self.entry(root, m["stem"] + m["ext"])
+            if e is None:
+                abort(404)
+            # an outdated fingerprint still gets the current bytes, just not cached forever
+            immutable = m["hash"] == e.hash
+
+        encoding = self._negotiate(e)
+        resp = send_file(e.files[encoding], mimetype=e.mimetype, conditional=True,
+                         download_name=os.path.basename(rel),
+                         etag=f"{e.hash}-{encoding}" if encoding != "identity" else e.hash,
+                         max_age=None)
+        if encoding != "identity":
+            resp.headers["Content-Encoding"] = encoding
+        if len(e.files) > 1:
+            resp.vary.add("Accept-Encoding")
+        resp.headers["Cache-Control"] = IMMUTABLE if immutable else REVALIDATE
+        return resp
+
+    def entry(self, root, rel):
+        base = self.roots[root]
+        path = safe_join(str(base), rel)
+        if path is None:
+            return None
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if not os.path.isfile(path):
+            return None
+
+        key = (root, rel)
+        sig = (st.st_mtime_ns, st.st_size)
+        e = self._entries.get(key)
+        if e and e.sig == sig and all(self._current_hash(d) == h for d, h in e.deps):
+            return e
+        with self._lock:
+            building = self._building.setdefault(key, threading.Lock())
+        # HTML builds call entry() for the static files they link: those are
+        # other keys, and static builds never wait on a page, so no cycles
+        with building:
+            e = self._entries.get(key)
+            if e and e.sig == sig and all(self._current_hash(d) == h for d, h in e.deps):
+                return e   # another request rebuilt it while we waited
+            new = self._build_entry(root, rel, Path(path), sig)
+            with self._lock:
+                self._entries[key] = new
+        if e and e.hash != new.hash:
+            self._remove(e)
+        return new
+
+    # ---- internals --------------------------------------------------
+
+    def _current_hash(self, rel):
+        e = self.entry("static", rel)
+        return e.hash if e else None
+
+    def _negotiate(self, e):
+        accepted = request.accept_encodings
+        for enc in ("br", "gzip"):
+            if enc in e.files and accepted[enc]:
+                return enc
+        return "identity"
+
+    def _build_entry(self, root, rel, path, sig):
+        mimetype = mimetypes.guess_type(rel)[0] or "application/octet-stream"
+        data = path.read_bytes()
+        deps = []
+        if mimetype == "text/html":
+            data, deps = self._rewrite_html(data)
+        digest = hashlib.sha256(data).hexdigest()[:HASH_LEN]
+
+        files = {"identity": str(path)}
+        out = self.out_dir / root / f"{rel}.{digest}"
+        if deps:
+            files["identity"] = self._write(out, data)
+        if mimetype.startswith(_COMPRESSIBLE) and len(data) >= self.min_size:
+            gz = gzip.compress(data, compresslevel=9, mtime=0)
+            if len(gz) < len(data):
+                files["gzip"] = self._write(out.with_name(out.name + ".gz"), gz)
+            if brotli is not None:
+                br = brotli.compress(data, quality=11)
+                if len(br) < len(data):
+                    files["br"] = self._write(out.with_name(out.name + ".br"), br)
+        return _Entry(sig, digest, mimetype, files, deps)
+
+    def _rewrite_html(self, data):
+        text = data.decode("utf-8")
+        deps = []
+
+        def swap(m):
+            rel = m["path"]
+            e = self.entry("static", rel)
+            if e is None:
+                return m.group(0)
+            deps.append((rel, e.hash))
+            return m["q"] + self.url(rel)
+
+        text = _STATIC_REF_RE.sub(swap, text)
+        return text.encode("utf-8"), deps
+
+    def _remove(self, e):
+        """Delete the built files of a replaced entry (never the sources)."""
+        out = self.out_dir.resolve()
+        for f in e.files.values():
+            path = Path(f).resolve()
+            if out in path.parents:
+                path.unlink(missing_ok=True)
+
+    @staticmethod
+    def _write(path, data):
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)   # atomic: concurrent builders can't serve half a file
+        return str(path)
+
+
+if __name__ == "__main__":
+    base = Path(__file__).resolve().parent
+    store = AssetStore({"static": base / "static", "template": base / "template"},
+                       base / ".build" / "assets")
+    print("built", store.build(), "assets into", store.out_dir)
@@ -0,0 +1,60 @@
+"""
+Per-request json.load + linear scan vs the JsonCatalog cache.
+
+    python bench/catalog_cache.py --n 20000
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from catalog import JsonCatalog, build_plants, build_stickers, build_tasks  # noqa: E402
+
+DATA = ROOT / "static" / "data"
+
+
+def per_request(path, key, want):
+    with open(path, "r", encoding="utf-8") as f:
+        doc = json.load(f)
+    items = doc if isinstance(doc, list) else doc.get(key, [])
+    for x in items:
+        if str(x.get("id")) == want:
+            return x
+    return None
+
+
+def timeit(fn, n):
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - t0) / n * 1e6  # µs per call
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=20000)
+    args = ap.parse_args()
+
+    cases = [
+        ("stickers.json", None, "s040", build_stickers),
+        ("tasks.json", "pool", "soil_check", build_tasks),
+        ("indoor_plants.json", None, "plant_094", build_plants),
+    ]
+    print(f"{'file':22} {'parse+scan µs':>14} {'cached µs':>10} {'speedup':>8}")
+    for name, key, want, build in cases:
+        path = DATA / name
+        cat = JsonCatalog(path, build, check_every=0)  # worst case: stat every call
+        cat.get()
+        slow = timeit(lambda: per_request(path, key, want), args.n)
+        fast = timeit(lambda: cat.get()["by_id"].get(want), args.n)
+        print(f"{name:22} {slow:14.2f} {fast:10.2f} {slow / fast:7.0f}x")
+        assert cat.loads == 1, "file must be parsed exactly once"
+    print(f"(n={args.n})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+"""
+SQLite stand-in for the MySQL database, for benchmarks on machines
+without MySQL (same idea as stub_upstream.py for the HTTP APIs).
+
+    create_schema("/tmp/bench.db")
+    app.DB_POOL = ConnectionPool(lambda: connect("/tmp/bench.db"), max_size=10)
+    app.DB_BATCH_POOL = ConnectionPool(lambda: connect("/tmp/bench.db"), max_size=5)
+
+connect() returns a pymysql-shaped connection (DictCursor rows,
+autocommit, multi-statement batches with nextset()). Statements are
+rewritten for SQLite just far enough for what app.py and wallet.py send:
+%s placeholders, user variables (@x, SET @x := .., SELECT .. INTO @x,
+ROW_COUNT()), INSERT IGNORE, ON DUPLICATE KEY UPDATE .. VALUES(col),
+IF / GREATEST / LEAST, FOR UPDATE and FROM DUAL. Anything else is passed
+through untouched, so a new MySQL-only statement fails loudly.
+
+Transactions take SQLite's single write lock up front (BEGIN IMMEDIATE),
+so concurrency numbers describe the app plus a one-writer database:
+compare runs against each other, not against MySQL.
+"""
+import re
+import sqlite3
+import threading
+from datetime import date, datetime
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+  ID              INTEGER PRIMARY KEY AUTOINCREMENT,
+  Username        TEXT NOT NULL UNIQUE COLLATE NOCASE,
+  Email           TEXT NOT NULL UNIQUE COLLATE NOCASE,
+  Password_hashed TEXT NOT NULL,
+  created_at      TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS user_wallet (
+  user_id        INTEGER PRIMARY KEY,
+  leaves         INTEGER NOT NULL DEFAULT 0,
+  plants         INTEGER NOT NULL DEFAULT 0,
+  beans          INTEGER NOT NULL DEFAULT 0,
+  moons          INTEGER NOT NULL DEFAULT 0,
+  beans_lifetime INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS user_task_log (
+  id             INTEGER PRIMARY KEY AUTOINCREMENT,
+  user_id        INTEGER NOT NULL,
+  task_id        TEXT NOT NULL,
+  task_date      TEXT NOT NULL,
+  awarded_plants INTEGER NOT NULL DEFAULT 0,
+  UNIQUE (user_id, task_id, task_date)
+);
+CREATE TABLE IF NOT EXISTS user_daily_bonus (
+  id             INTEGER PRIMARY KEY AUTOINCREMENT,
+  user_id        INTEGER NOT NULL,
+  bonus_date     TEXT NOT NULL,
+  awarded_plants INTEGER NOT NULL DEFAULT 0,
+  UNIQUE (user_id, bonus_date)
+);
+CREATE TABLE IF NOT EXISTS user_daily_stats (
+  user_id        INTEGER NOT NULL,
+  stat_date      TEXT NOT NULL,
+  tasks_done     INTEGER NOT NULL DEFAULT 0,
+  leaves_earned  INTEGER NOT NULL DEFAULT 0,
+  bonus_plants   INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (user_id, stat_date)
+);
+CREATE INDEX IF NOT EXISTS idx_user_daily_stats_date ON user_daily_stats (stat_date);
+CREATE TABLE IF NOT EXISTS user_streaks (
+  user_id          INTEGER PRIMARY KEY,
+  current_streak   INTEGER NOT NULL DEFAULT 0,
+  longest_streak   INTEGER NOT NULL DEFAULT 0,
+  last_active_date TEXT,
+  longest_date     TEXT,
+  prev_longest     INTEGER NOT NULL DEFAULT 0,
+  prev_longest_date TEXT
+);
+CREATE TABLE IF NOT EXISTS user_stickers (
+  id          INTEGER PRIMARY KEY AUTOINCREMENT,
+  user_id     INTEGER NOT NULL,
+  sticker_id  TEXT NOT NULL,
+  acquired_at TEXT,
+  UNIQUE (user_id, sticker_id)
+);
+"""
+
+_SET_RE = re.compile(r"^SET\s+@(\w+)\s*:?=\s*(.+)$", re.I | re.S)
+_INTO_RE = re.compile(r"\s+INTO\s+(@\w+(?:\s*,\s*@\w+)*)", re.I)
+_VAR_RE = re.compile(r"@(\w+)")
+_SELECT_LIST_RE = re.compile(r"^\s*SELECT\s+(.*?)\s+FROM\s", re.I | re.S)
+_UPSERT_RE = re.compile(r"ON\s+DUPLICATE\s+KEY\s+UPDATE\s+(.+)$", re.I | re.S)
+_REWRITES = [
+    (re.compile(r"^(START\s+TRANSACTION|BEGIN)$", re.I), "BEGIN IMMEDIATE"),
+    (re.compile(r"\bINSERT\s+IGNORE\b", re.I), "INSERT OR IGNORE"),
+    (re.compile(r"\bROW_COUNT\(\)", re.I), ":_row_count"),
+    (re.compile(r"\bIF\(", re.I), "iif("),
+    (re.compile(r"\bGREATEST\(", re.I), "max("),
+    (re.compile(r"\bLEAST\(", re.I), "min("),
+    (re.compile(r"\s+FOR\s+UPDATE\b", re.I), ""),
+    (re.compile(r"\s+FROM\s+DUAL\b", re.I), ""),
+]
+
+
+def _adapt(v):
+    if isinstance(v, datetime):
+        return v.isoformat(" ")
+    if isinstance(v, date):
+        return v.isoformat()
+    return v
+
+
+def _split(sql, args):
+    """Split a batch on ';' and hand each statement its share of the %s args."""
+    args = list(args or ())
+    out = []
+    for stmt in sql.split(";"):
+        n = stmt.count("%s")
+        stmt = stmt.strip()
+        if stmt:
+            out.append((stmt, args[:n]))
+        args = args[n:]
+    return out
+
+
+class Cursor:
+    def __init__(self, con):
+        self._con = con
+        self._results = []     # [(description, rows, rowcount)] per statement
+        self.description = None
+        self.rowcount = -1
+        self.lastrowid = None
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def close(self):
+        self._results, self._rows = [], []
+
+    def execute(self, query, args=None):
+        if args is not None and not isinstance(args, (tuple, list)):
+            args = (args,)
+        results = []
+        for stmt, stmt_args in _split(query, args):
+            if args is not None:
+                stmt = stmt.replace("%%", "%")
+            results.append(self._con._run(stmt, [_adapt(a) for a in stmt_args], self))
+        self._results = results
+        self._advance()
+        return self.rowcount
+
+    def executemany(self, query, seq_of_args):
+        total = 0
+        for args in seq_of_args:
+            self.execute(query, args)
+            total += max(self.rowcount, 0)
+        self.rowcount = total
+        return total
+
+    def nextset(self):
+        if not self._results:
+            return None
+        self._advance()
+        return True
+
+    def fetchone(self):
+        return self._rows.pop(0) if self._rows else None
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    def fetchmany(self, size=1):
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        return rows
+
+    def _advance(self):
+        if self._results:
+            self.description, self._rows, self.rowcount = self._results.pop(0)
+        else:
+            self.description, self._rows, self.rowcount = None, [], -1
+
+
+class Connection:
+    def __init__(self, path, timeout=10.0):
+        self._db = sqlite3.connect(str(path), timeout=timeout, isolation_level=None,
+                                   check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._vars = {}
+        self._row_count = 0
+        self._lock = threading.Lock()   # one statement at a time, like a MySQL session
+
+    def cursor(self, cursor=None):
+        return Cursor(self)
+
+    def commit(self):
+        if self._db.in_transaction:
+            self._db.execute("COMMIT")
+
+    def rollback(self):
+        if self._db.in_transaction:
+            self._db.execute("ROLLBACK")
+
+    def begin(self):
+        self._db.execute("BEGIN IMMEDIATE")
+
+    def ping(self, reconnect=False):
+        self._db.execute("SELECT 1")
+
+    def close(self):
+        self._db.close()
+
+    # ---- statement translation -------------------------------------
+
+    def _run(self, stmt, args, cur):
+        with self._lock:
+            m = _SET_RE.match(stmt)
+            if m:
+                name, expr = m.groups()
+                row = self._query(f"SELECT {expr}", args).fetchone()
+                self._vars[name] = row[0] if row else None
+                self._row_count = 0
+                return None, [], 0
+
+            into = _INTO_RE.search(stmt)
+            if into:
+                stmt = stmt[:into.start()] + stmt[into.end():]
+            c = self._query(stmt, args)
+            if c.description is None:
+                self._row_count = c.rowcount
+                cur.lastrowid = c.lastrowid
+                return None, [], c.rowcount
+
+            # MySQL names a column the way the query spells it (SELECT id -> "id"),
+            # SQLite the way the table declares it (ID)
+            m = _SELECT_LIST_RE.match(stmt)
+            spelled = {w.lower(): w for w in re.findall(r"[A-Za-z_]\w*", m.group(1))} if m else {}
+            names = [spelled.get(d[0].lower(), d[0]) for d in c.description]
+            rows = [dict(zip(names, r)) for r in c.fetchall()]
+            self._row_count = -1
+            if into:
+                targets = [v.strip()[1:] for v in into.group(1).split(",")]
+                if rows:
+                    self._vars.update(zip(targets, rows[0].values()))
+                return None, [], len(rows)
+            description = tuple((n, None, None, None, None, None, None) for n in names)
+            return description, rows, len(rows)
+
+    def _query(self, stmt, args):
+        params = {"_row_count": self._row_count}
+        for pattern, repl in _REWRITES:
+            stmt = pattern.sub(repl, stmt)
+        m = _UPSERT_RE.search(stmt)
+        if m:
+            sets = re.sub(r"\bVALUES\((\w+)\)", r"excluded.\1", m.group(1), flags=re.I)
+            stmt = stmt[:m.start()] + "ON CONFLICT DO UPDATE SET " + sets
+
+        def var(match):
+            params[f"v_{match.group(1)}"] = self._vars.get(match.group(1))
+            return f":v_{match.group(1)}"
+
+        stmt = _VAR_RE.sub(var, stmt)
+        parts = stmt.split("%s")
+        for i, a in enumerate(args):
+            params[f"p{i}"] = a
+        stmt = "".join(p + (f":p{i}" if i < len(parts) - 1 else "") for i, p in enumerate(parts))
+        return self._db.execute(stmt, params)
+
+
+def connect(path):
+    return Connection(path)
+
+
+def create_schema(path):
+    db = sqlite3.connect(str(path))
+    db.executescript(SCHEMA)
+    db.close()
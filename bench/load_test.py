@@ -0,0 +1,324 @@
+"""
+Load test for the gamification flows: boots app.py on a local port against
+the SQLite stand-in (db_standin.py), seeds --users users with --days days
+of task history, and drives each scenario at every --concurrency level.
+
+    python bench/load_test.py --users 200 --days 60 --concurrency 1 8 32 --out before.json
+    python bench/load_test.py ... --out after.json --compare before.json
+
+Scenarios (one virtual user per thread, each its own seeded account):
+  login        POST /login with the seeded password
+  tasks_today  GET /api/tasks/today
+  toggle       POST /api/tasks/complete, ticking / unticking one of today's tasks
+  bonus        tick all of today's tasks, then POST /api/tasks/claim_all_done_bonus
+  redeem       POST /api/stickers/redeem for random stickers
+
+Per (scenario, endpoint, concurrency) it prints and writes throughput,
+p50/p95/p99/max latency and status counts; "errors" are exceptions and
+5xx only (a refused claim or an unaffordable sticker is a normal answer).
+Today's rows and the wallets are reset before every run, and the seed is
+fixed, so two runs of the same commit see the same data.
+
+Logins hash with passwords.METHOD (600k PBKDF2 rounds by default); set
+PASSWORD_HASH_METHOD=pbkdf2:sha256:1000 to keep login runs short.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+import requests
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import db_standin  # noqa: E402
+
+ROOT = Path(__file__).resolve().parent.parent
+PASSWORD = "Garden!2024"
+START_LEAVES = 1000
+SCENARIOS = ("login", "tasks_today", "toggle", "bonus", "redeem")
+
+
+def pct(xs, p):
+    return xs[min(len(xs) - 1, int(len(xs) * p))] if xs else None
+
+
+# --------------------------------------------------------------------
+# Data
+# --------------------------------------------------------------------
+def seed(path, users, days, task_ids, pw_hash, rng):
+    db_standin.create_schema(path)
+    con = db_standin.connect(path)
+    with con.cursor() as cur:
+        cur.execute("BEGIN")
+        cur.executemany("INSERT INTO users (ID, Username, Email, Password_hashed) VALUES (%s,%s,%s,%s)",
+                        [(u, f"bench_user_{u}", f"bench{u}@example.com", pw_hash)
+                         for u in range(1, users + 1)])
+        logs, bonuses = [], []
+        today = date.today()
+        for u in range(1, users + 1):
+            for d in range(1, days + 1):
+                day = (today - timedelta(days=d)).isoformat()
+                done = rng.sample(task_ids, rng.choice((0, 1, 2, 3, 3, 3)))
+                logs.extend((u, t, day, 3) for t in done)
+                if len(done) == 3:
+                    bonuses.append((u, day, 2))
+        cur.executemany("INSERT INTO user_task_log (user_id, task_id, task_date, awarded_plants) "
+                        "VALUES (%s,%s,%s,%s)", logs)
+        cur.executemany("INSERT INTO user_daily_bonus (user_id, bonus_date, awarded_plants) "
+                        "VALUES (%s,%s,%s)", bonuses)
+        cur.execute("INSERT INTO user_daily_stats (user_id, stat_date, tasks_done, leaves_earned, bonus_plants) "
+                    "SELECT user_id, task_date, COUNT(*), SUM(awarded_plants), 0 "
+                    "FROM user_task_log GROUP BY user_id, task_date")
+        cur.execute("COMMIT")
+    con.close()
+    return len(logs)
+
+
+def reset(path, users):
+    """Undo what a run changed: today's ticks, bonus and totals, streaks, purchases, balances."""
+    con = db_standin.connect(path)
+    today = date.today().isoformat()
+    with con.cursor() as cur:
+        cur.execute("BEGIN")
+        cur.execute("DELETE FROM user_task_log WHERE task_date=%s", (today,))
+        cur.execute("DELETE FROM user_daily_bonus WHERE bonus_date=%s", (today,))
+        cur.execute("DELETE FROM user_daily_stats WHERE stat_date=%s", (today,))
+        cur.execute("DELETE FROM user_streaks")
+        cur.execute("DELETE FROM user_stickers")
+        cur.execute("DELETE FROM user_wallet")
+        cur.executemany("INSERT INTO user_wallet (user_id, leaves, plants, beans_lifetime) "
+                        "VALUES (%s,%s,%s,0)", [(u, START_LEAVES, 20) for u in range(1, users + 1)])
+        cur.execute("COMMIT")
+    con.close()
+
+
+# --------------------------------------------------------------------
+# Scenarios: fn(client) -> None; client.call() records each request
+# --------------------------------------------------------------------
+class Client:
+    def __init__(self, base, uid, cookie, sticker_ids, rng):
+        self.base, self.uid, self.rng = base, uid, rng
+        self.sticker_ids = sticker_ids
+        self.http = requests.Session()
+        if cookie:
+            self.http.cookies.set("session", cookie)
+        self.record = None    # set once warm-up requests are done
+        self._today = None
+
+    def call(self, endpoint, method, path, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            res = self.http.request(method, self.base + path, allow_redirects=False,
+                                    timeout=60, **kwargs)
+            status = res.status_code
+        except requests.RequestException:
+            res, status = None, "exception"
+        if self.record:
+            self.record(endpoint, (time.perf_counter() - t0) * 1000, status)
+        return res
+
+    def today(self):
+        if self._today is None:
+            res = self.call("GET /api/tasks/today", "GET", "/api/tasks/today")
+            self._today = [t["id"] for t in res.json()["tasks"]] if res is not None and res.ok else []
+        return self._today
+
+
+def sc_login(c):
+    c.call("POST /login", "POST", "/login",
+           data={"username_or_email": f"bench_user_{c.uid}", "password": PASSWORD})
+
+
+def sc_tasks_today(c):
+    c.call("GET /api/tasks/today", "GET", "/api/tasks/today")
+
+
+def sc_toggle(c):
+    tasks = c.today()
+    if tasks:
+        c.call("POST /api/tasks/complete", "POST", "/api/tasks/complete",
+               json={"task_id": tasks[0], "done": c.rng.random() < 0.5})
+
+
+def sc_bonus(c):
+    for t in c.today():
+        c.call("POST /api/tasks/complete", "POST", "/api/tasks/complete",
+               json={"task_id": t, "done": True})
+    c.call("POST /api/tasks/claim_all_done_bonus", "POST", "/api/tasks/claim_all_done_bonus")
+
+
+def sc_redeem(c):
+    c.call("POST /api/stickers/redeem", "POST", "/api/stickers/redeem",
+           json={"sticker_id": c.rng.choice(c.sticker_ids)})
+
+
+# --------------------------------------------------------------------
+# Driver
+# --------------------------------------------------------------------
+def run(base, scenario, concurrency, iterations, cookies, sticker_ids, seed_):
+    samples = {}   # endpoint -> ([ms], {status: n})
+    lock = threading.Lock()
+
+    def record(endpoint, ms, status):
+        with lock:
+            lat, statuses = samples.setdefault(endpoint, ([], {}))
+            lat.append(ms)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    fn = globals()[f"sc_{scenario}"]
+
+    def worker(i):
+        uid = i + 1
+        c = Client(base, uid, None if scenario == "login" else cookies[uid], sticker_ids,
+                   random.Random(seed_ * 1000 + i))
+        if scenario != "login":
+            c.today()       # today's picks, untimed
+        c.record = record
+        for _ in range(iterations):
+            fn(c)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+
+    out = []
+    for endpoint, (lat, statuses) in sorted(samples.items()):
+        lat.sort()
+        errors = sum(n for s, n in statuses.items() if s == "exception" or s.startswith("5"))
+        out.append({
+            "scenario": scenario, "endpoint": endpoint, "concurrency": concurrency,
+            "requests": len(lat), "errors": errors, "status": statuses,
+            "wall_s": round(wall, 3), "throughput_rps": round(len(lat) / wall, 1),
+            "p50_ms": round(pct(lat, 0.50), 2), "p95_ms": round(pct(lat, 0.95), 2),
+            "p99_ms": round(pct(lat, 0.99), 2), "max_ms": round(lat[-1], 2),
+        })
+    return out
+
+
+def serve(flask_app):
+    from werkzeug.serving import make_server
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)   # no access log per request
+    server = make_server("127.0.0.1", 0, flask_app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def git_rev():
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                             capture_output=True, text=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                               capture_output=True, text=True).stdout.strip()
+        return rev + ("-dirty" if dirty else "")
+    except OSError:
+        return None
+
+
+def compare(results, old_path):
+    old = {(r["scenario"], r["endpoint"], r["concurrency"]): r
+           for r in json.loads(Path(old_path).read_text())["results"]}
+    print(f"\nvs {old_path}:")
+    print(f"{'scenario':>12} {'endpoint':<38} {'conc':>4} {'rps':>14} {'p50':>14} {'p95':>14} {'p99':>14}")
+    for r in results:
+        o = old.get((r["scenario"], r["endpoint"], r["concurrency"]))
+        if not o:
+            continue
+        cells = []
+        for k in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms"):
+            delta = (r[k] - o[k]) / o[k] * 100 if o[k] else 0.0
+            cells.append(f"{r[k]:>7} {delta:+5.0f}%")
+        print(f"{r['scenario']:>12} {r['endpoint']:<38} {r['concurrency']:>4} " + " ".join(cells))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=200)
+    ap.add_argument("--days", type=int, default=60, help="days of user_task_log history per user")
+    ap.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    ap.add_argument("--iterations", type=int, default=20, help="scenario loops per virtual user")
+    ap.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--db", help="stand-in database file (default: a temp file)")
+    ap.add_argument("--out", help="write results as JSON here")
+    ap.add_argument("--compare", help="earlier --out file to diff against")
+    args = ap.parse_args()
+    if max(args.concurrency) > args.users:
+        ap.error("--users must be >= the largest --concurrency (one account per thread)")
+
+    tmp = None
+    if args.db:
+        path = Path(args.db)
+        path.unlink(missing_ok=True)
+    else:
+        tmp = tempfile.TemporaryDirectory()
+        path = Path(tmp.name) / "bench.db"
+
+    import app as web
+    from db_pool import ConnectionPool
+    from flask.sessions import SecureCookieSessionInterface
+    from passwords import METHOD, SALT_LENGTH
+    from werkzeug.security import generate_password_hash
+
+    rng = random.Random(args.seed)
+    task_ids = sorted(web.TASKS.get()["by_id"])
+    sticker_ids = sorted(web.STICKERS.get()["by_id"])
+    t0 = time.perf_counter()
+    n_logs = seed(path, args.users, args.days, task_ids,
+                  generate_password_hash(PASSWORD, method=METHOD, salt_length=SALT_LENGTH), rng)
+    print(f"seeded {args.users} users, {n_logs} task log rows in {time.perf_counter() - t0:.1f}s ({path})")
+
+    for name in ("DB_POOL", "DB_BATCH_POOL"):
+        pool = getattr(web, name)
+        setattr(web, name, ConnectionPool(lambda: db_standin.connect(path), max_size=pool.max_size,
+                                          timeout=pool.timeout))
+    signer = SecureCookieSessionInterface().get_signing_serializer(web.app)
+    cookies = {u: signer.dumps({"user_id": u}) for u in range(1, args.users + 1)}
+    server, base = serve(web.app)
+
+    results = []
+    print(f"{'scenario':>12} {'endpoint':<38} {'conc':>4} {'reqs':>6} {'err':>4} "
+          f"{'rps':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for scenario in args.scenarios:
+        for conc in args.concurrency:
+            reset(path, args.users)
+            web._TODAY_PICKS.clear()
+            for r in run(base, scenario, conc, args.iterations, cookies, sticker_ids, args.seed):
+                results.append(r)
+                print(f"{r['scenario']:>12} {r['endpoint']:<38} {r['concurrency']:>4} {r['requests']:>6} "
+                      f"{r['errors']:>4} {r['throughput_rps']:>7} {r['p50_ms']:>8} "
+                      f"{r['p95_ms']:>8} {r['p99_ms']:>8}")
+    server.shutdown()
+
+    report = {
+        "meta": {
+            "commit": git_rev(), "python": platform.python_version(), "cpus": os.cpu_count(),
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S"), "db": "sqlite-standin",
+            "password_method": METHOD, "args": vars(args),
+        },
+        "results": results,
+    }
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2))
+        print("wrote", args.out)
+    if args.compare:
+        compare(results, args.compare)
+    if tmp:
+        tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
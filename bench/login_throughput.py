@@ -0,0 +1,96 @@
+"""
+Login bursts: password checks inline in request threads (old do_login)
+vs the bounded passwords.Hasher.
+
+    python bench/login_throughput.py --clients 32 --logins 4
+
+Every client thread plays a request thread doing `--logins` logins back to
+back; a probe thread meanwhile times a cheap request (a small JSON dump)
+every 10 ms, i.e. what everybody else on the site feels during the burst.
+No database involved: only the hashing side of login is measured.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from werkzeug.security import check_password_hash, generate_password_hash  # noqa: E402
+
+from passwords import METHOD, Hasher, Saturated  # noqa: E402
+
+PASSWORD = "Garden!2024"
+
+
+def pct(xs, p):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(len(xs) * p))] if xs else float("nan")
+
+
+def run(name, verify, clients, logins):
+    lat, rejected, stop = [], [0], threading.Event()
+    probe = []
+    lock = threading.Lock()
+
+    def client():
+        for _ in range(logins):
+            t0 = time.perf_counter()
+            try:
+                verify()
+            except Saturated:
+                with lock:
+                    rejected[0] += 1
+                continue
+            with lock:
+                lat.append((time.perf_counter() - t0) * 1000)
+
+    def prober():
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            json.dumps({"leaves": list(range(200))})
+            probe.append((time.perf_counter() - t0) * 1000)
+            time.sleep(0.01)
+
+    p = threading.Thread(target=prober)
+    p.start()
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+    stop.set()
+    p.join()
+
+    print(f"{name:>10} {len(lat) / wall:>8.1f} {statistics.median(lat) if lat else 0:>9.0f} "
+          f"{pct(lat, 0.95):>9.0f} {rejected[0]:>6} {pct(probe, 0.5):>10.2f} {pct(probe, 0.99):>10.2f}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--clients", type=int, default=32)
+    ap.add_argument("--logins", type=int, default=4)
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    ap.add_argument("--queue", type=int, default=16)
+    args = ap.parse_args()
+
+    pw_hash = generate_password_hash(PASSWORD, method=METHOD, salt_length=16)
+    hasher = Hasher(workers=args.workers, max_queue=args.queue)
+
+    print(f"{args.clients} clients x {args.logins} logins, {METHOD}, "
+          f"{args.workers} hash workers, queue {args.queue}")
+    print(f"{'mode':>10} {'logins/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'429s':>6} "
+          f"{'probe p50':>10} {'probe p99':>10}")
+    run("inline", lambda: check_password_hash(pw_hash, PASSWORD), args.clients, args.logins)
+    run("bounded", lambda: hasher.verify(pw_hash, PASSWORD), args.clients, args.logins)
+    print("hasher:", hasher.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+N-day moon calendar: scalar loop vs NumPy-vectorized.
+
+    python bench/lunar_calendar.py --days 30 365 3650
+"""
+import argparse
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import lunar  # noqa: E402
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000.0  # ms
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--days", type=int, nargs="+", default=[30, 365, 3650])
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+    if lunar.np is None:
+        sys.exit("numpy is not installed")
+
+    start = date(2026, 1, 1)
+    print(f"{'days':>6} {'scalar ms':>10} {'vector ms':>10} {'speedup':>8}")
+    for n in args.days:
+        end = start + timedelta(days=n - 1)
+        codes, illum = lunar.calendar_vector(start, end)
+        assert (codes.tolist(), illum.tolist()) == lunar.calendar_scalar(start, end), "mismatch"
+        slow = best_of(lambda: lunar.calendar_scalar(start, end), args.repeat)
+        fast = best_of(lambda: lunar.calendar_vector(start, end), args.repeat)
+        print(f"{n:6d} {slow:10.3f} {fast:10.3f} {slow / fast:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Request-thread occupancy of /pest-detect, synchronous vs ?async=1.
+
+    python bench/pest_async_load.py --clients 32 --infer-ms 200
+
+Boots app.py on a local threaded server with a deliberately slow model
+(SlowModel below, sleeping --infer-ms per batch) and fires --clients
+concurrent uploads of distinct images. A WSGI wrapper measures how long
+request threads are busy; async clients poll GET /pest-detect/<job_id>.
+"""
+import argparse
+import io
+import logging
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(HERE.parent))
+sys.path.insert(0, str(HERE))
+
+from pest_inference import ReferenceModel  # noqa: E402
+
+
+class SlowModel(ReferenceModel):
+    """ReferenceModel plus a fixed per-batch delay standing in for a real network."""
+
+    def predict(self, batch):
+        time.sleep(float(os.getenv("BENCH_INFER_MS", "200")) / 1000.0)
+        return super().predict(batch)
+
+
+class Occupancy:
+    def __init__(self, wsgi):
+        self.wsgi = wsgi
+        self.lock = threading.Lock()
+        self.busy_s = 0.0
+        self.active = 0
+        self.peak = 0
+
+    def __call__(self, environ, start_response):
+        t0 = time.perf_counter()
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            return list(self.wsgi(environ, start_response))
+        finally:
+            with self.lock:
+                self.active -= 1
+                self.busy_s += time.perf_counter() - t0
+
+    def reset(self):
+        self.busy_s, self.active, self.peak = 0.0, 0, 0
+
+
+def make_image(i):
+    from PIL import Image
+    buf = io.BytesIO()
+    Image.new("RGB", (1600, 1200), (i % 256, (i * 7) % 256, 60)).save(buf, "JPEG")
+    return buf.getvalue()
+
+
+def run(base, images, use_async):
+    import requests
+
+    latencies, done_at = [], []
+    t_start = time.perf_counter()
+
+    def client(blob):
+        s = requests.Session()
+        t0 = time.perf_counter()
+        url = base + "/pest-detect" + ("?async=1" if use_async else "")
+        r = s.post(url, files={"file": ("leaf.jpg", blob, "image/jpeg")})
+        latencies.append(time.perf_counter() - t0)
+        body = r.json()
+        while use_async and body.get("status") == "pending":
+            time.sleep(0.05)
+            body = s.get(f"{base}/pest-detect/{body['job_id']}").json()
+        done_at.append(time.perf_counter() - t_start)
+
+    ts = [threading.Thread(target=client, args=(b,)) for b in images]
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+    return latencies, max(done_at)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--clients", type=int, default=32)
+    ap.add_argument("--infer-ms", type=float, default=200)
+    ap.add_argument("--workers", type=int, default=2)
+    args = ap.parse_args()
+
+    os.environ["BENCH_INFER_MS"] = str(args.infer_ms)
+    os.environ["PEST_MODEL"] = "pest_async_load:SlowModel"
+    os.environ["PEST_WORKERS"] = str(args.workers)
+
+    from werkzeug.serving import make_server
+    import app as bloom
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+
+    occ = Occupancy(bloom.app.wsgi_app)
+    bloom.app.wsgi_app = occ
+    server = make_server("127.0.0.1", 0, bloom.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    bloom.get_pest_engine()  # warm workers before timing
+
+    print(f"{'mode':6} {'POST p50 ms':>12} {'thread-s busy':>14} {'peak threads':>13} {'all done s':>11}")
+    for offset, mode in ((0, "sync"), (10_000, "async")):
+        images = [make_image(offset + i) for i in range(args.clients)]  # distinct → no cache hits
+        occ.reset()
+        lat, wall = run(base, images, mode == "async")
+        lat.sort()
+        print(f"{mode:6} {lat[len(lat) // 2] * 1000:12.1f} {occ.busy_s:14.2f} {occ.peak:13d} {wall:11.2f}")
+    server.shutdown()
+    bloom.get_pest_engine().close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Plant FAQ retrieval at catalog scale: full build, incremental rebuild after
+one edit, and query latency, against a naive per-query scan.
+
+    python bench/retrieval_index.py --plants 94 5000 20000
+
+Larger catalogs are indoor_plants.json repeated with renamed plants.
+"""
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import retrieval  # noqa: E402
+
+ROOT = Path(__file__).resolve().parent.parent
+QUERIES = [
+    "how often to water snake plant", "does peace lily need direct sunlight",
+    "which plants are toxic to pets", "best soil for orchids", "avoid overwatering",
+    "bright indirect light herb", "air purification benefits", "moist soil fern",
+]
+
+
+def synthetic(base, n):
+    out = []
+    for i in range(n):
+        p = dict(base[i % len(base)])
+        p["id"] = f"plant_{i:06d}"
+        if i >= len(base):
+            p["plant"] = f"{p.get('plant')} {i // len(base)}"
+        out.append(p)
+    return out
+
+
+def naive_search(doc, query, k):
+    """Tokenise every passage per query: what a no-index version would do."""
+    q = set(retrieval.tokenize(query))
+    scored = []
+    for p in doc:
+        for meta, text in retrieval.plant_passages(p):
+            s = len(q & set(retrieval.tokenize(text)))
+            if s:
+                scored.append((s, meta))
+    scored.sort(key=lambda x: -x[0])
+    return scored[:k]
+
+
+def ms(t0):
+    return (time.perf_counter() - t0) * 1000.0
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--plants", type=int, nargs="+", default=[94, 5000, 20000])
+    ap.add_argument("--queries", type=int, default=200)
+    args = ap.parse_args()
+    base = json.loads((ROOT / "static" / "data" / "indoor_plants.json").read_text("utf-8"))
+
+    print(f"{'plants':>7} {'passages':>9} {'build ms':>9} {'rebuild ms':>10} "
+          f"{'p50 ms':>7} {'p95 ms':>7} {'naive ms':>9}")
+    for n in args.plants:
+        doc = synthetic(base, n)
+        build = retrieval.IncrementalBuilder()
+        t0 = time.perf_counter()
+        view = build(doc)
+        t_build = ms(t0)
+
+        doc[n // 2] = dict(doc[n // 2], faq={"watering": "Keep evenly moist"})
+        t0 = time.perf_counter()
+        view = build(doc)
+        t_rebuild = ms(t0)
+        assert view["retokenized"] == 1
+
+        idx = view["index"]
+        lat = []
+        for _ in range(args.queries):
+            q = random.choice(QUERIES)
+            t0 = time.perf_counter()
+            idx.search(q, k=4)
+            lat.append(ms(t0))
+        lat.sort()
+        t0 = time.perf_counter()
+        naive_search(doc, QUERIES[0], 4)
+        t_naive = ms(t0)
+
+        print(f"{n:>7} {idx.n:>9} {t_build:>9.1f} {t_rebuild:>10.1f} "
+              f"{statistics.median(lat):>7.3f} {lat[int(len(lat) * 0.95)]:>7.3f} {t_naive:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Local stand-in for the third-party APIs, for tests and benchmarks.
+
+    python bench/stub_upstream.py --port 8765 --delay 0.05 --fail-rate 0
+    IPGEO_URL=http://127.0.0.1:8765/astronomy python app.py
+
+Endpoints
+    /astronomy            ipgeolocation-shaped moon data
+    /data/2.5/weather     OpenWeather-shaped current weather
+    /__stats              hit counts per path
+    /__mode?fail=1&delay=3  change behaviour at runtime
+
+Also importable: `serve(port=0)` starts it on a thread and returns
+(server, base_url).
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+STATE = {"delay": 0.0, "fail_rate": 0.0, "hits": Counter()}
+_lock = threading.Lock()
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real APIs
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, code, body):
+        raw = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        q = {k: v[-1] for k, v in parse_qs(url.query).items()}
+
+        if url.path == "/__stats":
+            with _lock:
+                return self._send(200, dict(STATE["hits"]))
+        if url.path == "/__mode":
+            with _lock:
+                if "fail" in q:
+                    STATE["fail_rate"] = float(q["fail"])
+                if "delay" in q:
+                    STATE["delay"] = float(q["delay"])
+            return self._send(200, {"delay": STATE["delay"], "fail_rate": STATE["fail_rate"]})
+
+        with _lock:
+            STATE["hits"][url.path] += 1
+            delay, fail_rate = STATE["delay"], STATE["fail_rate"]
+        time.sleep(delay)
+        if random.random() < fail_rate:
+            return self._send(503, {"message": "stub failure"})
+
+        if url.path == "/astronomy":
+            return self._send(200, {
+                "date": q.get("date"),
+                "moon_phase": "WAXING_GIBBOUS",
+                "moon_illumination": "71.3",
+            })
+        if url.path == "/data/2.5/weather":
+            return self._send(200, {
+                "name": "Stubville",
+                "coord": {"lat": float(q.get("lat", 0)), "lon": float(q.get("lon", 0))},
+                "main": {"temp": 29.5, "humidity": 74},
+                "weather": [{"id": 802, "main": "Clouds", "description": "scattered clouds"}],
+            })
+        return self._send(404, {"message": "not found"})
+
+
+def serve(port=0, delay=0.0, fail_rate=0.0):
+    STATE.update(delay=delay, fail_rate=fail_rate)
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--delay", type=float, default=0.0)
+    ap.add_argument("--fail-rate", type=float, default=0.0)
+    args = ap.parse_args()
+    server, url = serve(args.port, args.delay, args.fail_rate)
+    print("stub upstream on", url)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""
+Hammer ONE user's wallet from many threads and compare the old
+read-check-then-write statements with the wallet.py service.
+
+    python bench/wallet_concurrency.py --threads 32 --ops 200
+
+Needs the MySQL configured in app.DB (migrated: python migrate.py). It
+only touches rows of --user (default 900001) and deletes them afterwards.
+
+Two scenarios per implementation:
+  toggle  each thread ticks/unticks the same few tasks; afterwards
+          leaves must equal start + leaves_per_task * rows left in the log
+  shop    each thread buys stickers until refused; afterwards
+          leaves must equal start - cost * stickers owned, and never < 0
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pymysql  # noqa: E402
+
+import wallet  # noqa: E402
+from app import DB_BATCH  # noqa: E402
+from db_pool import ConnectionPool  # noqa: E402
+
+LEAVES_PER_TASK = 3
+STICKER_COST = 10
+TASK_IDS = ["bench_a", "bench_b", "bench_c"]
+
+
+# ---- the statements app.py used before the service layer -----------------
+
+def legacy_toggle(cur, uid, task_id, day, done):
+    cur.execute("SELECT awarded_plants FROM user_task_log "
+                "WHERE user_id=%s AND task_id=%s AND task_date=%s", (uid, task_id, day))
+    row = cur.fetchone()
+    if done and not row:
+        cur.execute("INSERT INTO user_task_log (user_id, task_id, task_date, awarded_plants) "
+                    "VALUES (%s,%s,%s,%s)", (uid, task_id, day, LEAVES_PER_TASK))
+        cur.execute("UPDATE user_wallet SET leaves = leaves + %s WHERE user_id=%s",
+                    (LEAVES_PER_TASK, uid))
+    elif not done and row:
+        cur.execute("DELETE FROM user_task_log WHERE user_id=%s AND task_id=%s AND task_date=%s",
+                    (uid, task_id, day))
+        cur.execute("UPDATE user_wallet SET leaves = GREATEST(0, leaves - %s) WHERE user_id=%s",
+                    (int(row["awarded_plants"]), uid))
+    cur.execute("SELECT leaves, plants FROM user_wallet WHERE user_id=%s", (uid,))
+    cur.fetchone()
+
+
+def legacy_redeem(cur, uid, sid, day):
+    cur.execute("SELECT 1 FROM user_stickers WHERE user_id=%s AND sticker_id=%s LIMIT 1", (uid, sid))
+    if cur.fetchone():
+        return "already_owned"
+    cur.execute("SELECT leaves, plants FROM user_wallet WHERE user_id=%s LIMIT 1", (uid,))
+    w = cur.fetchone() or {"leaves": 0}
+    if int(w["leaves"]) < STICKER_COST:
+        return "insufficient"
+    cur.execute("UPDATE user_wallet SET leaves = leaves - %s WHERE user_id=%s", (STICKER_COST, uid))
+    cur.execute("INSERT INTO user_stickers (user_id, sticker_id, acquired_at) VALUES (%s,%s,%s)",
+                (uid, sid, day))
+    cur.execute("SELECT leaves, plants FROM user_wallet WHERE user_id=%s", (uid,))
+    cur.fetchone()
+    return "ok"
+
+
+def service_toggle(cur, uid, task_id, day, done):
+    if done:
+        wallet.complete_task(cur, uid, task_id, day, LEAVES_PER_TASK)
+    else:
+        wallet.undo_task(cur, uid, task_id, day)
+
+
+def service_redeem(cur, uid, sid, day):
+    return wallet.redeem_sticker(cur, uid, sid, "leaves", STICKER_COST, day)["status"]
+
+
+# ---- harness ---------------------------------------------------------------
+
+def reset(pool, uid, leaves):
+    with pool.connection() as con, con.cursor() as cur:
+        cur.execute("DELETE FROM user_task_log WHERE user_id=%s", (uid,))
+        cur.execute("DELETE FROM user_stickers WHERE user_id=%s", (uid,))
+        cur.execute("DELETE FROM user_daily_bonus WHERE user_id=%s", (uid,))
+        cur.execute("INSERT INTO user_wallet (user_id, leaves, plants, beans_lifetime) "
+                    "VALUES (%s,%s,0,0) ON DUPLICATE KEY UPDATE leaves=VALUES(leaves), plants=0",
+                    (uid, leaves))
+
+
+def snapshot(pool, uid):
+    with pool.connection() as con, con.cursor() as cur:
+        cur.execute("SELECT leaves FROM user_wallet WHERE user_id=%s", (uid,))
+        leaves = int(cur.fetchone()["leaves"])
+        cur.execute("SELECT COUNT(*) AS c FROM user_task_log WHERE user_id=%s", (uid,))
+        logged = int(cur.fetchone()["c"])
+        cur.execute("SELECT COUNT(*) AS c FROM user_stickers WHERE user_id=%s", (uid,))
+        owned = int(cur.fetchone()["c"])
+    return leaves, logged, owned
+
+
+def hammer(pool, threads, fn):
+    errors = []
+    start = threading.Barrier(threads + 1)
+
+    def worker(i):
+        start.wait()
+        try:
+            fn(i)
+        except Exception as e:  # a lost race shows up as an error, count it
+            errors.append(repr(e))
+
+    ts = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in ts:
+        t.start()
+    start.wait()
+    t0 = time.perf_counter()
+    for t in ts:
+        t.join()
+    return time.perf_counter() - t0, errors
+
+
+def run_toggle(pool, uid, threads, ops, toggle):
+    start_leaves = 1000
+    reset(pool, uid, start_leaves)
+    day = date.today().isoformat()
+    errors_seen = []
+
+    def body(i):
+        for n in range(ops):
+            with pool.connection() as con, con.cursor() as cur:
+                try:
+                    toggle(cur, uid, TASK_IDS[(i + n) % len(TASK_IDS)], day, (i + n) % 2 == 0)
+                except pymysql.MySQLError as e:
+                    errors_seen.append(repr(e))
+
+    secs, errors = hammer(pool, threads, body)
+    leaves, logged, _ = snapshot(pool, uid)
+    expected = start_leaves + LEAVES_PER_TASK * logged
+    return {
+        "ops_per_s": round(threads * ops / secs, 1),
+        "errors": len(errors) + len(errors_seen),
+        "leaves": leaves,
+        "expected": expected,
+        "invariant_ok": leaves == expected,
+    }
+
+
+def run_shop(pool, uid, threads, ops, redeem):
+    start_leaves = STICKER_COST * threads  # enough for a quarter of the attempts
+    reset(pool, uid, start_leaves)
+    day = date.today().isoformat()
+    paid = []
+
+    def body(i):
+        for n in range(ops):
+            # half the threads fight over the same stickers, half buy distinct ones
+            sid = f"bench_{n}" if i % 2 else f"bench_{i}_{n}"
+            with pool.connection() as con, con.cursor() as cur:
+                try:
+                    if redeem(cur, uid, sid, day) == "ok":
+                        paid.append(sid)
+                except pymysql.MySQLError:
+                    pass
+
+    secs, errors = hammer(pool, threads, body)
+    leaves, _, owned = snapshot(pool, uid)
+    expected = start_leaves - STICKER_COST * owned
+    return {
+        "ops_per_s": round(threads * ops / secs, 1),
+        "errors": len(errors),
+        "charged": len(paid),
+        "owned": owned,
+        "leaves": leaves,
+        "expected": expected,
+        "invariant_ok": leaves == expected and leaves >= 0 and len(paid) == owned,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--threads", type=int, default=16)
+    ap.add_argument("--ops", type=int, default=100, help="operations per thread")
+    ap.add_argument("--user", type=int, default=900001)
+    args = ap.parse_args()
+
+    pool = ConnectionPool(lambda: pymysql.connect(**DB_BATCH), max_size=args.threads)
+    try:
+        for name, toggle, redeem in (("legacy", legacy_toggle, legacy_redeem),
+                                     ("service", service_toggle, service_redeem)):
+            print(name, "toggle", run_toggle(pool, args.user, args.threads, args.ops, toggle))
+            print(name, "shop  ", run_shop(pool, args.user, args.threads, args.ops, redeem))
+    finally:
+        reset(pool, args.user, 0)
+        with pool.connection() as con, con.cursor() as cur:
+            cur.execute("DELETE FROM user_wallet WHERE user_id=%s", (args.user,))
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+/weather under a burst of nearby users, against bench/stub_upstream.py:
+one fresh requests.get per call (old weather_api) vs the grid-cell cache
+with a pooled session, then a slow upstream to show degraded serving.
+
+    python bench/weather_cache.py --clients 32 --calls 8 --cells 4 --delay 0.2
+
+Clients ask for random points within --cells grid cells; "upstream" is
+the number of calls the stub actually saw.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+
+import requests
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import stub_upstream  # noqa: E402
+
+SLOW_S = 0.3
+TTL_S = 1.0
+
+
+def pct(xs, p):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(len(xs) * p))] if xs else float("nan")
+
+
+def upstream_hits(base):
+    return requests.get(f"{base}/__stats", timeout=2).json().get("/data/2.5/weather", 0)
+
+
+def points(cells, grid):
+    centres = [(16.80 + i * grid * 3, 96.15 + i * grid * 3) for i in range(cells)]
+    lat, lon = random.choice(centres)
+    return lat + random.uniform(-grid / 3, grid / 3), lon + random.uniform(-grid / 3, grid / 3)
+
+
+def run(name, call, base, clients, calls, cells, grid):
+    lat, errors = [], [0]
+    lock = threading.Lock()
+    before = upstream_hits(base)
+
+    def client():
+        for _ in range(calls):
+            t0 = time.perf_counter()
+            ok = call(*points(cells, grid))
+            with lock:
+                lat.append((time.perf_counter() - t0) * 1000)
+                errors[0] += not ok
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+    print(f"{name:>8} {len(lat) / wall:>7.1f} {statistics.median(lat):>8.1f} {pct(lat, 0.95):>8.1f} "
+          f"{upstream_hits(base) - before:>9} {errors[0]:>7}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--clients", type=int, default=32)
+    ap.add_argument("--calls", type=int, default=8)
+    ap.add_argument("--cells", type=int, default=4)
+    ap.add_argument("--delay", type=float, default=0.2, help="stub latency, seconds")
+    args = ap.parse_args()
+
+    server, base = stub_upstream.serve(delay=args.delay)
+    os.environ.update(OPENWEATHER_KEY="bench", WEATHER_URL=f"{base}/data/2.5/weather",
+                      WEATHER_TTL=str(TTL_S), WEATHER_STALE="0", WEATHER_SLOW_S=str(SLOW_S))
+    import app as web  # reads the env above
+
+    client = web.app.test_client()
+    grid = web.WEATHER_GRID
+
+    def direct(lat, lon):
+        res = requests.get(f"{base}/data/2.5/weather?lat={lat}&lon={lon}&appid=bench&units=metric",
+                           timeout=10)
+        return res.ok
+
+    def cached(lat, lon):
+        return client.get(f"/weather?lat={lat}&lon={lon}").status_code == 200
+
+    print(f"{args.clients} clients x {args.calls} calls over {args.cells} cells, "
+          f"stub delay {args.delay * 1000:.0f} ms, grid {grid} deg")
+    print(f"{'mode':>8} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'upstream':>9} {'errors':>7}")
+    run("direct", direct, base, args.clients, args.calls, args.cells, grid)
+    run("cached", cached, base, args.clients, args.calls, args.cells, grid)
+
+    # upstream turns slow once every cell has expired: last known values
+    # should come back after ~WEATHER_SLOW_S instead of the stub's delay
+    time.sleep(TTL_S + 0.1)
+    requests.get(f"{base}/__mode?delay=3", timeout=2)
+    run("degraded", cached, base, args.clients, 1, args.cells, grid)
+    requests.get(f"{base}/__mode?delay=0", timeout=2)
+    print("weather cache:", web.WEATHER_CACHE.stats())
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Shared, in-process cache for the JSON data files under static/data.
+
+Each file is parsed once and re-parsed only when its (mtime, size) changes;
+on (re)load a builder turns the raw document into a view with dict indexes
+so request handlers do O(1) lookups instead of json.load + linear scans.
+
+    STICKERS = JsonCatalog(DATA_DIR / "stickers.json", build_stickers)
+    STICKERS.get()["by_id"].get("s001")
+"""
+import json
+import threading
+import time
+
+import metrics
+
+
+class JsonCatalog:
+    def __init__(self, path, build=lambda doc: doc, check_every=1.0):
+        """
+        path         JSON file to watch
+        build        doc -> view; runs once per (re)parse
+        check_every  seconds between stat() calls; 0 stats on every get()
+        """
+        self.path = path
+        self._build = build
+        self.check_every = check_every
+        self._lock = threading.Lock()
+        self._sig = None          # (mtime_ns, size) of the parsed version
+        self._view = None
+        self._checked_at = 0.0
+        self.loads = 0            # number of parses, handy for tests/benchmarks
+
+    def get(self):
+        now = time.monotonic()
+        if self._view is not None and now - self._checked_at < self.check_every:
+            return self._view
+        with self._lock:
+            self._checked_at = now
+            st = self.path.stat()
+            sig = (st.st_mtime_ns, st.st_size)
+            if sig != self._sig:
+                t0 = time.perf_counter()
+                try:
+                    doc = json.loads(self.path.read_text(encoding="utf-8"))
+                    self._view = self._build(doc)
+                except Exception as e:
+                    if self._view is None:
+                        raise
+                    # half-written file during a deploy: keep serving the last good copy
+                    print(f"{self.path.name} reload error, keeping previous:", e)
+                    return self._view
+                self._sig = sig
+                self.loads += 1
+                metrics.json_loaded(self.path.name, time.perf_counter() - t0)
+            return self._view
+
+    def invalidate(self):
+        with self._lock:
+            self._sig = None
+            self._checked_at = 0.0
+
+
+# --------------------------------------------------------------------
+# Builders for the files shipped in static/data
+# --------------------------------------------------------------------
+def task_id(t):
+    return str(t.get("id") or t.get("key") or t.get("slug") or t.get("title"))
+
+
+def build_tasks(doc):
+    pool = (doc.get("daily")
+            or doc.get("tasks")
+            or doc.get("pool")
+            or doc.get("items")
+            or [])
+    return {
+        "rules": doc.get("rules") or {},
+        "pool": pool,
+        "by_id": {task_id(t): t for t in pool},
+    }
+
+
+def build_stickers(doc):
+    items = doc if isinstance(doc, list) else (doc.get("stickers") or [])
+    return {
+        "items": items,
+        "by_id": {str(s.get("id")): s for s in items},
+    }
+
+
+def build_plants(doc):
+    by_category = {}
+    for p in doc:
+        by_category.setdefault(p.get("category"), []).append(p)
+    return {
+        "items": doc,
+        "by_id": {str(p.get("id")): p for p in doc},
+        "by_category": by_category,
+    }
@@ -0,0 +1,113 @@
+"""
+Answer generators behind /api/chat and /api/chat/stream.
+
+A generator is any object with
+
+    stream(text, hits) -> iterator of str chunks (concatenated, they are the reply)
+    model              -> name stored in chat_messages.model
+    cacheable          -> True if the reply depends only on the hits, so
+                          app.py may reuse it for equivalent questions
+
+where hits are the retrieved plant passages (retrieval.py) for the
+question. It is picked by CHAT_GENERATOR="module:Class" (same convention
+as PEST_MODEL).
+
+ExtractiveGenerator (default) answers straight from the passages, no
+model needed. EchoGenerator is the local stub: CHAT_STUB_DELAY_MS makes it
+drip tokens slowly enough to watch streaming or time-to-first-token.
+
+StreamStats keeps recent latency / TTFT samples for /api/chat/stats.
+"""
+import importlib
+import os
+import re
+import threading
+import time
+from collections import deque
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def count_tokens(text):
+    """Rough token count (words and punctuation); stored in tokens_in / tokens_out."""
+    return len(_TOKEN_RE.findall(text or ""))
+
+
+def load_generator(spec):
+    """"package.module:ClassName" -> instance."""
+    module, _, name = spec.partition(":")
+    return getattr(importlib.import_module(module), name)()
+
+
+class EchoGenerator:
+    model = "echo"
+    cacheable = False   # repeats the exact wording
+
+    def __init__(self, delay_ms=None):
+        if delay_ms is None:
+            delay_ms = float(os.getenv("CHAT_STUB_DELAY_MS", "0"))
+        self.delay = delay_ms / 1000.0
+
+    def stream(self, text, hits=()):
+        for i, w in enumerate(f"you said: {text}".split(" ")):
+            if self.delay:
+                time.sleep(self.delay)
+            yield w if i == 0 else " " + w
+
+
+class ExtractiveGenerator:
+    """Quotes the best-matching plant's FAQ entries (and names runners-up)."""
+
+    model = "extractive-bm25"
+    cacheable = True
+
+    LABELS = {"sunlight": "Light", "watering": "Watering", "soil": "Soil",
+              "avoid": "Avoid", "notes": "Notes", "about": "Good to know"}
+    NOT_FOUND = ("I couldn't find that in the plant guide. Try asking about a plant's "
+                 "sunlight, watering, soil or what to avoid.")
+
+    def stream(self, text, hits=()):
+        if not hits:
+            yield self.NOT_FOUND
+            return
+        best = hits[0]["plant"]
+        yield f"{best}:"
+        for h in hits:
+            if h["plant"] == best:
+                yield f" {self.LABELS.get(h['field'], h['field'].title())}: {h['text'].rstrip('.')}."
+        others = list(dict.fromkeys(h["plant"] for h in hits if h["plant"] != best))
+        if others:
+            yield f" See also: {', '.join(others)}."
+
+
+class StreamStats:
+    """Counters plus the last `window` samples for percentiles."""
+
+    def __init__(self, window=1000):
+        self._lock = threading.Lock()
+        self._ttft = deque(maxlen=window)
+        self._latency = deque(maxlen=window)
+        self._n = {"replies": 0, "streamed": 0, "aborted": 0, "errors": 0, "tokens_out": 0}
+
+    def record(self, latency_ms, ttft_ms=None, tokens_out=0, streamed=False, aborted=False, error=False):
+        with self._lock:
+            self._n["replies"] += 1
+            self._n["streamed"] += streamed
+            self._n["aborted"] += aborted
+            self._n["errors"] += error
+            self._n["tokens_out"] += tokens_out
+            self._latency.append(latency_ms)
+            if ttft_ms is not None:
+                self._ttft.append(ttft_ms)
+
+    def stats(self):
+        with self._lock:
+            s = dict(self._n)
+            lat, ttft = sorted(self._latency), sorted(self._ttft)
+        for name, xs in (("latency_ms", lat), ("ttft_ms", ttft)):
+            s[name] = {
+                "p50": xs[len(xs) // 2] if xs else None,
+                "p95": xs[min(len(xs) - 1, int(len(xs) * 0.95))] if xs else None,
+                "max": xs[-1] if xs else None,
+            }
+        return s
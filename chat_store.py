@@ -0,0 +1,214 @@
+"""
+Chat message persistence.
+
+    CHAT_LOG = ChatWriter(db)                  # db() -> pooled connection
+    CHAT_LOG.add(session_id, "user", "hello")  # returns at once
+    history_page(cur, session_id, before_id=None, limit=50)
+
+ChatWriter is a write-behind buffer: add() only appends to memory and a
+background thread inserts everything queued as one multi-row INSERT when
+max_batch rows are waiting or flush_every seconds have passed, and once
+more at shutdown (close(), registered with atexit by app.py). If the
+database is down the rows stay queued and are retried; past max_pending
+the oldest are dropped and counted. A batch rejected because of its rows
+(DataError / IntegrityError: one message too long, a session that no
+longer exists) is split in halves until the offending rows are isolated;
+the rest is written and those rows go to dead_letters instead of blocking
+the queue forever.
+
+Rows not yet flushed are visible through pending(session_id), so the
+newest history page can still show them. read_with_pending() pairs them
+with a table read so that a batch flushed in between shows up exactly
+once: the read is retried while an INSERT is in progress (a seqlock on
+the writer's batch generation).
+
+history_page() is keyset paginated (WHERE id < before_id ORDER BY id DESC
+LIMIT n), which stays constant-time however long the session gets as long
+as chat_messages has an index on (session_id, id).
+"""
+import threading
+import time
+from collections import deque
+
+from pymysql.err import DataError, IntegrityError
+
+COLUMNS = ("session_id", "role", "content", "model", "tokens_in", "tokens_out", "latency_ms", "sources")
+
+_INSERT = (f"INSERT INTO chat_messages ({', '.join(COLUMNS)}) "
+           f"VALUES ({', '.join(['%s'] * len(COLUMNS))})")
+
+# newest page / the page before a given id; args: session_id[, before_id], limit
+_HISTORY = """SELECT id, role, content, model, tokens_in, tokens_out, latency_ms, sources
+FROM chat_messages WHERE session_id=%s ORDER BY id DESC LIMIT %s"""
+_HISTORY_BEFORE = """SELECT id, role, content, model, tokens_in, tokens_out, latency_ms, sources
+FROM chat_messages WHERE session_id=%s AND id < %s ORDER BY id DESC LIMIT %s"""
+
+# Errors caused by the rows themselves: sending the same rows again can't
+# succeed. Anything else (connection lost, pool timeout, deadlock) is
+# retried with the whole batch.
+ROW_ERRORS = (DataError, IntegrityError)
+
+
+class ChatWriter:
+    def __init__(self, connect, max_batch=200, flush_every=0.25, max_pending=50000,
+                 max_dead_letters=1000):
+        self.connect = connect
+        self.max_batch = max_batch
+        self.flush_every = flush_every
+        self.max_pending = max_pending
+        self.dead_letters = deque(maxlen=max_dead_letters)   # (row, error) the database refused
+        self._rows = deque()
+        self._inflight = []                   # batch being INSERTed right now
+        self._gen = 0                         # +1 as a batch INSERT starts and ends: odd = writing
+        lock = threading.RLock()
+        self._cond = threading.Condition(lock)      # wakes the writer thread
+        self._written = threading.Condition(lock)   # a batch INSERT ended
+        self._flush_lock = threading.Lock()   # one INSERT batch at a time
+        self._closed = False
+        self._stats = {"queued": 0, "written": 0, "batches": 0, "errors": 0, "dropped": 0,
+                       "dead_lettered": 0, "max_batch_seen": 0, "flush_ms_total": 0.0}
+        self._thread = threading.Thread(target=self._run, name="chat-writer", daemon=True)
+        self._thread.start()
+
+    def add(self, session_id, role, content, model=None, tokens_in=None, tokens_out=None,
+            latency_ms=None, sources=None):
+        row = (session_id, role, content, model, tokens_in, tokens_out, latency_ms, sources)
+        with self._cond:
+            self._rows.append(row)
+            self._stats["queued"] += 1
+            while len(self._rows) > self.max_pending:
+                self._rows.popleft()
+                self._stats["dropped"] += 1
+            if len(self._rows) >= self.max_batch:
+                self._cond.notify()
+
+    def pending(self, session_id):
+        """Queued rows for a session as history-shaped dicts (id is None)."""
+        with self._cond:
+            rows = [r for r in self._inflight if r[0] == session_id]
+            rows += [r for r in self._rows if r[0] == session_id]
+        return [dict(zip(COLUMNS, r), id=None) for r in rows]
+
+    def read_with_pending(self, session_id, read, attempts=3, wait=0.05):
+        """
+        -> (read(), pending(session_id)) with no row in both and none missing
+        from both: read() is repeated until no batch INSERT started or ended
+        while it ran. If writes keep overlapping, the batch being written is
+        left out of pending; it shows in the table on the next read.
+        """
+        for attempt in range(attempts):
+            with self._cond:
+                self._written.wait_for(lambda: self._gen % 2 == 0, timeout=wait)
+                gen = self._gen
+            result = read()
+            with self._cond:
+                if (gen % 2 == 0 and self._gen == gen) or attempt == attempts - 1:
+                    rows = [r for r in self._rows if r[0] == session_id]
+                    return result, [dict(zip(COLUMNS, r), id=None) for r in rows]
+
+    def flush(self):
+        """Write everything queued now. Returns the number of rows written."""
+        written = 0
+        with self._flush_lock:
+            while True:
+                with self._cond:
+                    batch = [self._rows.popleft() for _ in range(min(self.max_batch, len(self._rows)))]
+                    if batch:
+                        self._inflight = batch
+                        self._gen += 1
+                if not batch:
+                    return written
+                started = time.perf_counter()
+                done, retry = self._write(batch)
+                with self._cond:
+                    self._inflight = []
+                    self._gen += 1
+                    self._written.notify_all()
+                    st = self._stats
+                    if done:
+                        st["written"] += done
+                        st["batches"] += 1
+                        st["max_batch_seen"] = max(st["max_batch_seen"], done)
+                        st["flush_ms_total"] += (time.perf_counter() - started) * 1000
+                    if retry:
+                        # back to the front, in order, for the next attempt
+                        self._rows.extendleft(reversed(retry))
+                written += done
+                if retry:
+                    return written
+
+    def _write(self, batch):
+        """
+        INSERT batch, bisecting it on a row error until the bad rows are
+        isolated and dead-lettered. -> (rows written, rows to retry later)
+        """
+        written = 0
+        parts = [batch]   # stack: parts[-1] goes next
+        while parts:
+            part = parts.pop()
+            try:
+                with self.connect() as con, con.cursor() as cur:
+                    cur.executemany(_INSERT, part)   # pymysql folds this into one multi-row INSERT
+            except ROW_ERRORS as e:
+                if len(part) > 1:
+                    mid = len(part) // 2
+                    parts += [part[mid:], part[:mid]]
+                    continue
+                with self._cond:
+                    self.dead_letters.append((part[0], repr(e)))
+                    self._stats["dead_lettered"] += 1
+                    self._stats["errors"] += 1
+                print(f"[chat] dropped a message for session {part[0][0]} the database refused: {e}")
+                continue
+            except Exception as e:
+                retry = part + [row for p in reversed(parts) for row in p]
+                with self._cond:
+                    self._stats["errors"] += 1
+                print(f"[chat] could not write {len(retry)} messages, will retry: {e}")
+                return written, retry
+            written += len(part)
+        return written, []
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout=5)
+        self.flush()
+
+    def stats(self):
+        with self._cond:
+            s = dict(self._stats)
+            s["pending"] = len(self._rows)
+        s["avg_batch"] = round(s["written"] / s["batches"], 2) if s["batches"] else 0.0
+        flush_ms = s.pop("flush_ms_total")
+        s["flush_ms_avg"] = round(flush_ms / s["batches"], 3) if s["batches"] else 0.0
+        return s
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._closed and len(self._rows) < self.max_batch:
+                    self._cond.wait(self.flush_every)
+                if self._closed:
+                    return
+                if not self._rows:
+                    continue
+            self.flush()
+
+
+def history_page(cur, session_id, before_id=None, limit=50):
+    """
+    Up to `limit` messages older than before_id (newest page when None), in
+    chronological order. -> (rows, has_more)
+    """
+    # one extra row tells us whether there is another page
+    if before_id is None:
+        cur.execute(_HISTORY, (session_id, limit + 1))
+    else:
+        cur.execute(_HISTORY_BEFORE, (session_id, before_id, limit + 1))
+    rows = cur.fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    rows.reverse()
+    return rows, has_more
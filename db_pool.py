@@ -0,0 +1,243 @@
+"""
+Small thread-safe connection pool used behind app.db().
+
+    pool = ConnectionPool(lambda: pymysql.connect(**DB), max_size=10)
+    with pool.connection() as con, con.cursor() as cur:
+        cur.execute("SELECT 1")
+
+Connections are handed back to the pool when the ``with`` block exits
+instead of being closed, so a request pays the TCP + auth handshake only
+when the pool has to grow.
+"""
+import threading
+import time
+from collections import deque
+
+
+class PoolTimeout(Exception):
+    """No connection became free within the pool's wait timeout."""
+
+
+class _Checkout:
+    """Context manager returned by ConnectionPool.connection()."""
+
+    def __init__(self, pool):
+        self._pool = pool
+        self._con = None
+
+    def __enter__(self):
+        self._con = self._pool.acquire()
+        return self._con
+
+    def __exit__(self, exc_type, exc, tb):
+        con, self._con = self._con, None
+        self._pool.release(con, broken=exc_type is not None)
+        return False
+
+
+class ConnectionPool:
+    def __init__(self, connect, min_size=1, max_size=10, timeout=5.0,
+                 idle_timeout=300.0, ping_after=2.0):
+        """
+        connect       zero-arg factory returning a new DB-API connection
+        min_size      connections the reaper never closes (opened lazily)
+        max_size      hard cap on open connections (in use + idle)
+        timeout       seconds acquire() waits for a free connection
+        idle_timeout  idle connections above min_size are closed after this
+        ping_after    connections idle longer than this are pinged on checkout
+        """
+        if max_size < 1 or min_size < 0 or min_size > max_size:
+            raise ValueError("need 0 <= min_size <= max_size and max_size >= 1")
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.ping_after = ping_after
+
+        self._cond = threading.Condition()
+        self._idle = deque()          # (connection, released_at), newest on the right
+        self._size = 0                # open connections, idle + in use
+        self._reaper = None
+        self._closed = False
+
+        self._stats = {
+            "created": 0,
+            "closed": 0,
+            "checkouts": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "failed_health_checks": 0,
+            "checkout_ms_total": 0.0,
+            "checkout_ms_max": 0.0,
+        }
+
+    # ---- public API -------------------------------------------------
+
+    def connection(self):
+        return _Checkout(self)
+
+    def acquire(self):
+        t0 = time.perf_counter()
+        deadline = time.monotonic() + self.timeout
+        waited = False
+        self._start_reaper()
+
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("pool is closed")
+            while True:
+                if self._idle:
+                    con, released_at = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    con, released_at = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeout(
+                        f"no connection available within {self.timeout}s "
+                        f"(max_size={self.max_size})")
+                if not waited:
+                    waited = True
+                    self._stats["waits"] += 1
+                self._cond.wait(remaining)
+
+        # network work happens outside the lock
+        if con is None:
+            con = self._open()
+        elif time.monotonic() - released_at > self.ping_after and not self._healthy(con):
+            # replace the dead connection in the slot we already hold
+            self._close_quietly(con)
+            with self._cond:
+                self._stats["closed"] += 1
+            con = self._open()
+
+        ms = (time.perf_counter() - t0) * 1000.0
+        with self._cond:
+            self._stats["checkouts"] += 1
+            self._stats["checkout_ms_total"] += ms
+            self._stats["checkout_ms_max"] = max(self._stats["checkout_ms_max"], ms)
+        return con
+
+    def release(self, con, broken=False):
+        if con is None:
+            return
+        if broken:
+            # the caller blew up mid-statement; don't hand out a connection
+            # with an open transaction or half-read result set
+            try:
+                con.rollback()
+            except Exception:
+                self._discard(con)
+                return
+        with self._cond:
+            if self._closed:
+                self._size -= 1
+                self._stats["closed"] += 1
+                closing = True
+            else:
+                self._idle.append((con, time.monotonic()))
+                self._cond.notify()
+                closing = False
+        if closing:
+            self._close_quietly(con)
+
+    def reap(self):
+        """Close connections idle longer than idle_timeout, keeping min_size open."""
+        now = time.monotonic()
+        victims = []
+        with self._cond:
+            # oldest idle connections sit on the left
+            while (self._idle and self._size > self.min_size
+                   and now - self._idle[0][1] > self.idle_timeout):
+                con, _ = self._idle.popleft()
+                self._size -= 1
+                self._stats["closed"] += 1
+                victims.append(con)
+        for con in victims:
+            self._close_quietly(con)
+        return len(victims)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            victims = [c for c, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(victims)
+            self._stats["closed"] += len(victims)
+            self._cond.notify_all()
+        for con in victims:
+            self._close_quietly(con)
+
+    def stats(self):
+        with self._cond:
+            s = dict(self._stats)
+            s["size"] = self._size
+            s["idle"] = len(self._idle)
+            s["in_use"] = self._size - len(self._idle)
+            s["min_size"] = self.min_size
+            s["max_size"] = self.max_size
+        n = s["checkouts"]
+        s["checkout_ms_avg"] = round(s["checkout_ms_total"] / n, 3) if n else 0.0
+        s["checkout_ms_total"] = round(s["checkout_ms_total"], 3)
+        s["checkout_ms_max"] = round(s["checkout_ms_max"], 3)
+        return s
+
+    # ---- internals --------------------------------------------------
+
+    def _open(self):
+        try:
+            con = self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._stats["created"] += 1
+        return con
+
+    def _healthy(self, con):
+        try:
+            con.ping(reconnect=False)
+            return True
+        except Exception:
+            with self._cond:
+                self._stats["failed_health_checks"] += 1
+            return False
+
+    def _discard(self, con):
+        with self._cond:
+            self._size -= 1
+            self._stats["closed"] += 1
+            self._cond.notify()
+        self._close_quietly(con)
+
+    @staticmethod
+    def _close_quietly(con):
+        try:
+            con.close()
+        except Exception:
+            pass
+
+    def _start_reaper(self):
+        if self._reaper is not None or not self.idle_timeout:
+            return
+        with self._cond:
+            if self._reaper is not None:
+                return
+            self._reaper = threading.Thread(
+                target=self._reap_loop, name="db-pool-reaper", daemon=True)
+        self._reaper.start()
+
+    def _reap_loop(self):
+        interval = max(1.0, self.idle_timeout / 2)
+        while not self._closed:
+            time.sleep(interval)
+            try:
+                self.reap()
+            except Exception:
+                pass
@@ -0,0 +1,238 @@
+"""
+Weekly leaderboard and streaks, without scanning user_task_log.
+
+    BOARD = WeeklyBoard(load_week)
+    BOARD.add(user_id, "2024-05-14", +3)    # after wallet.complete_task / undo_task
+    BOARD.top("2024-05-14", 10)  -> [{"rank", "user_id", "username", "leaves"}, ...]
+    BOARD.rank("2024-05-14", 7)  -> {"rank", "leaves"} or None
+
+The database keeps per-user per-day aggregates (user_daily_stats) and the
+current / longest streak (user_streaks); wallet.py updates both inside the
+same transaction that logs a task or pays the bonus. The week's scores
+(leaves earned from tasks, Monday to Sunday) are read from
+user_daily_stats once and then moved by the deltas this process pays
+out, in a list kept sorted by (-leaves, user_id): an update is a bisect
+plus a list insert, a rank is a bisect, the top N is a slice. Every
+`reload_every` seconds (and at the start of a week) the scores are
+re-read, which also picks up what other worker processes paid out. The
+re-read runs outside the lock, so add() never waits for it; deltas that
+arrive meanwhile are replayed onto the new copy.
+
+Tables: migrations/001_base_schema.sql, 004_streak_previous_record.py.
+
+    python leaderboard.py     # rebuild the aggregates from user_task_log
+                              # (migrations/003 does this once)
+"""
+import threading
+import time
+from bisect import bisect_left, insort
+from datetime import date, timedelta
+
+
+def week_bounds(day):
+    """(monday, sunday) ISO dates of the week containing `day`."""
+    d = date.fromisoformat(str(day))
+    monday = d - timedelta(days=d.weekday())
+    return monday.isoformat(), (monday + timedelta(days=6)).isoformat()
+
+
+def streak_view(row, today):
+    """user_streaks row (or None) -> what the UI shows on `today`."""
+    row = row or {}
+    last = row.get("last_active_date")
+    last = str(last) if last else None
+    yesterday = (date.fromisoformat(today) - timedelta(days=1)).isoformat()
+    alive = last is not None and last >= yesterday   # today still counts until midnight
+    return {
+        "current": int(row.get("current_streak") or 0) if alive else 0,
+        "longest": int(row.get("longest_streak") or 0),
+        "last_active": last,
+        "active_today": last == today,
+    }
+
+
+class WeeklyBoard:
+    def __init__(self, load, reload_every=300.0):
+        """
+        load          (monday, sunday) -> {user_id: (leaves, username)}
+        reload_every  seconds between re-reads of the week (0 = only on week change)
+        """
+        self._load = load
+        self.reload_every = reload_every
+        self._lock = threading.Condition()
+        self._loading = None  # week being re-read right now, outside the lock
+        self._during = []     # (user_id, delta) paid out while it was read
+        self._week = None
+        self._loaded_at = 0.0
+        self._scores = {}     # user_id -> leaves
+        self._names = {}      # user_id -> username
+        self._order = []      # sorted (-leaves, user_id), leaves > 0 only
+        self.loads = 0
+
+    # ---- public API -------------------------------------------------
+
+    def add(self, user_id, day, delta):
+        """Apply leaves paid (or taken back) on `day` to the in-memory week."""
+        if not delta:
+            return
+        week = week_bounds(day)[0]
+        with self._lock:
+            if self._loading == week:
+                self._during.append((user_id, delta))
+            if week != self._week:
+                return          # another week; the next load sees it in the table
+            old = self._scores.get(user_id, 0)
+            self._set(user_id, old, max(0, old + delta))
+
+    def top(self, day, n=10):
+        self._ensure(day)
+        with self._lock:
+            rows = self._order[:n]
+            out, rank, prev = [], 0, None
+            for i, (neg, uid) in enumerate(rows):
+                if neg != prev:
+                    rank, prev = i + 1, neg
+                out.append({"rank": rank, "user_id": uid, "username": self._names.get(uid),
+                            "leaves": -neg})
+        return out
+
+    def rank(self, day, user_id):
+        self._ensure(day)
+        with self._lock:
+            score = self._scores.get(user_id, 0)
+            if not score:
+                return None
+            # competition ranking: 1 + number of users with strictly more leaves
+            return {"rank": bisect_left(self._order, (-score,)) + 1, "leaves": score}
+
+    def set_names(self, names):
+        with self._lock:
+            self._names.update(names)
+
+    def missing_names(self, user_ids):
+        with self._lock:
+            return [u for u in user_ids if u not in self._names]
+
+    def stats(self):
+        with self._lock:
+            return {"week": self._week, "users": len(self._order), "loads": self.loads,
+                    "age_s": round(time.monotonic() - self._loaded_at, 1) if self._week else None}
+
+    # ---- internals --------------------------------------------------
+
+    def _set(self, user_id, old, new):
+        if old:
+            i = bisect_left(self._order, (-old, user_id))
+            if i < len(self._order) and self._order[i] == (-old, user_id):
+                del self._order[i]
+        if new:
+            insort(self._order, (-new, user_id))
+            self._scores[user_id] = new
+        else:
+            self._scores.pop(user_id, None)
+
+    def _ensure(self, day):
+        week = week_bounds(day)
+        with self._lock:
+            while True:
+                now = time.monotonic()
+                if self._week == week[0] and (
+                        not self.reload_every or now - self._loaded_at < self.reload_every):
+                    return
+                if self._loading is None:
+                    break
+                if self._week == week[0]:
+                    return      # a re-read is under way; this copy is only a bit old
+                self._lock.wait()   # new week: nothing to serve until it is loaded
+            self._loading, self._during = week[0], []
+
+        # the query runs without the lock: add() on the task path never waits for it
+        try:
+            rows = self._load(*week)
+        except BaseException:
+            with self._lock:
+                self._loading = None
+                self._lock.notify_all()
+            raise
+
+        with self._lock:
+            self._scores = {uid: leaves for uid, (leaves, _) in rows.items() if leaves > 0}
+            self._names = {uid: name for uid, (_, name) in rows.items() if name is not None}
+            self._order = sorted((-leaves, uid) for uid, leaves in self._scores.items())
+            # replay what was paid out while the week was being read; one that
+            # committed before the read is counted twice until the next reload
+            for uid, delta in self._during:
+                old = self._scores.get(uid, 0)
+                self._set(uid, old, max(0, old + delta))
+            self._week, self._loaded_at = week[0], time.monotonic()
+            self._loading, self._during = None, []
+            self.loads += 1
+            self._lock.notify_all()
+
+
+# --------------------------------------------------------------------
+# One-off backfill for data logged before the aggregates existed
+# --------------------------------------------------------------------
+def backfill(cur):
+    """Rebuild user_daily_stats and user_streaks from the task and bonus logs."""
+    cur.execute("""
+        INSERT INTO user_daily_stats (user_id, stat_date, tasks_done, leaves_earned, bonus_plants)
+        SELECT user_id, task_date, COUNT(*), SUM(awarded_plants), 0
+        FROM user_task_log GROUP BY user_id, task_date
+        ON DUPLICATE KEY UPDATE tasks_done = VALUES(tasks_done),
+                                leaves_earned = VALUES(leaves_earned)
+    """)
+    cur.execute("""
+        UPDATE user_daily_stats s JOIN user_daily_bonus b
+          ON b.user_id = s.user_id AND b.bonus_date = s.stat_date
+        SET s.bonus_plants = b.awarded_plants
+    """)
+    streaks = _replay_streaks(cur)
+    cur.executemany("""
+        INSERT INTO user_streaks (user_id, current_streak, longest_streak, last_active_date, longest_date)
+        VALUES (%s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE current_streak = VALUES(current_streak),
+                                longest_streak = VALUES(longest_streak),
+                                last_active_date = VALUES(last_active_date),
+                                longest_date = VALUES(longest_date)
+    """, [(uid, s["current"], s["longest"], s["last"].isoformat(), s["longest_date"].isoformat())
+          for uid, s in streaks.items()])
+    return len(streaks)
+
+
+def backfill_previous(cur):
+    """Set prev_longest(_date) (migrations/004): the record each user's longest beat."""
+    streaks = _replay_streaks(cur)
+    cur.executemany("UPDATE user_streaks SET prev_longest=%s, prev_longest_date=%s WHERE user_id=%s",
+                    [(s["prev"], s["prev_date"].isoformat() if s["prev_date"] else None, uid)
+                     for uid, s in streaks.items()])
+    return len(streaks)
+
+
+def _replay_streaks(cur):
+    """{user_id: current / longest / previous record} replayed from user_daily_stats."""
+    cur.execute("SELECT user_id, stat_date FROM user_daily_stats "
+                "WHERE tasks_done > 0 ORDER BY user_id, stat_date")
+    streaks, run = {}, None
+    for r in cur.fetchall():
+        uid, d = r["user_id"], date.fromisoformat(str(r["stat_date"]))
+        s = streaks.get(uid)
+        if s and d - s["last"] == timedelta(days=1):
+            run += 1
+        else:
+            run = 1
+            s = streaks.setdefault(uid, {"longest": 0, "longest_date": None,
+                                         "prev": 0, "prev_date": None})
+        s.update(last=d, current=run)
+        if run > s["longest"]:
+            s.update(prev=s["longest"], prev_date=s["longest_date"], longest=run, longest_date=d)
+    return streaks
+
+
+if __name__ == "__main__":
+    from app import db
+
+    with db() as con, con.cursor() as cur:
+        n = backfill(cur)
+        backfill_previous(cur)
+    print(f"streaks rebuilt for {n} users")
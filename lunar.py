@@ -0,0 +1,186 @@
+"""
+Local moon phase math (used by /moon and as its fallback), plus a batch
+version for whole date ranges (/moon/calendar). The batch path uses NumPy
+when it is installed and falls back to the scalar loop otherwise.
+"""
+from datetime import datetime, timedelta, timezone
+from math import sin, pi
+
+try:
+    import numpy as np
+except ImportError:  # optional: calendar() still works, just slower
+    np = None
+
+# Reference epoch & synodic month length
+REF_EPOCH = datetime(2001, 1, 1, tzinfo=timezone.utc)
+SYNODIC_DAYS = 29.530588853  # mean synodic month
+
+# ~0.9 day tolerance around the quarter phases
+QUARTER_EPS = 0.03
+
+
+def phase_fraction(when):
+    """0..1 position in the synodic month (0=new, 0.5=full)."""
+    days = (when - REF_EPOCH).total_seconds() / 86400.0
+    return (days % SYNODIC_DAYS) / SYNODIC_DAYS
+
+
+def illumination_pct(phase):
+    # illum fraction ≈ sin^2(pi * phase)
+    return int(round((sin(pi * phase) ** 2) * 100))
+
+
+# index order of the codes returned by calendar()
+PHASE_NAMES = [
+    "New Moon",
+    "Waxing Crescent Moon",
+    "First Quarter",
+    "Waxing Gibbous Moon",
+    "Full Moon",
+    "Waning Gibbous Moon",
+    "Last Quarter",
+    "Waning Crescent Moon",
+]
+_CODE = {name: i for i, name in enumerate(PHASE_NAMES)}
+
+
+def phase_name(phase):
+    # Name buckets (kept flexible so the JS normalizePhase() still matches)
+    eps = QUARTER_EPS
+    if phase < eps or phase > 1 - eps:
+        return "New Moon"
+    elif abs(phase - 0.25) < eps:
+        return "First Quarter"
+    elif abs(phase - 0.50) < eps:
+        return "Full Moon"
+    elif abs(phase - 0.75) < eps:
+        return "Last Quarter"
+    elif phase < 0.25:
+        return "Waxing Crescent Moon"
+    elif phase < 0.50:
+        return "Waxing Gibbous Moon"
+    elif phase < 0.75:
+        return "Waning Gibbous Moon"
+    else:
+        return "Waning Crescent Moon"
+
+
+def local_moon(when=None):
+    """Returns {"phase": <string>, "illumination": <int percent 0..100>}."""
+    phase = phase_fraction(when or datetime.now(timezone.utc))
+    return {"phase": phase_name(phase), "illumination": illumination_pct(phase)}
+
+
+def day_noon_utc(day):
+    """Representative instant for a calendar date (a `date`)."""
+    return datetime(day.year, day.month, day.day, 12, tzinfo=timezone.utc)
+
+
+# --------------------------------------------------------------------
+# Date ranges
+# --------------------------------------------------------------------
+def calendar_scalar(start, end):
+    """Reference implementation: one local_moon() per day."""
+    codes, illum = [], []
+    day = start
+    while day <= end:
+        phase = phase_fraction(day_noon_utc(day))
+        codes.append(_CODE[phase_name(phase)])
+        illum.append(illumination_pct(phase))
+        day += timedelta(days=1)
+    return codes, illum
+
+
+def calendar_vector(start, end):
+    """Same result as calendar_scalar, computed as NumPy arrays."""
+    n = (end - start).days + 1
+    # days from REF_EPOCH to noon UTC of each date
+    first = (start - REF_EPOCH.date()).days + 0.5
+    days = first + np.arange(n, dtype=np.float64)
+    phase = np.mod(days, SYNODIC_DAYS) / SYNODIC_DAYS
+    illum = np.round(np.sin(np.pi * phase) ** 2 * 100).astype(np.int64)
+
+    eps = QUARTER_EPS
+    codes = np.select(
+        [
+            (phase < eps) | (phase > 1 - eps),
+            np.abs(phase - 0.25) < eps,
+            np.abs(phase - 0.50) < eps,
+            np.abs(phase - 0.75) < eps,
+            phase < 0.25,
+            phase < 0.50,
+            phase < 0.75,
+        ],
+        [0, 2, 4, 6, 1, 3, 5],
+        default=7,
+    )
+    return codes, illum
+
+
+def calendar(start, end):
+    """
+    Phases for every date in [start, end] (both `date`s) as compact arrays:
+    {"start", "end", "names": PHASE_NAMES, "phase": [code...], "illumination": [pct...]}
+    """
+    if end < start:
+        raise ValueError("end before start")
+    if np is not None:
+        codes, illum = calendar_vector(start, end)
+        codes, illum = codes.tolist(), illum.tolist()
+    else:
+        codes, illum = calendar_scalar(start, end)
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "names": PHASE_NAMES,
+        "phase": codes,
+        "illumination": illum,
+    }
+
+
+# --------------------------------------------------------------------
+# Free-form phase labels (indoor_plants.json, ipgeolocation) -> codes
+# --------------------------------------------------------------------
+_WAXING = frozenset({1, 2, 3})
+_WANING = frozenset({5, 6, 7})
+
+
+def phase_codes(label):
+    """
+    Codes a single label refers to, mirroring phaseKey() in main.js:
+    "Waning Gibbous Moon", "WANING_GIBBOUS", "Last Quarter Moon" -> {5} / {6}.
+    Broad labels ("Waxing Moon") cover the whole half-cycle. Unknown -> empty.
+    """
+    p = str(label or "").lower().replace("_", " ").replace("moon", "").strip()
+    p = " ".join(p.split())
+    if not p:
+        return frozenset()
+    if "new" in p:
+        return frozenset({0})
+    if "waxing crescent" in p:
+        return frozenset({1})
+    if "first" in p:
+        return frozenset({2})
+    if "waxing gibbous" in p:
+        return frozenset({3})
+    if "full" in p:
+        return frozenset({4})
+    if "waning gibbous" in p:
+        return frozenset({5})
+    if "last" in p or "third" in p:
+        return frozenset({6})
+    if "waning crescent" in p:
+        return frozenset({7})
+    if "waxing" in p:
+        return _WAXING
+    if "waning" in p:
+        return _WANING
+    return frozenset()
+
+
+def parse_phase_list(text):
+    """"New Moon, Waxing Crescent Moon" -> frozenset({0, 1})."""
+    out = set()
+    for part in str(text or "").split(","):
+        out |= phase_codes(part)
+    return frozenset(out)
@@ -0,0 +1,194 @@
+"""
+Resized image derivatives (thumbnails) with content-hashed file names.
+
+    thumbs = ImageDerivatives(STATIC_DIR, BASE_DIR / ".build/media/stickers",
+                              "/media/stickers", widths=(96, 192, 384))
+    e = thumbs.get("stickers/carrot_beans1.png")   # None until built
+    thumbs.srcset(e, "webp")   # "/media/stickers/carrot_beans1.96w.1a2b3c4d5e6f.webp 96w, ..."
+
+Each source gets WebP and optimised PNG copies at every configured width
+that is not wider than the original. Names carry a hash of their bytes, so
+send() can mark them immutable. A manifest.json in out_dir remembers what
+was built for which (mtime, size) of the source, so restarts are free.
+With lqip_width set, each entry also carries "lqip": a tiny blurred WebP
+as a data: URI that pages can paint while the real image loads.
+
+get() never blocks on Pillow: a missing or stale entry is queued on a
+background thread and callers fall back to the original file meanwhile.
+build_all() does the same work synchronously (deploy step / CLI).
+"""
+import base64
+import hashlib
+import io
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from flask import abort, send_file
+from werkzeug.security import safe_join
+
+try:
+    from PIL import Image, ImageFilter
+except ImportError:  # optional: without Pillow only the originals are served
+    Image = None
+
+HASH_LEN = 12
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+# one shared builder thread: resizing multi-MB PNGs is CPU heavy and rare
+_BUILDER = ThreadPoolExecutor(max_workers=1, thread_name_prefix="media-build")
+
+
+class ImageDerivatives:
+    def __init__(self, base_dir, out_dir, url_prefix, widths=(96, 192, 384),
+                 formats=("webp", "png"), webp_quality=80, lqip_width=None):
+        self.base_dir = Path(base_dir)
+        self.out_dir = Path(out_dir)
+        self.url_prefix = url_prefix.rstrip("/")
+        self.widths = tuple(sorted(widths))
+        self.formats = formats
+        self.webp_quality = webp_quality
+        self.lqip_width = lqip_width
+        self._manifest_path = self.out_dir / "manifest.json"
+        self._lock = threading.Lock()
+        self._pending = set()
+        try:
+            self._manifest = json.loads(self._manifest_path.read_text("utf-8"))
+        except (OSError, ValueError):
+            self._manifest = {}
+
+    # ---- lookup -----------------------------------------------------
+
+    def get(self, rel):
+        """Current entry for base_dir/rel, or None (and a build is queued)."""
+        sig = self._sig(rel)
+        if sig is None or Image is None:
+            return None
+        e = self._manifest.get(rel)
+        if e and e["sig"] == sig:
+            return e
+        with self._lock:
+            if rel not in self._pending:
+                self._pending.add(rel)
+                _BUILDER.submit(self._build_queued, rel)
+        return None
+
+    def srcset(self, entry, fmt):
+        return ", ".join(f"{self.url_prefix}/{v['file']} {v['w']}w"
+                         for v in entry["variants"].get(fmt, []))
+
+    def url(self, entry, fmt, width=None):
+        """Smallest variant at least `width` wide (largest if none is)."""
+        variants = entry["variants"].get(fmt) or []
+        if not variants:
+            return None
+        pick = next((v for v in variants if width is None or v["w"] >= width), variants[-1])
+        return f"{self.url_prefix}/{pick['file']}"
+
+    def send(self, name):
+        path = safe_join(str(self.out_dir), name)
+        if path is None or name == "manifest.json" or not os.path.isfile(path):
+            abort(404)
+        stem = name.rsplit(".", 1)[0]
+        resp = send_file(path, conditional=True, etag=stem.rsplit(".", 1)[-1], max_age=None)
+        resp.headers["Cache-Control"] = IMMUTABLE
+        return resp
+
+    # ---- building ---------------------------------------------------
+
+    def build_all(self, rels):
+        """Synchronously bring every rel up to date. Returns {rel: entry|None}."""
+        return {rel: self.build(rel) for rel in rels}
+
+    def build(self, rel):
+        sig = self._sig(rel)
+        if sig is None or Image is None:
+            return None
+        e = self._manifest.get(rel)
+        if e and e["sig"] == sig:
+            return e
+
+        src = self.base_dir / rel
+        raw = src.read_bytes()
+        img = Image.open(io.BytesIO(raw))
+        img.load()
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if "transparency" in img.info or img.mode in ("LA", "PA") else "RGB")
+
+        stem = Path(rel).stem
+        variants = {fmt: [] for fmt in self.formats}
+        widths = [w for w in self.widths if w < img.width] + [min(img.width, self.widths[-1])]
+        thumb = img
+        # largest first, each step resized from the previous one: scaling a
+        # 4000px original once instead of once per width
+        for w in sorted(set(widths), reverse=True):
+            h = max(1, round(img.height * w / img.width))
+            if thumb.width != w:
+                thumb = thumb.resize((w, h), Image.LANCZOS)
+            for fmt in self.formats:
+                data = self._encode(thumb, fmt)
+                digest = hashlib.sha256(data).hexdigest()[:HASH_LEN]
+                name = f"{stem}.{w}w.{digest}.{fmt}"
+                self._write(self.out_dir / name, data)
+                variants[fmt].insert(0, {"w": w, "h": h, "file": name, "bytes": len(data)})
+
+        e = {
+            "sig": sig,
+            "sha": hashlib.sha256(raw).hexdigest()[:HASH_LEN],
+            "width": img.width,
+            "height": img.height,
+            "bytes": len(raw),
+            "variants": variants,
+        }
+        if self.lqip_width:
+            e["lqip"] = self._lqip(thumb)
+        with self._lock:
+            self._manifest[rel] = e
+            self._write(self._manifest_path, json.dumps(self._manifest, indent=1).encode("utf-8"), replace=True)
+        return e
+
+    def _build_queued(self, rel):
+        try:
+            self.build(rel)
+        except Exception as ex:
+            print(f"[media] could not build derivatives for {rel}: {ex}")
+        finally:
+            with self._lock:
+                self._pending.discard(rel)
+
+    def _lqip(self, img):
+        w = min(self.lqip_width, img.width)
+        tiny = img.resize((w, max(1, round(img.height * w / img.width))), Image.BILINEAR)
+        buf = io.BytesIO()
+        tiny.filter(ImageFilter.GaussianBlur(1)).save(buf, "WEBP", quality=40)
+        return "data:image/webp;base64," + base64.b64encode(buf.getvalue()).decode("ascii")
+
+    def _encode(self, img, fmt):
+        buf = io.BytesIO()
+        if fmt == "webp":
+            img.save(buf, "WEBP", quality=self.webp_quality, method=4)   # 6 is ~40x slower for ~1% smaller
+        elif fmt == "png":
+            img.save(buf, "PNG", optimize=True)
+        else:
+            raise ValueError(f"unsupported format {fmt}")
+        return buf.getvalue()
+
+    def _sig(self, rel):
+        path = safe_join(str(self.base_dir), rel)
+        if path is None:
+            return None
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return [st.st_mtime_ns, st.st_size]
+
+    @staticmethod
+    def _write(path, data, replace=False):
+        if replace or not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
@@ -0,0 +1,297 @@
+"""
+Request metrics in Prometheus text format, plus an opt-in slow-request log.
+
+    install(app, slow_ms=500)                  # time every request
+    def db(): return traced(DB_POOL.connection())
+    with upstream("weather"):
+        HTTP.get(...)
+    render()                                   # -> body for GET /metrics
+
+No prometheus_client needed: a Histogram is a row of bucket counters per
+label set and render() writes the text exposition format (0.0.4) itself.
+
+While a request runs it carries a Trace: every `with db()` block it opens
+(tagged with the file:line that opened it), the checkout time and each
+query of that block, upstream calls and JSON file loads. The histograms
+get everything, also from background threads; the slow log prints the
+trace of requests over `slow_ms`, which is what points at the block to fix.
+"""
+import contextvars
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from flask import g, request
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# seconds; requests and upstream calls vs single queries and checkouts
+DEFAULT_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1.0, 2.5, 5.0, 10.0)
+FAST_BUCKETS = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1.0)
+
+REGISTRY = []
+
+
+def _escape(v):
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.help = name, help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._series = {}   # label values -> [per-bucket counts..., +Inf count, sum]
+        REGISTRY.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labels)
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(key)
+            if s is None:
+                s = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            s[i] += 1
+            s[-1] += value
+
+    def render(self):
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((k, list(v)) for k, v in self._series.items())
+        for key, s in series:
+            total = 0
+            for le, n in zip(self.buckets + ("+Inf",), s[:-1]):
+                total += n
+                out.append(f"{self.name}_bucket{_labels(self.labels + ('le',), key + (le,))} {total}")
+            lbl = _labels(self.labels, key)
+            out.append(f"{self.name}_sum{lbl} {s[-1]:.6f}")
+            out.append(f"{self.name}_count{lbl} {total}")
+        return out
+
+
+class Gauge:
+    """Read at scrape time: fn() -> {label values tuple: number}."""
+
+    def __init__(self, name, help, labels, fn):
+        self.name, self.help = name, help
+        self.labels = tuple(labels)
+        self._fn = fn
+        REGISTRY.append(self)
+
+    def render(self):
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        try:
+            values = self._fn()
+        except Exception as e:
+            print(f"metrics: {self.name} failed:", e)
+            return out
+        for key, v in sorted(values.items()):
+            out.append(f"{self.name}{_labels(self.labels, key)} {v}")
+        return out
+
+
+def render():
+    lines = []
+    for m in REGISTRY:
+        lines.extend(m.render())
+    return "\n".join(lines) + "\n"
+
+
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "Time to build the response, by route.",
+                            ("method", "route", "status"))
+REQUEST_QUERIES = Histogram("http_request_db_queries", "DB queries issued per request.",
+                            ("route",), buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100))
+DB_CHECKOUT_SECONDS = Histogram("db_checkout_seconds", "Time to get a connection from the pool.",
+                                buckets=FAST_BUCKETS)
+DB_QUERY_SECONDS = Histogram("db_query_seconds", "Time per cursor execute(), by statement kind.",
+                             ("op",), buckets=FAST_BUCKETS)
+UPSTREAM_SECONDS = Histogram("upstream_request_seconds", "Third-party API calls, errors included.",
+                             ("service",))
+JSON_LOAD_SECONDS = Histogram("json_load_seconds", "Parse + index build of a static/data file.",
+                              ("file",), buckets=FAST_BUCKETS)
+
+
+# --------------------------------------------------------------------
+# Per-request trace
+# --------------------------------------------------------------------
+class Trace:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.blocks = []     # {"where", "checkout", "queries": [[sql, seconds], ...]}
+        self.calls = []      # (kind, name, seconds) for upstream calls and JSON loads
+
+    def query_count(self):
+        return sum(len(b["queries"]) for b in self.blocks)
+
+    def format(self, title, seconds):
+        lines = [f"slow request: {title} {seconds * 1000:.1f} ms, "
+                 f"{len(self.blocks)} db blocks, {self.query_count()} queries"]
+        for b in self.blocks:
+            spent = sum(q[1] for q in b["queries"])
+            lines.append(f"  db {b['where']}: checkout {b['checkout'] * 1000:.1f} ms, "
+                         f"{len(b['queries'])} queries {spent * 1000:.1f} ms")
+            for sql, s in sorted(b["queries"], key=lambda q: -q[1])[:5]:
+                lines.append(f"      {s * 1000:8.1f} ms  {sql}")
+        for kind, name, s in self.calls:
+            lines.append(f"  {kind} {name}: {s * 1000:.1f} ms")
+        return "\n".join(lines)
+
+
+_current = contextvars.ContextVar("metrics_trace", default=None)
+
+
+def install(app, slow_ms=None):
+    """Time every request of `app`; print the trace of those over slow_ms (None = never)."""
+
+    @app.before_request
+    def _metrics_start():
+        _current.set(Trace())
+
+    @app.after_request
+    def _metrics_status(response):
+        g._metrics_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def _metrics_finish(exc):
+        trace = _current.get()
+        if trace is None:
+            return
+        _current.set(None)
+        seconds = time.perf_counter() - trace.started
+        route = request.url_rule.rule if request.url_rule else "<unmatched>"
+        REQUEST_SECONDS.observe(seconds, method=request.method, route=route,
+                                status=g.pop("_metrics_status", 500))
+        REQUEST_QUERIES.observe(trace.query_count(), route=route)
+        if slow_ms is not None and seconds * 1000 >= slow_ms:
+            print(trace.format(f"{request.method} {request.full_path.rstrip('?')}", seconds))
+
+
+@contextmanager
+def upstream(service):
+    """Time a third-party call (also when it raises)."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - t0
+        UPSTREAM_SECONDS.observe(seconds, service=service)
+        trace = _current.get()
+        if trace is not None:
+            trace.calls.append(("upstream", service, seconds))
+
+
+def json_loaded(name, seconds):
+    JSON_LOAD_SECONDS.observe(seconds, file=name)
+    trace = _current.get()
+    if trace is not None:
+        trace.calls.append(("json", name, seconds))
+
+
+# --------------------------------------------------------------------
+# db() wrapping
+# --------------------------------------------------------------------
+_OPS = frozenset(("SELECT", "INSERT", "UPDATE", "DELETE", "REPLACE", "START", "BEGIN",
+                  "COMMIT", "ROLLBACK", "SET", "CALL", "WITH"))
+
+
+def traced(checkout):
+    """
+    Wrap a pool checkout (`with traced(pool.connection()) as con`) so the
+    checkout and every cursor call are timed. Call it from the db() helper:
+    the block is tagged with the line that called db().
+    """
+    f = sys._getframe(2)
+    return _TracedCheckout(checkout, f"{os.path.basename(f.f_code.co_filename)}:{f.f_lineno}")
+
+
+class _TracedCheckout:
+    def __init__(self, checkout, where):
+        self._checkout = checkout
+        self._where = where
+
+    def __enter__(self):
+        t0 = time.perf_counter()
+        con = self._checkout.__enter__()
+        seconds = time.perf_counter() - t0
+        DB_CHECKOUT_SECONDS.observe(seconds)
+        block = None
+        trace = _current.get()
+        if trace is not None:
+            block = {"where": self._where, "checkout": seconds, "queries": []}
+            trace.blocks.append(block)
+        return _TracedConnection(con, block)
+
+    def __exit__(self, exc_type, exc, tb):
+        return self._checkout.__exit__(exc_type, exc, tb)
+
+
+class _TracedConnection:
+    def __init__(self, con, block):
+        self._con = con
+        self._block = block
+
+    def cursor(self, *args, **kwargs):
+        return _TracedCursor(self._con.cursor(*args, **kwargs), self._block)
+
+    def __getattr__(self, name):
+        return getattr(self._con, name)
+
+
+class _TracedCursor:
+    def __init__(self, cur, block):
+        self._cur = cur
+        self._block = block
+
+    def __enter__(self):
+        self._cur.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return self._cur.__exit__(exc_type, exc, tb)
+
+    def __iter__(self):
+        return iter(self._cur)
+
+    def __getattr__(self, name):
+        return getattr(self._cur, name)
+
+    def execute(self, query, args=None):
+        t0 = time.perf_counter()
+        try:
+            return self._cur.execute(query, args)
+        finally:
+            self._record(query, time.perf_counter() - t0)
+
+    def executemany(self, query, args):
+        t0 = time.perf_counter()
+        try:
+            return self._cur.executemany(query, args)
+        finally:
+            self._record(query, time.perf_counter() - t0)
+
+    def nextset(self):
+        # later statements of a multi-statement batch: charge them to the batch
+        t0 = time.perf_counter()
+        try:
+            return self._cur.nextset()
+        finally:
+            if self._block and self._block["queries"]:
+                self._block["queries"][-1][1] += time.perf_counter() - t0
+
+    def _record(self, query, seconds):
+        sql = " ".join(str(query).split())
+        op = sql.split(" ", 1)[0].upper()
+        DB_QUERY_SECONDS.observe(seconds, op=op if op in _OPS else "OTHER")
+        if self._block is not None:
+            self._block["queries"].append([sql[:160], seconds])
@@ -0,0 +1,229 @@
+"""
+Versioned schema migrations for the MySQL database in app.DB.
+
+    python migrate.py            # apply everything pending, in order
+    python migrate.py --status   # applied / pending / edited after applying
+
+migrations/NNN_name.sql runs as one multi-statement batch; NNN_name.py
+defines up(cur) for steps that need logic (indexes an older database may
+or may not have, backfills). Applied versions go into schema_migrations
+with a checksum of the file. MySQL commits DDL implicitly, so a step is
+not rolled back when it fails half way: write every step so it can simply
+be run again (IF NOT EXISTS, ensure_index).
+
+A named lock (GET_LOCK) keeps two deploys from migrating at once.
+
+    python -m pytest tests/test_query_plans.py  # EXPLAIN the hot queries
+"""
+import argparse
+import hashlib
+import importlib.util
+import re
+import sys
+import time
+from pathlib import Path
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent / "migrations"
+LOCK_NAME = "bloom_garden_migrate"
+LOCK_WAIT_S = 60
+
+_FILE_RE = re.compile(r"^(\d+)_(\w+)\.(sql|py)$")
+
+_VERSIONS_TABLE = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+  version    INT NOT NULL,
+  name       VARCHAR(255) NOT NULL,
+  checksum   CHAR(40) NOT NULL,
+  applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (version)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+"""
+
+
+class MigrationError(Exception):
+    pass
+
+
+def discover(directory=MIGRATIONS_DIR):
+    """[(version, path)] sorted by version."""
+    found = {}
+    for path in sorted(Path(directory).iterdir()):
+        m = _FILE_RE.match(path.name)
+        if not m:
+            continue
+        version = int(m.group(1))
+        if version in found:
+            raise MigrationError(f"two migrations numbered {version}: {found[version].name}, {path.name}")
+        found[version] = path
+    return sorted(found.items())
+
+
+def checksum(path):
+    return hashlib.sha1(path.read_bytes()).hexdigest()
+
+
+def run_sql(cur, sql):
+    """Run a multi-statement script, draining every result so errors surface."""
+    cur.execute(sql)
+    while cur.nextset():
+        pass
+
+
+def _load(path):
+    spec = importlib.util.spec_from_file_location(f"migration_{path.stem}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    if not callable(getattr(module, "up", None)):
+        raise MigrationError(f"{path.name} has no up(cur)")
+    return module
+
+
+# --------------------------------------------------------------------
+# Helpers for .py migrations
+# --------------------------------------------------------------------
+def indexes(cur, table):
+    """{index name: (unique, [lowercase columns in key order])} of `table`."""
+    cur.execute("""
+        SELECT index_name AS name, MIN(non_unique) AS non_unique,
+               GROUP_CONCAT(LOWER(column_name) ORDER BY seq_in_index) AS cols
+        FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s
+        GROUP BY index_name
+    """, (table,))
+    return {r["name"]: (int(r["non_unique"]) == 0, r["cols"].split(",")) for r in cur.fetchall()}
+
+
+def columns(cur, table):
+    """Lowercase column names of `table`."""
+    cur.execute("""
+        SELECT LOWER(column_name) AS name FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s
+    """, (table,))
+    return {r["name"] for r in cur.fetchall()}
+
+
+def ensure_column(cur, table, name, definition):
+    """ALTER TABLE .. ADD COLUMN unless `table` has it already. -> True if added."""
+    if name.lower() in columns(cur, table):
+        return False
+    cur.execute(f"ALTER TABLE `{table}` ADD COLUMN `{name}` {definition}")
+    print(f"  {table}: added column {name}")
+    return True
+
+
+def ensure_index(cur, table, name, columns, unique=False):
+    """
+    Add index `name` on `columns` unless the table already has one that
+    serves the same lookups (these columns leading, in this order). With
+    unique=True it must also enforce uniqueness; a unique key over the same
+    columns in another order already does, so then only the lookup index
+    is added. Refuses, rather than deleting anything, when duplicate rows
+    are in the way of a unique key.
+
+    -> True if an index was added.
+    """
+    want = [c.lower() for c in columns]
+    have = indexes(cur, table)
+    if unique and not any(u and sorted(cols) == sorted(want) for u, cols in have.values()):
+        cols = ", ".join(f"`{c}`" for c in columns)
+        cur.execute(f"SELECT {cols}, COUNT(*) AS n FROM `{table}` "
+                    f"GROUP BY {cols} HAVING COUNT(*) > 1 LIMIT 5")
+        dupes = cur.fetchall()
+        if dupes:
+            raise MigrationError(f"{table}: duplicate rows for unique key {name} {tuple(columns)}, "
+                                 f"e.g. {dupes}; remove them and run again")
+        cur.execute(f"ALTER TABLE `{table}` ADD UNIQUE INDEX `{name}` ({cols})")
+        print(f"  {table}: added unique index {name} {tuple(columns)}")
+        return True
+    if any(cols[:len(want)] == want for _, cols in have.values()):
+        return False
+    if unique:
+        name = "idx_" + name[3:] if name.startswith("uq_") else name + "_lookup"
+    cols = ", ".join(f"`{c}`" for c in columns)
+    cur.execute(f"ALTER TABLE `{table}` ADD INDEX `{name}` ({cols})")
+    print(f"  {table}: added index {name} {tuple(columns)}")
+    return True
+
+
+# --------------------------------------------------------------------
+# Runner
+# --------------------------------------------------------------------
+def applied(cur):
+    """{version: row} of schema_migrations (created on first use)."""
+    cur.execute(_VERSIONS_TABLE)
+    cur.execute("SELECT version, name, checksum, applied_at FROM schema_migrations")
+    return {int(r["version"]): r for r in cur.fetchall()}
+
+
+def migrate(con, directory=MIGRATIONS_DIR):
+    """Apply pending migrations in order. -> number applied."""
+    with con.cursor() as cur:
+        cur.execute("SELECT GET_LOCK(%s, %s) AS got", (LOCK_NAME, LOCK_WAIT_S))
+        if not (cur.fetchone() or {}).get("got"):
+            raise MigrationError(f"another migration holds the {LOCK_NAME!r} lock")
+        try:
+            done = applied(cur)
+            count = 0
+            for version, path in discover(directory):
+                if version in done:
+                    if done[version]["checksum"] != checksum(path):
+                        print(f"warning: {path.name} changed after it was applied; "
+                              "add a new migration instead of editing this one")
+                    continue
+                print(f"applying {path.name}")
+                t0 = time.perf_counter()
+                if path.suffix == ".sql":
+                    run_sql(cur, path.read_text(encoding="utf-8"))
+                else:
+                    _load(path).up(cur)
+                cur.execute("INSERT INTO schema_migrations (version, name, checksum) VALUES (%s,%s,%s)",
+                            (version, path.name, checksum(path)))
+                print(f"  done in {time.perf_counter() - t0:.1f} s")
+                count += 1
+            return count
+        finally:
+            cur.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+
+
+def status(con, directory=MIGRATIONS_DIR):
+    """[(version, file name, state)] with state applied / pending / changed."""
+    with con.cursor() as cur:
+        done = applied(cur)
+    out = []
+    for version, path in discover(directory):
+        row = done.get(version)
+        if row is None:
+            state = "pending"
+        elif row["checksum"] != checksum(path):
+            state = f"changed (applied {row['applied_at']})"
+        else:
+            state = f"applied {row['applied_at']}"
+        out.append((version, path.name, state))
+    return out
+
+
+if __name__ == "__main__":
+    import pymysql
+
+    # migrations import their helpers from "migrate": let them get this module
+    sys.modules.setdefault("migrate", sys.modules[__name__])
+
+    from app import DB_BATCH
+
+    ap = argparse.ArgumentParser(description="Apply schema migrations to app.DB")
+    ap.add_argument("--status", action="store_true", help="list migrations and exit")
+    args = ap.parse_args()
+
+    con = pymysql.connect(**DB_BATCH)   # .sql files are multi-statement
+    try:
+        if args.status:
+            for version, name, state in status(con):
+                print(f"{version:>4}  {name:<40} {state}")
+        else:
+            n = migrate(con)
+            print(f"{n} migration(s) applied" if n else "schema is up to date")
+    except MigrationError as e:
+        print("migrate:", e)
+        sys.exit(1)
+    finally:
+        con.close()
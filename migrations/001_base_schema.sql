@@ -0,0 +1,100 @@
+-- Tables app.py, wallet.py, leaderboard.py and chat_store.py use, with the
+-- keys their hot queries need (this replaces schema.sql). IF NOT EXISTS:
+-- databases created from the old schema pack keep their tables; 002 adds
+-- whatever keys those are missing.
+--
+-- The composite primary keys are also the unique constraints wallet.py
+-- relies on (INSERT IGNORE / ON DUPLICATE KEY instead of read-then-write),
+-- and InnoDB clusters rows by them, so the per-user lookups read one range.
+
+CREATE TABLE IF NOT EXISTS users (
+  ID              INT NOT NULL AUTO_INCREMENT,
+  Username        VARCHAR(50)  NOT NULL,
+  Email           VARCHAR(255) NOT NULL,
+  Password_hashed VARCHAR(255) NOT NULL,
+  created_at      TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (ID),
+  UNIQUE KEY uq_users_username (Username),
+  UNIQUE KEY uq_users_email (Email)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS user_wallet (
+  user_id        INT NOT NULL,
+  leaves         INT NOT NULL DEFAULT 0,
+  plants         INT NOT NULL DEFAULT 0,
+  beans_lifetime INT NOT NULL DEFAULT 0,
+  PRIMARY KEY (user_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- (user_id, task_date) first: "today's ticks" and the no-repeat window are
+-- prefix / range reads of the key; with task_id it is the one-row lookup
+-- of a toggle
+CREATE TABLE IF NOT EXISTS user_task_log (
+  user_id        INT NOT NULL,
+  task_date      DATE NOT NULL,
+  task_id        VARCHAR(100) NOT NULL,
+  awarded_plants INT NOT NULL DEFAULT 0,
+  created_at     TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (user_id, task_date, task_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS user_daily_bonus (
+  user_id        INT NOT NULL,
+  bonus_date     DATE NOT NULL,
+  awarded_plants INT NOT NULL DEFAULT 0,
+  created_at     TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (user_id, bonus_date)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS user_stickers (
+  user_id     INT NOT NULL,
+  sticker_id  VARCHAR(64) NOT NULL,
+  acquired_at DATE NOT NULL,
+  PRIMARY KEY (user_id, sticker_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- per-user per-day aggregates and streaks (leaderboard.py), written by the
+-- wallet transactions; the week's scores are a range read of
+-- idx_daily_stats_week that never touches the rows
+CREATE TABLE IF NOT EXISTS user_daily_stats (
+  user_id       INT NOT NULL,
+  stat_date     DATE NOT NULL,
+  tasks_done    INT NOT NULL DEFAULT 0,
+  leaves_earned INT NOT NULL DEFAULT 0,
+  bonus_plants  INT NOT NULL DEFAULT 0,
+  PRIMARY KEY (user_id, stat_date),
+  KEY idx_daily_stats_week (stat_date, user_id, leaves_earned)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS user_streaks (
+  user_id          INT NOT NULL,
+  current_streak   INT NOT NULL DEFAULT 0,
+  longest_streak   INT NOT NULL DEFAULT 0,
+  last_active_date DATE NULL,
+  longest_date     DATE NULL,
+  PRIMARY KEY (user_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS chat_sessions (
+  id         BIGINT NOT NULL AUTO_INCREMENT,
+  user_id    INT NOT NULL,
+  created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (id),
+  KEY idx_chat_sessions_user (user_id, id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- history pages walk (session_id, id) backwards: keyset, no filesort
+CREATE TABLE IF NOT EXISTS chat_messages (
+  id         BIGINT NOT NULL AUTO_INCREMENT,
+  session_id BIGINT NOT NULL,
+  role       VARCHAR(16) NOT NULL,
+  content    MEDIUMTEXT NOT NULL,
+  model      VARCHAR(64) NULL,
+  tokens_in  INT NULL,
+  tokens_out INT NULL,
+  latency_ms INT NULL,
+  sources    TEXT NULL,
+  created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (id),
+  KEY idx_chat_messages_session (session_id, id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
@@ -0,0 +1,26 @@
+"""
+Keys the hot queries need, on databases whose tables came from the old
+schema pack (001 leaves existing tables alone). No-op on a fresh database.
+"""
+from migrate import ensure_index
+
+# (table, index name, columns, unique) -- each lookup it serves in app.py / wallet.py
+KEYS = [
+    ("users", "uq_users_username", ["Username"], True),               # login, signup
+    ("users", "uq_users_email", ["Email"], True),                     # login, signup
+    ("user_wallet", "uq_user_wallet_user", ["user_id"], True),        # every balance read / upsert
+    ("user_task_log", "uq_task_log_user_day_task",
+     ["user_id", "task_date", "task_id"], True),                      # toggle; today's ticks; no-repeat window
+    ("user_daily_bonus", "uq_daily_bonus_user_day", ["user_id", "bonus_date"], True),
+    ("user_stickers", "uq_stickers_user_sticker", ["user_id", "sticker_id"], True),
+    ("user_daily_stats", "uq_daily_stats_user_day", ["user_id", "stat_date"], True),
+    ("user_daily_stats", "idx_daily_stats_week", ["stat_date", "user_id", "leaves_earned"], False),
+    ("user_streaks", "uq_user_streaks_user", ["user_id"], True),
+    ("chat_sessions", "idx_chat_sessions_user", ["user_id", "id"], False),
+    ("chat_messages", "idx_chat_messages_session", ["session_id", "id"], False),  # history pages
+]
+
+
+def up(cur):
+    for table, name, columns, unique in KEYS:
+        ensure_index(cur, table, name, columns, unique=unique)
@@ -0,0 +1,9 @@
+"""
+Fill user_daily_stats / user_streaks (001) from the task and bonus logs
+written before the wallet kept them up to date. Safe to run again.
+"""
+from leaderboard import backfill
+
+
+def up(cur):
+    print(f"  streaks rebuilt for {backfill(cur)} users")
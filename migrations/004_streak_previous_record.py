@@ -0,0 +1,13 @@
+"""
+user_streaks keeps the record a new one beat (prev_longest / _date), so
+undoing the task that set a record puts the old one back exactly
+(wallet._STREAK_DROP). Filled in from user_daily_stats.
+"""
+from leaderboard import backfill_previous
+from migrate import ensure_column
+
+
+def up(cur):
+    ensure_column(cur, "user_streaks", "prev_longest", "INT NOT NULL DEFAULT 0")
+    ensure_column(cur, "user_streaks", "prev_longest_date", "DATE NULL")
+    print(f"  previous records set for {backfill_previous(cur)} users")
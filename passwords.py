@@ -0,0 +1,100 @@
+"""
+Password hashing off the request threads, with a hard concurrency limit.
+
+    HASHER = Hasher(workers=2, max_queue=8)
+    pw_hash = HASHER.hash("s3cret!")          # raises Saturated when full
+    ok = HASHER.verify(pw_hash, "s3cret!")
+    HASHER.needs_rehash(pw_hash)              # method/params changed since?
+
+pbkdf2 is pure CPU (hashlib releases the GIL, so the workers really run in
+parallel). Running it inline lets a login burst start as many hashes as
+there are request threads, every one of them slows down, and so does every
+other request. Here at most `workers` hashes run at once and `max_queue`
+more may wait up to `queue_timeout`; anything beyond that is refused right
+away (Saturated -> the caller answers 429) instead of piling up.
+
+METHOD is pinned explicitly rather than left to werkzeug's default (which
+moves between releases): hashes stored with other parameters are
+re-hashed the next time their owner logs in.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# 600k iterations of PBKDF2-HMAC-SHA256 is OWASP's current recommendation
+METHOD = os.getenv("PASSWORD_HASH_METHOD", "pbkdf2:sha256:600000")
+SALT_LENGTH = 16
+
+
+class Saturated(Exception):
+    """All hashing slots are busy; retry shortly."""
+
+
+class Hasher:
+    def __init__(self, workers=2, max_queue=8, queue_timeout=0.5, method=METHOD,
+                 salt_length=SALT_LENGTH):
+        self.method = method
+        self.salt_length = salt_length
+        self.queue_timeout = queue_timeout
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pw-hash")
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._lock = threading.Lock()
+        self._stats = {"hashed": 0, "verified": 0, "rejected": 0, "in_flight": 0,
+                       "hash_ms_total": 0.0, "wait_ms_total": 0.0}
+        self.workers, self.max_queue = workers, max_queue
+
+    # ---- public API -------------------------------------------------
+
+    def hash(self, password):
+        return self._run("hashed", generate_password_hash, password,
+                         method=self.method, salt_length=self.salt_length)
+
+    def verify(self, pw_hash, password):
+        if not pw_hash:
+            return False
+        return self._run("verified", check_password_hash, pw_hash, password)
+
+    def needs_rehash(self, pw_hash):
+        method, _, rest = (pw_hash or "").partition("$")
+        salt = rest.partition("$")[0]
+        return method != self.method or len(salt) != self.salt_length
+
+    def stats(self):
+        with self._lock:
+            s = dict(self._stats)
+        done = s["hashed"] + s["verified"] or 1
+        s["hash_ms_avg"] = round(s.pop("hash_ms_total") / done, 1)
+        s["wait_ms_avg"] = round(s.pop("wait_ms_total") / done, 1)
+        s.update(workers=self.workers, max_queue=self.max_queue)
+        return s
+
+    # ---- internals --------------------------------------------------
+
+    def _run(self, counter, fn, *args, **kwargs):
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            with self._lock:
+                self._stats["rejected"] += 1
+            raise Saturated()
+        queued = time.perf_counter()
+        with self._lock:
+            self._stats["in_flight"] += 1
+        try:
+            started, result = self._pool.submit(self._timed, fn, *args, **kwargs).result()
+        finally:
+            self._slots.release()
+            with self._lock:
+                self._stats["in_flight"] -= 1
+        finished = time.perf_counter()
+        with self._lock:
+            self._stats[counter] += 1
+            self._stats["wait_ms_total"] += (started - queued) * 1000
+            self._stats["hash_ms_total"] += (finished - started) * 1000
+        return result
+
+    @staticmethod
+    def _timed(fn, *args, **kwargs):
+        started = time.perf_counter()
+        return started, fn(*args, **kwargs)
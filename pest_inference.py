@@ -0,0 +1,274 @@
+"""
+Pest-detection inference behind /pest-detect.
+
+    engine = InferenceEngine("pest_inference:ReferenceModel", workers=2)
+    engine.predict(image_bytes)   # -> {"detected", "pests", "recommendations"}
+
+Pieces:
+  PestModel        interface a real model implements (load once, predict a batch)
+  ReferenceModel   tiny colour-statistics model, CPU only, for tests and dev
+  InferenceEngine  micro-batches concurrent requests (up to max_batch, or
+                   whatever arrived within window_ms) and runs each batch in
+                   a pool of warm worker processes that loaded the model once.
+                   workers=0 runs batches in the batching thread instead.
+                   If a worker dies, the broken pool is replaced and only
+                   the batch it was running fails (BrokenProcessPool).
+
+Decoding and resizing happen in the workers, so request threads only ship
+bytes. Every batch reports decode / preprocess / infer timings which the
+engine aggregates in stats().
+
+Needs NumPy and Pillow; app.py falls back to its mock result without them.
+"""
+import importlib
+import io
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+from PIL import Image
+
+INPUT_SIZE = 224
+
+log = logging.getLogger(__name__)
+
+
+class PestModel:
+    """Interface for a detector. Subclasses are built once per worker."""
+
+    # input tensors are float32 [N, size, size, 3] in 0..1
+    input_size = INPUT_SIZE
+
+    def predict(self, batch):
+        """batch -> list of {"detected", "pests", "recommendations"}, one per image."""
+        raise NotImplementedError
+
+
+class ReferenceModel(PestModel):
+    """
+    Colour heuristics, vectorised over the batch: yellowed tissue is read as
+    spider mites, dense dark specks as aphids, grey-white patches as mildew.
+    Not a real classifier; it exists so the pipeline can be exercised end to end.
+    """
+
+    ADVICE = {
+        "spider mites": ["Rinse leaf undersides weekly", "Raise humidity around the plant"],
+        "aphids": ["Spray neem oil weekly", "Introduce ladybugs to control aphids"],
+        "powdery mildew": ["Improve air flow", "Remove affected leaves; avoid wetting foliage"],
+    }
+
+    def predict(self, batch):
+        r, g, b = batch[..., 0], batch[..., 1], batch[..., 2]
+        luma = 0.299 * r + 0.587 * g + 0.114 * b
+        yellow = ((r > 0.55) & (g > 0.45) & (b < 0.35)).mean(axis=(1, 2))
+        dark = (luma < 0.15).mean(axis=(1, 2))
+        grey = ((np.abs(r - g) < 0.05) & (np.abs(g - b) < 0.05) & (luma > 0.75)).mean(axis=(1, 2))
+
+        out = []
+        for y, d, w in zip(yellow, dark, grey):
+            pests = []
+            if y > 0.15:
+                pests.append("spider mites")
+            if d > 0.10:
+                pests.append("aphids")
+            if w > 0.20:
+                pests.append("powdery mildew")
+            out.append({
+                "detected": bool(pests),
+                "pests": pests,
+                "recommendations": [tip for p in pests for tip in self.ADVICE[p]],
+            })
+        return out
+
+
+def load_model(spec):
+    """"package.module:ClassName" -> instance."""
+    module, _, name = spec.partition(":")
+    return getattr(importlib.import_module(module), name)()
+
+
+def preprocess(img, size):
+    """PIL image -> float32 [size, size, 3] in 0..1 (centre-crop to square, then resize)."""
+    img = img.convert("RGB")
+    w, h = img.size
+    side = min(w, h)
+    left, top = (w - side) // 2, (h - side) // 2
+    img = img.crop((left, top, left + side, top + side)).resize((size, size), Image.BILINEAR)
+    return np.asarray(img, dtype=np.float32) / 255.0
+
+
+# --------------------------------------------------------------------
+# Worker side (runs in the pool processes, or inline when workers=0)
+# --------------------------------------------------------------------
+_MODEL = None
+
+
+def _worker_init(spec):
+    global _MODEL
+    _MODEL = load_model(spec)
+
+
+def _run_batch(blobs):
+    """bytes[] -> (results[], {"decode": s, "preprocess": s, "infer": s})."""
+    timings = {"decode": 0.0, "preprocess": 0.0, "infer": 0.0}
+    size = getattr(_MODEL, "input_size", INPUT_SIZE)
+    tensors, slots, results = [], [], [None] * len(blobs)
+
+    for i, blob in enumerate(blobs):
+        t0 = time.perf_counter()
+        try:
+            img = Image.open(io.BytesIO(blob))
+            img.draft("RGB", (size * 2, size * 2))   # let JPEG decode at reduced scale
+            img.load()
+        except Exception:
+            results[i] = {"error": "Could not read image"}
+            continue
+        t1 = time.perf_counter()
+        tensors.append(preprocess(img, size))
+        slots.append(i)
+        timings["decode"] += t1 - t0
+        timings["preprocess"] += time.perf_counter() - t1
+
+    if tensors:
+        t0 = time.perf_counter()
+        preds = _MODEL.predict(np.stack(tensors))
+        timings["infer"] += time.perf_counter() - t0
+        for i, pred in zip(slots, preds):
+            results[i] = pred
+    return results, timings
+
+
+# --------------------------------------------------------------------
+# Engine (web-process side)
+# --------------------------------------------------------------------
+class InferenceEngine:
+    def __init__(self, model_spec="pest_inference:ReferenceModel", workers=2,
+                 max_batch=8, window_ms=10):
+        self.model_spec = model_spec
+        self.workers = workers
+        self.max_batch = max_batch
+        self.window = window_ms / 1000.0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._stats = {"images": 0, "batches": 0, "errors": 0,
+                       "queue_wait_s": 0.0, "decode_s": 0.0, "preprocess_s": 0.0,
+                       "infer_s": 0.0, "batch_s": 0.0, "max_batch_seen": 0,
+                       "pool_restarts": 0}
+
+        if workers > 0:
+            self._pool = self._new_pool()
+            # warm every worker now so the first request doesn't pay model load
+            for f in [self._pool.submit(_run_batch, []) for _ in range(workers)]:
+                f.result()
+        else:
+            self._pool = None
+            _worker_init(model_spec)
+
+        # one dispatcher per worker keeps every process busy
+        self._threads = [threading.Thread(target=self._dispatch, name=f"pest-batcher-{i}", daemon=True)
+                         for i in range(max(1, workers))]
+        for t in self._threads:
+            t.start()
+
+    def _new_pool(self):
+        # spawn, not fork: the web process has threads (pool reaper, batcher)
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_worker_init, initargs=(self.model_spec,))
+
+    def _replace_pool(self, broken):
+        """A worker died (OOM, segfault in a native lib): the executor refuses
+        all further work, so swap in a fresh one. Only the first dispatcher
+        to notice replaces it."""
+        with self._lock:
+            if self._pool is not broken:
+                return
+            self._pool = self._new_pool()
+            self._stats["pool_restarts"] += 1
+        broken.shutdown(wait=False, cancel_futures=True)
+        log.warning("worker pool broken, restarted")
+
+    def submit(self, blob):
+        fut = Future()
+        self._queue.put((time.perf_counter(), blob, fut))
+        return fut
+
+    def predict(self, blob, timeout=30):
+        return self.submit(blob).result(timeout=timeout)
+
+    def stats(self):
+        with self._lock:
+            s = dict(self._stats)
+        n_img, n_batch = s["images"] or 1, s["batches"] or 1
+        s["avg_batch"] = round(s["images"] / n_batch, 2)
+        for stage in ("queue_wait", "decode", "preprocess", "infer"):
+            s[f"{stage}_ms_per_image"] = round(s.pop(f"{stage}_s") * 1000 / n_img, 3)
+        s["batch_ms_avg"] = round(s.pop("batch_s") * 1000 / n_batch, 3)
+        return s
+
+    def close(self):
+        for _ in self._threads:
+            self._queue.put(None)
+        if self._pool:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is None:
+            return None
+        items = [first]
+        deadline = time.perf_counter() + self.window
+        while len(items) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)   # let the loop see it next round
+                break
+            items.append(item)
+        return items
+
+    def _dispatch(self):
+        while True:
+            items = self._collect()
+            if items is None:
+                return
+            started = time.perf_counter()
+            blobs = [blob for _, blob, _ in items]
+            pool = self._pool
+            try:
+                if pool:
+                    results, timings = pool.submit(_run_batch, blobs).result()
+                else:
+                    results, timings = _run_batch(blobs)
+            except Exception as e:
+                if isinstance(e, BrokenProcessPool):
+                    self._replace_pool(pool)
+                with self._lock:
+                    self._stats["errors"] += len(items)
+                for _, _, fut in items:
+                    fut.set_exception(e)
+                continue
+
+            with self._lock:
+                st = self._stats
+                st["images"] += len(items)
+                st["batches"] += 1
+                st["max_batch_seen"] = max(st["max_batch_seen"], len(items))
+                st["queue_wait_s"] += sum(started - queued for queued, _, _ in items)
+                st["decode_s"] += timings["decode"]
+                st["preprocess_s"] += timings["preprocess"]
+                st["infer_s"] += timings["infer"]
+                st["batch_s"] += time.perf_counter() - started
+            for (_, _, fut), res in zip(items, results):
+                fut.set_result(res)
@@ -0,0 +1,210 @@
+"""
+Search/filter over indoor_plants.json with indexes built once per load.
+
+build_index(doc) is the JsonCatalog builder for the plant file: on top of
+catalog.build_plants it keeps inverted indexes from category, flags, moon
+phase code and text token to plant positions, so a query is a handful of
+set intersections instead of a scan of every record.
+
+Card images: media() describes the WebP variants and LQIP placeholder of a
+plant's `image` (see media.ImageDerivatives); `python plants.py` builds them.
+"""
+import bisect
+import re
+
+from catalog import build_plants
+from lunar import PHASE_NAMES, parse_phase_list
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# fields returned by list endpoints; the full record is one /api/plants/<id> away
+LEAN_FIELDS = ("id", "plant", "category", "indoor", "edible", "image")
+
+# recommendation buckets are precomputed for each phase code x these filters
+RECO_FILTERS = ("all", "edible", "ornamental")
+
+# card image variants: widths of the WebP steps, and of the inline placeholder
+IMAGE_WIDTHS = (160, 320, 480, 640, 960)
+LQIP_WIDTH = 16
+CARD_WIDTH = 320
+
+
+def tokenize(text):
+    return [t for t in _TOKEN_RE.findall(str(text or "").lower()) if len(t) > 1]
+
+
+def _plant_text(p):
+    faq = p.get("faq") or {}
+    parts = [p.get("plant"), p.get("category")]
+    parts += list(p.get("benefits") or []) + list(p.get("symbolism") or [])
+    parts += [faq.get(k) for k in ("sunlight", "watering", "soil", "avoid", "notes")]
+    return " ".join(str(x) for x in parts if x)
+
+
+def build_index(doc):
+    view = build_plants(doc)
+    by_category, by_indoor, by_edible = {}, {True: set(), False: set()}, {True: set(), False: set()}
+    growing, harvesting, resting, tokens = {}, {}, {}, {}
+
+    for pos, p in enumerate(doc):
+        by_category.setdefault(str(p.get("category") or "").strip().lower(), set()).add(pos)
+        by_indoor[bool(p.get("indoor"))].add(pos)
+        by_edible[bool(p.get("edible"))].add(pos)
+        mp = p.get("moon_phase") or {}
+        for code in parse_phase_list(mp.get("growing")):
+            growing.setdefault(code, set()).add(pos)
+        for code in parse_phase_list(mp.get("harvesting")):
+            harvesting.setdefault(code, set()).add(pos)
+        for code in parse_phase_list(mp.get("resting")):
+            resting.setdefault(code, set()).add(pos)
+        for tok in tokenize(_plant_text(p)):
+            tokens.setdefault(tok, set()).add(pos)
+
+    categories = {}
+    for p in doc:
+        c = p.get("category")
+        if c:
+            categories[c] = categories.get(c, 0) + 1
+
+    view.update({
+        "reco": _build_recommendations(doc, growing, harvesting, resting),
+        "idx_category": by_category,
+        "idx_indoor": by_indoor,
+        "idx_edible": by_edible,
+        "idx_growing": growing,
+        "idx_harvesting": harvesting,
+        "idx_resting": resting,
+        "idx_token": tokens,
+        "token_list": sorted(tokens),   # for prefix matching of the last query word
+        "categories": sorted(categories.items(), key=lambda kv: kv[0].lower()),
+    })
+    return view
+
+
+def _build_recommendations(doc, growing, harvesting, resting):
+    """{phase code: {filter: {"grow": [names], "harvest": [...], "rest": [...], "neutral": [...]}}}
+
+    neutral: plants with no advice at all for that phase.
+    """
+    names = [p.get("plant") or p.get("name") or "Unknown plant" for p in doc]
+    keep = {
+        "all": lambda p: True,
+        "edible": lambda p: bool(p.get("edible")),
+        "ornamental": lambda p: not p.get("edible"),
+    }
+    reco = {}
+    for code in range(len(PHASE_NAMES)):
+        grow, rest = growing.get(code, set()), resting.get(code, set())
+        harvest = harvesting.get(code, set())
+        reco[code] = {}
+        for flt in RECO_FILTERS:
+            buckets = {"grow": [], "harvest": [], "rest": [], "neutral": []}
+            for pos, p in enumerate(doc):
+                if not keep[flt](p):
+                    continue
+                if pos in grow:
+                    buckets["grow"].append(names[pos])
+                if pos in harvest:
+                    buckets["harvest"].append(names[pos])
+                if pos in rest:
+                    buckets["rest"].append(names[pos])
+                if pos not in grow and pos not in harvest and pos not in rest:
+                    buckets["neutral"].append(names[pos])
+            reco[code][flt] = buckets
+    return reco
+
+
+def _prefix_match(view, prefix):
+    toks = view["token_list"]
+    out = set()
+    i = bisect.bisect_left(toks, prefix)
+    while i < len(toks) and toks[i].startswith(prefix):
+        out |= view["idx_token"][toks[i]]
+        i += 1
+    return out
+
+
+def search(view, category=None, indoor=None, edible=None,
+           growing=None, resting=None, q=None):
+    """Positions (in file order) of plants matching every given filter.
+
+    growing / resting are phase codes (see lunar.PHASE_NAMES); q matches
+    every word, the last one as a prefix so it works while typing.
+    """
+    sets = []
+    if category:
+        sets.append(view["idx_category"].get(category.strip().lower(), set()))
+    if indoor is not None:
+        sets.append(view["idx_indoor"][indoor])
+    if edible is not None:
+        sets.append(view["idx_edible"][edible])
+    if growing is not None:
+        sets.append(view["idx_growing"].get(growing, set()))
+    if resting is not None:
+        sets.append(view["idx_resting"].get(resting, set()))
+    if q:
+        words = tokenize(q)
+        for w in words[:-1]:
+            sets.append(view["idx_token"].get(w, set()))
+        if words:
+            sets.append(_prefix_match(view, words[-1]))
+        else:
+            sets.append(set())
+
+    if not sets:
+        return list(range(len(view["items"])))
+    sets.sort(key=len)   # intersect smallest first
+    hits = set(sets[0])
+    for s in sets[1:]:
+        hits &= s
+        if not hits:
+            break
+    return sorted(hits)
+
+
+def lean(p):
+    return {k: p.get(k) for k in LEAN_FIELDS}
+
+
+def image_rel(p):
+    """indoor_plants.json's "static/images/x.jpg" -> "images/x.jpg" (None if unset)."""
+    img = str(p.get("image") or "").lstrip("/")
+    if not img.startswith("static/"):
+        return None
+    return img[len("static/"):]
+
+
+def media(p, thumbs):
+    """{"src", "srcset", "width", "height", "lqip"} for a plant's image, or
+    None when it has none or the variants are still being built."""
+    rel = image_rel(p)
+    e = thumbs.get(rel) if rel else None
+    if not e:
+        return None
+    return {
+        "src": thumbs.url(e, "webp", CARD_WIDTH),
+        "srcset": thumbs.srcset(e, "webp"),
+        "width": e["width"],
+        "height": e["height"],
+        "lqip": e.get("lqip"),
+    }
+
+
+if __name__ == "__main__":
+    import json
+    from pathlib import Path
+    from media import ImageDerivatives
+
+    base = Path(__file__).resolve().parent
+    static = base / "static"
+    doc = json.loads((static / "data" / "indoor_plants.json").read_text("utf-8"))
+    thumbs = ImageDerivatives(static, base / ".build" / "media" / "plants", "/media/plants",
+                              widths=IMAGE_WIDTHS, formats=("webp",), lqip_width=LQIP_WIDTH)
+    for p in doc:
+        rel = image_rel(p)
+        if p.get("image") and (rel is None or not (static / rel).is_file()):
+            print(f"{p.get('id')}: image not found: {p.get('image')}")
+    rels = sorted({r for r in map(image_rel, doc) if r and (static / r).is_file()})
+    for rel, e in thumbs.build_all(rels).items():
+        steps = ", ".join(f"{v['w']}w={v['bytes'] // 1024}KB" for v in e["variants"]["webp"])
+        print(f"{rel}: {e['bytes'] // 1024}KB -> {steps}; lqip {len(e['lqip'])} chars")
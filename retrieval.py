@@ -0,0 +1,157 @@
+"""
+BM25 retrieval over the plant FAQ, for the chatbot.
+
+    SEARCH = JsonCatalog(PLANTS_PATH, IncrementalBuilder())
+    SEARCH.get()["index"].search("how often to water snake plant", k=3)
+    -> [{"plant_id", "plant", "field", "text", "score"}, ...]
+
+Every plant becomes a handful of passages (one per FAQ field plus one
+for benefits/symbolism), each prefixed with the plant name and words for
+its field so "water" finds the watering answer of the right plant.
+
+The index is a sparse term x passage matrix kept as CSR-style NumPy
+arrays (no SciPy needed): postings of term t are ids[ptr[t]:ptr[t+1]]
+with their BM25 weights precomputed, so a query is one slice-and-add per
+query term plus an argpartition for the top k - milliseconds even for tens
+of thousands of plants.
+
+IncrementalBuilder remembers each plant's tokenised passages by content
+hash, so after an edit to indoor_plants.json only changed plants are
+re-tokenised; the arrays themselves are re-assembled (cheap, vectorised).
+"""
+import hashlib
+import json
+import re
+from collections import Counter
+
+import numpy as np
+
+K1 = 1.5
+B = 0.75
+
+# passage kinds and the words that should lead a question to them
+FIELDS = {
+    "sunlight": "sunlight light sun shade bright",
+    "watering": "watering water",
+    "soil": "soil potting mix",
+    "avoid": "avoid problem danger",
+    "notes": "notes care tip",
+    "about": "benefits symbolism meaning",
+}
+
+STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from how i if in is it its me my of on or
+should so that the this to what when where which who why will with you your
+""".split())
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def _stem(w):
+    # just enough to make water/watering/waters and plant/plants meet
+    for suffix in ("ing", "ed", "es", "s"):
+        if len(w) > len(suffix) + 2 and w.endswith(suffix):
+            return w[: -len(suffix)]
+    return w
+
+
+def tokenize(text):
+    return [_stem(t) for t in _TOKEN_RE.findall(str(text or "").lower()) if t not in STOPWORDS]
+
+
+def question_key(text):
+    """
+    Cache key for a question: stemmed, stopword-free, de-duplicated and
+    sorted terms, hashed. BM25 ignores word order and repeats, so two
+    questions with the same key retrieve exactly the same passages
+    ("How often to water a snake plant?" == "snake plant: water how often").
+    None when nothing is left to search for.
+    """
+    terms = sorted(set(tokenize(text)))
+    if not terms:
+        return None
+    return hashlib.sha1(" ".join(terms).encode("utf-8")).hexdigest()
+
+
+def plant_passages(p):
+    """-> [(meta, text)] for one plant record."""
+    name = p.get("plant") or p.get("name") or ""
+    faq = p.get("faq") or {}
+    out = []
+    for field in ("sunlight", "watering", "soil", "avoid", "notes"):
+        if faq.get(field):
+            out.append((field, str(faq[field])))
+    about = list(p.get("benefits") or []) + list(p.get("symbolism") or [])
+    if about:
+        out.append(("about", ", ".join(map(str, about))))
+    return [({"plant_id": p.get("id"), "plant": name, "field": field, "text": text},
+             f"{name} {p.get('category') or ''} {FIELDS[field]} {text}")
+            for field, text in out]
+
+
+class BM25Index:
+    def __init__(self, metas, counts):
+        """metas[i] describes passage i; counts[i] is its Counter of tokens."""
+        self.metas = metas
+        n = len(metas)
+        vocab = {}
+        rows, cols, tfs = [], [], []
+        for i, c in enumerate(counts):
+            for term, tf in c.items():
+                rows.append(vocab.setdefault(term, len(vocab)))
+                cols.append(i)
+                tfs.append(tf)
+        self.vocab = vocab
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int32)
+        tfs = np.asarray(tfs, dtype=np.float32)
+
+        doc_len = np.zeros(n, dtype=np.float32)
+        np.add.at(doc_len, cols, tfs)
+        avgdl = float(doc_len.mean()) if n else 1.0
+        df = np.bincount(rows, minlength=len(vocab)).astype(np.float32)
+        idf = np.log(1.0 + (n - df + 0.5) / (df + 0.5))
+
+        order = np.argsort(rows, kind="stable")
+        rows, cols, tfs = rows[order], cols[order], tfs[order]
+        self.ptr = np.concatenate(([0], np.cumsum(np.bincount(rows, minlength=len(vocab)))))
+        self.ids = cols
+        norm = K1 * (1 - B + B * doc_len[cols] / (avgdl or 1.0))
+        self.weights = (idf[rows] * tfs * (K1 + 1) / (tfs + norm)).astype(np.float32)
+        self.n = n
+
+    def search(self, query, k=5, min_score=0.0):
+        terms = {self.vocab[t] for t in tokenize(query) if t in self.vocab}
+        if not terms or not self.n:
+            return []
+        scores = np.zeros(self.n, dtype=np.float32)
+        for t in terms:
+            sl = slice(self.ptr[t], self.ptr[t + 1])
+            scores[self.ids[sl]] += self.weights[sl]   # ids are unique within a term
+        k = min(k, self.n)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [dict(self.metas[i], score=round(float(scores[i]), 4))
+                for i in top if scores[i] > min_score]
+
+
+class IncrementalBuilder:
+    """JsonCatalog builder: {"index": BM25Index, "retokenized": n} per load."""
+
+    def __init__(self):
+        self._cache = {}   # plant content hash -> [(meta, Counter)]
+
+    def __call__(self, doc):
+        cache, metas, counts, fresh = {}, [], [], 0
+        for p in doc:
+            key = hashlib.sha1(json.dumps(p, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+            entry = self._cache.get(key)
+            if entry is None:
+                entry = [(meta, Counter(tokenize(text))) for meta, text in plant_passages(p)]
+                fresh += 1
+            cache[key] = entry
+            for meta, c in entry:
+                metas.append(meta)
+                counts.append(c)
+        self._cache = cache   # drop plants that were removed
+        return {"index": BM25Index(metas, counts), "retokenized": fresh}
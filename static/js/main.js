@@ -87,6 +87,7 @@ const themeRoot = document.documentElement;
     wrap.append(avatar, bubble);
     chatEl.appendChild(wrap);
     chatEl.scrollTop = chatEl.scrollHeight;
+    return bubble.firstElementChild;
   };
 
   const showTyping = () => {
@@ -126,15 +127,7 @@ const themeRoot = document.documentElement;
     showTyping();
 
     try {
-      const res = await fetch('/api/chat', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ session_id: sessionId, message: text })
-      });
-      if (!res.ok) throw new Error('bad response');
-      const data = await res.json();
-      hideTyping();
-      addMessage('ai', escapeHTML(data.reply || 'ok!'));
+      await streamReply(text);
     } catch (err) {
       console.error(err);
       hideTyping();
@@ -142,6 +135,63 @@ const themeRoot = document.documentElement;
     }
   });
 
+  // Reply over SSE (/api/chat/stream): tokens are painted as they arrive.
+  // Browsers that can't read a response body as a stream use the one-shot
+  // /api/chat instead; the choice is made before anything is sent, since
+  // either endpoint stores the message and generates a reply.
+  const canStream = typeof ReadableStream === 'function' && 'body' in Response.prototype;
+
+  async function streamReply(text) {
+    const body = JSON.stringify({ session_id: sessionId, message: text });
+    const headers = { 'Content-Type': 'application/json' };
+
+    if (!canStream) {
+      const res = await fetch('/api/chat', { method: 'POST', headers, body });
+      if (!res.ok) throw new Error('bad response');
+      const data = await res.json();
+      hideTyping();
+      addMessage('ai', escapeHTML(data.reply || 'ok!'));
+      return;
+    }
+
+    const res = await fetch('/api/chat/stream', { method: 'POST', headers, body });
+    if (!res.ok) throw new Error('bad response');
+
+    let buf = '', reply = '', el = null;
+    const takeFrames = () => {
+      let cut;
+      while ((cut = buf.indexOf('\n\n')) >= 0) {
+        const frame = buf.slice(0, cut);
+        buf = buf.slice(cut + 2);
+        const event = (frame.match(/^event: (.*)$/m) || [])[1];
+        const data = JSON.parse((frame.match(/^data: (.*)$/m) || [, 'null'])[1]);
+        if (event === 'token') {
+          if (!el) { hideTyping(); el = addMessage('ai', ''); }
+          reply += data.t;
+          el.innerHTML = escapeHTML(reply);
+          chatEl.scrollTop = chatEl.scrollHeight;
+        } else if (event === 'error') {
+          throw new Error(data?.error || 'stream error');
+        }
+      }
+    };
+
+    if (res.body?.getReader) {
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      for (;;) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buf += decoder.decode(value, { stream: true });
+        takeFrames();
+      }
+    } else {
+      buf = await res.text();   // same events, just all at once
+      takeFrames();
+    }
+    if (!el) { hideTyping(); addMessage('ai', 'ok!'); }
+  }
+
   // Enter = send, Shift+Enter = newline
   textarea?.addEventListener('keydown', (e) => {
     if (e.key === 'Enter' && !e.shiftKey) {
@@ -193,44 +243,9 @@ const themeRoot = document.documentElement;
     }
   };
 
-  /* ==========================
-   * Plants
-   * ========================== */
-
-  const loadPlants = async () => {
-    const res = await fetch('/static/data/indoor_plants.json', { cache: 'no-store' });
-    if (!res.ok) throw new Error('/static/data/indoor_plants.json not found');
-    return res.json();
-  };
-
-  // quick, simple moon phase guesser (calendar-day based heuristic)
-  const getMoonPhase = (date) => {
-    const day = date.getDate();
-    const d = day % 29.53;
-    if (d < 1) return 'New Moon';
-    if (d < 7) return 'Waxing Crescent Moon';
-    if (d < 10) return 'First Quarter';
-    if (d < 14) return 'Waxing Gibbous Moon';
-    if (d < 16) return 'Full Moon';
-    if (d < 22) return 'Waning Gibbous Moon';
-    if (d < 25) return 'Last Quarter';
-    return 'Waning Crescent Moon';
-  };
-
-  // cache plants after first load
-let PLANTS = null;
-
-async function ensurePlants() {
-  if (PLANTS) return PLANTS;
-  const res = await fetch('/static/data/indoor_plants.json', { cache: 'no-store' });
-  if (!res.ok) throw new Error('/static/data/indoor_plants.json not found');
-  PLANTS = await res.json();
-  return PLANTS;
-}
-
 /* ==========================
  * Plant Catalog (categories + dropdown + details)
- * Reuses ensurePlants(); runs only if required elements exist.
+ * Runs only if required elements exist.
  * ========================== */
 
 let ACTIVE_CAT_BTN = null;
@@ -250,9 +265,18 @@ function renderPlantDetails(plant, container) {
        </ul>`
     : `<p><strong>Resources:</strong> None available.</p>`;
 
+  // blurred inline placeholder paints at once; the WebP step that fits loads lazily
+  const m = plant.media;
+  const imageHTML = m
+    ? `<img class="plant-photo" src="${m.src}" srcset="${m.srcset}" sizes="(max-width: 600px) 90vw, 320px"
+            width="${m.width}" height="${m.height}" loading="lazy" decoding="async"
+            alt="${plant.plant || ''}"
+            style="max-width:100%;height:auto;background:center/cover no-repeat url('${m.lqip || ''}')">`
+    : '';
+
   container.innerHTML = `
     <h3>🍁 ${plant.plant || plant.name || 'Unknown'} 🍁</h3>
-    
+    ${imageHTML}
     <p><strong>📜 Category:</strong> ${plant.category ?? '—'}</p>
     <p><strong>✨ Benefits:</strong> ${(plant.benefits || []).join(', ') || '—'}</p>
     <p><strong>🕯️ Symbolism:</strong> ${(plant.symbolism || []).join(', ') || '—'}</p>
@@ -269,9 +293,23 @@ function renderPlantDetails(plant, container) {
   `;
 }
 
-function updateDropdown(category, plants, selectEl, detailsEl) {
+// Lean list + per-plant details come from /api/plants, so the page never
+// downloads the whole catalog just to show one category.
+const PLANT_DETAILS = new Map();
+
+async function fetchPlant(id) {
+  if (PLANT_DETAILS.has(id)) return PLANT_DETAILS.get(id);
+  const res = await fetch(`/api/plants/${encodeURIComponent(id)}`);
+  if (!res.ok) return null;
+  const plant = await res.json();
+  PLANT_DETAILS.set(id, plant);
+  return plant;
+}
+
+async function updateDropdown(category, selectEl, detailsEl) {
   if (!selectEl) return;
-  const filtered = (plants || []).filter(p => p.category === category);
+  const res = await fetch(`/api/plants?category=${encodeURIComponent(category)}&per_page=100`);
+  const filtered = res.ok ? (await res.json()).items || [] : [];
 
   selectEl.innerHTML = '';
   for (const plant of filtered) {
@@ -300,9 +338,9 @@ async function initPlantCatalog() {
   if (!btnWrap || !selectEl || !detailsEl) return;
 
   try {
-    const plants = await ensurePlants();
-    const categories = [...new Set(plants.map(p => p.category).filter(Boolean))]
-      .sort((a, b) => a.localeCompare(b));
+    const res = await fetch('/api/plants/categories');
+    if (!res.ok) throw new Error('/api/plants/categories failed');
+    const categories = ((await res.json()).categories || []).map(c => c.name);
 
     // Build buttons
     btnWrap.innerHTML = '';
@@ -313,7 +351,7 @@ async function initPlantCatalog() {
       btn.textContent = cat;
       btn.className = 'pill-button';
       btn.addEventListener('click', () => {
-        updateDropdown(cat, plants, selectEl, detailsEl);
+        updateDropdown(cat, selectEl, detailsEl);
 
         if (ACTIVE_CAT_BTN) ACTIVE_CAT_BTN.classList.remove('active');
         btn.classList.add('active');
@@ -323,10 +361,10 @@ async function initPlantCatalog() {
     }
 
     // Select change → show details
-    selectEl.addEventListener('change', () => {
+    selectEl.addEventListener('change', async () => {
       const selectedId = selectEl.value;
-      const plant = plants.find(p => String(p.id ?? p.plant) === selectedId);
-      renderPlantDetails(plant, detailsEl);
+      const plant = await fetchPlant(selectedId);
+      if (selectEl.value === selectedId) renderPlantDetails(plant, detailsEl);
     });
 
     // Auto-pick the first category so the UI is populated on load
@@ -342,40 +380,14 @@ async function initPlantCatalog() {
 }
 
 
-function phaseKey(label) {
-  // normalize flexible labels like "Waning Gibbous Moon"
-  const p = String(label || '').toLowerCase().replace(/moon/g, '').trim();
-  if (p.includes('new')) return 'new';
-  if (p.includes('waxing crescent')) return 'waxing crescent';
-  if (p.includes('first') || p === 'first quarter') return 'first quarter';
-  if (p.includes('waxing gibbous')) return 'waxing gibbous';
-  if (p.includes('full')) return 'full';
-  if (p.includes('waning gibbous')) return 'waning gibbous';
-  if (p.includes('last') || p.includes('third') || p === 'last quarter') return 'last quarter';
-  if (p.includes('waning crescent')) return 'waning crescent';
-  return p;
+async function fetchRecommendations(dateStr, typeFilter) {
+  const q = new URLSearchParams({ date: dateStr || '', type: typeFilter || '' });
+  const res = await fetch(`/api/recommendations?${q}`);
+  if (!res.ok) throw new Error(`/api/recommendations returned ${res.status}`);
+  return res.json(); // {phase, illumination, grow, harvest, rest, neutral}
 }
 
-function bucketByPhase(plants, phaseLabel, typeFilter = null) {
-  const key = phaseKey(phaseLabel);
-  const grow = [], harvest = [], rest = [];
-
-  for (const p of plants) {
-    if (typeFilter === 'Edible' && !p.edible) continue;
-    if (typeFilter === 'Ornamental' && p.edible) continue;
-
-    const mp = p.moon_phase || {};
-    const name = p.plant || p.name || 'Unknown plant';
-
-    if (mp.growing && phaseKey(mp.growing) === key)    grow.push(name);
-    if (mp.harvesting && phaseKey(mp.harvesting) === key) harvest.push(name);
-    if (mp.resting && phaseKey(mp.resting) === key)    rest.push(name);
-  }
-
-  return { grow, harvest, rest };
-}
-
-function renderBuckets({ grow, harvest, rest }) {
+function renderBuckets({ grow = [], harvest = [], rest = [] }) {
   const growList = document.getElementById('growList');
   const harvestList = document.getElementById('harvestList');
   const restList = document.getElementById('restList');
@@ -420,18 +432,11 @@ function renderBuckets({ grow, harvest, rest }) {
   const dateInput = dateEl.value;
   if (!dateInput) { alert('Please select a date!'); return; }
 
-  const date = new Date(dateInput);
-
-  // Your quick heuristic; keep as-is or replace with /moon?date=...
-  const phaseLabel = getMoonPhase(date);
-  phaseEl.textContent = `🌙 ${phaseLabel}`;
-
   try {
-    const plants = await ensurePlants();
-    const typeFilter = typeEl.value; // "Edible" | "Ornamental" | ""
-
-    const buckets = bucketByPhase(plants, phaseLabel, typeFilter || null);
-    renderBuckets(buckets);
+    // phase + buckets are precomputed server-side per phase
+    const data = await fetchRecommendations(dateInput, typeEl.value); // "Edible" | "Inedible" | ""
+    phaseEl.textContent = `🌙 ${data.phase}`;
+    renderBuckets(data);
   } catch (e) {
     console.error(e);
     const outEl = $('#suggestionOutput');
@@ -447,19 +452,11 @@ document.addEventListener('DOMContentLoaded', () => {
       const dateStr = document.getElementById('datePicker')?.value;
       const typeFilter = document.getElementById('plantType')?.value; // "edible" | "ornamental" | ""
 
-      // call your API to get the phase for that date
-      let phaseLabel = null;
       try {
-        const res = await fetch(`/moon?date=${encodeURIComponent(dateStr)}`);
-        const data = await res.json();
-        phaseLabel = data.phase;
+        renderBuckets(await fetchRecommendations(dateStr, typeFilter));
       } catch (e) {
-        console.error('Could not fetch moon phase:', e);
+        console.error('Could not fetch recommendations:', e);
       }
-
-      // now split into buckets
-      const buckets = bucketByPhase(plants, phaseLabel, typeFilter || null);
-      renderBuckets(buckets);
     });
   }
   initPlantCatalog();
@@ -646,18 +643,6 @@ if (analyzeBtn) {
     if (statPlants) statPlants.textContent = plants;
   };
 
-  // Load username + wallet
-  async function loadHeader() {
-    try {
-      // If you have an endpoint for profile name, use it. Otherwise read from a data-* on the page or fallback.
-      const profile = await (await fetch('/api/wallet')).json();
-      setPills(profile.leaves?? 0, profile.plants ?? 0);
-      if (userName && profile.username) userName.textContent = profile.username;
-    } catch (e) {
-      /* not fatal */
-    }
-  }
-
 //stickers display
 async function redeemSticker(stickerId) {
   try {
@@ -692,9 +677,19 @@ async function loadStickers() {
     const stickerCard = document.createElement('div');
     stickerCard.classList.add('sticker-card');
     
+    // thumbnails: browser picks the smallest WebP/PNG that fits the card
+    const srcset = sticker.srcset || {};
+    const img = !sticker.image ? '<div class="sticker-missing">No image</div>' : `
+      <picture>
+        ${srcset.webp ? `<source type="image/webp" srcset="${srcset.webp}" sizes="160px">` : ''}
+        <img src="${sticker.image}" ${srcset.png ? `srcset="${srcset.png}" sizes="160px"` : ''}
+             alt="${sticker.name}" loading="lazy" decoding="async" />
+      </picture>`;
+    const unit = sticker.currency === 'plants' ? 'Plants' : 'Leaves';
+
     stickerCard.innerHTML = `
-      <img src="${sticker.image}" alt="${sticker.name}" />
-      <div class="price">Price: ${sticker.price} Beans</div>
+      ${img}
+      <div class="price">Price: ${sticker.price} ${unit}</div>
       <button onclick="redeemSticker('${sticker.id}')">Redeem</button>
     `;
     
@@ -703,11 +698,11 @@ async function loadStickers() {
 }
 
 
-  // Render today’s tasks
+  // Render today’s tasks, username + wallet: one /api/dashboard call
 async function loadTasks() {
   listEl.innerHTML = `<li class="task"><span>Loading…</span></li>`;
   try {
-    const r = await fetch('/api/tasks/today', { cache: 'no-store' });
+    const r = await fetch('/api/dashboard', { cache: 'no-cache' });
 
     if (r.status === 401) {
       // not logged in → send to login and come back here after
@@ -721,7 +716,9 @@ async function loadTasks() {
     const data = await r.json();
 
     // header stats
-    setPills(data.leaves ?? 0, data.plants ?? 0);
+    const wallet = data.wallet || {};
+    setPills(wallet.leaves ?? 0, wallet.plants ?? 0);
+    if (userName && data.username) userName.textContent = data.username;
     if (capHint) {
       const cap = Number(data.max_daily_leaves ?? 10);
       capHint.textContent = `Daily leaves cap: ${cap}`;
@@ -771,7 +768,7 @@ async function loadTasks() {
     });
 
     // bonus state
-    claimBtn.disabled = !data.all_done;
+    claimBtn.disabled = !data.all_done || data.bonus_claimed;
     claimBtn.dataset.bonus = data.all_done_bonus_plants || 0;
 
   } catch (e) {
@@ -804,7 +801,6 @@ async function loadTasks() {
   });
 
   // init
-  loadHeader();
   loadTasks();
 })();
 
@@ -0,0 +1,62 @@
+"""
+Sticker catalog builder with image-path validation.
+
+build_index(doc, static_dir) is the JsonCatalog builder for stickers.json:
+catalog.build_stickers plus, per sticker, the image path relative to
+static/ ("src", None when the file does not exist) and a list of
+"problems" so a typo in the JSON shows up in the log, not as a broken
+<img> in the shop.
+
+    python stickers.py           # list broken img paths, build thumbnails
+"""
+from pathlib import Path
+
+from catalog import build_stickers
+
+STATIC_PREFIX = "/static/"
+
+
+def check_img(img, static_dir):
+    """-> (rel path under static/ or None, problem text or None)."""
+    if not img:
+        return None, "no img"
+    if not img.startswith(STATIC_PREFIX):
+        return None, f"img is not under {STATIC_PREFIX}: {img}"
+    rel = img[len(STATIC_PREFIX):]
+    path = Path(static_dir) / rel
+    if path.is_file():
+        return rel, None
+    if not path.suffix:
+        return None, f"missing file extension: {img}"
+    return None, f"file not found: {img}"
+
+
+def build_index(doc, static_dir):
+    view = build_stickers(doc)
+    src, problems = {}, []
+    for s in view["items"]:
+        sid = str(s.get("id"))
+        rel, problem = check_img(s.get("img"), static_dir)
+        src[sid] = rel
+        if problem:
+            problems.append({"id": sid, "problem": problem})
+    if problems:
+        print(f"[stickers] {len(problems)} of {len(view['items'])} stickers have no usable image")
+        for p in problems:
+            print(f"[stickers]   {p['id']}: {p['problem']}")
+    view.update({"src": src, "problems": problems})
+    return view
+
+
+if __name__ == "__main__":
+    import json
+    from media import ImageDerivatives
+
+    base = Path(__file__).resolve().parent
+    static = base / "static"
+    view = build_index(json.loads((static / "data" / "stickers.json").read_text("utf-8")), static)
+    thumbs = ImageDerivatives(static, base / ".build" / "media" / "stickers", "/media/stickers")
+    rels = sorted({r for r in view["src"].values() if r})
+    for rel, e in thumbs.build_all(rels).items():
+        sizes = ", ".join(f"{v['w']}w={v['bytes'] // 1024}KB" for v in e["variants"]["webp"])
+        print(f"{rel}: {e['bytes'] // 1024}KB -> webp {sizes}")
@@ -0,0 +1,146 @@
+"""
+AssetStore fingerprints, HTML rewriting, encoding choice, 304s and the
+clean-up of replaced variants, on a throwaway static/ + template/ tree.
+
+    python -m pytest tests/test_assets.py
+"""
+import gzip
+import hashlib
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+flask = pytest.importorskip("flask")
+
+import assets  # noqa: E402
+from assets import HASH_LEN, IMMUTABLE, REVALIDATE, AssetStore  # noqa: E402
+
+CSS = "body { color: #264d26; }\n" * 40          # big enough to be compressed
+JS = "console.log('hi');\n"                      # too small to be worth it
+PAGE = """<html><head>
+<link rel="stylesheet" href="static/css/site.css">
+<script src="/static/js/app.js"></script>
+</head><body><img src="/static/missing.png"></body></html>
+"""
+
+
+def _digest(data):
+    return hashlib.sha256(data).hexdigest()[:HASH_LEN]
+
+
+@pytest.fixture
+def tree(tmp_path):
+    static, template = tmp_path / "static", tmp_path / "template"
+    (static / "css").mkdir(parents=True)
+    (static / "js").mkdir()
+    template.mkdir()
+    (static / "css" / "site.css").write_text(CSS)
+    (static / "js" / "app.js").write_text(JS)
+    (template / "page.html").write_text(PAGE)
+    return tmp_path
+
+
+@pytest.fixture
+def store(tree):
+    return AssetStore({"static": tree / "static", "template": tree / "template"}, tree / "out")
+
+
+@pytest.fixture
+def client(store):
+    app = flask.Flask(__name__, static_folder=None)
+    app.add_url_rule("/static/<path:f>", "static_file", lambda f: store.send("static", f))
+    app.add_url_rule("/page/<path:f>", "page", lambda f: store.send("template", f))
+    return app.test_client()
+
+
+def test_url_carries_the_content_hash(store):
+    assert store.url("css/site.css") == f"/static/css/site.{_digest(CSS.encode())}.css"
+    assert store.url("nope.css") == "/static/nope.css"
+
+
+def test_fingerprinted_url_is_immutable(client, store):
+    res = client.get(store.url("js/app.js"))
+    assert res.status_code == 200 and res.data == JS.encode()
+    assert res.headers["Cache-Control"] == IMMUTABLE
+
+
+def test_plain_and_outdated_urls_revalidate(client):
+    for url in ("/static/js/app.js", "/static/js/app.000000000000.js"):
+        res = client.get(url)
+        assert res.status_code == 200 and res.data == JS.encode()
+        assert res.headers["Cache-Control"] == REVALIDATE
+    assert client.get("/static/js/gone.js").status_code == 404
+    assert client.get("/static/js/gone.000000000000.js").status_code == 404
+
+
+def test_etag_gives_304(client):
+    first = client.get("/static/js/app.js")
+    etag = first.headers["ETag"].strip('"')
+    assert etag == _digest(JS.encode())
+    again = client.get("/static/js/app.js", headers={"If-None-Match": f'"{etag}"'})
+    assert again.status_code == 304 and again.data == b""
+
+
+def test_encoding_follows_accept_encoding(client):
+    res = client.get("/static/css/site.css", headers={"Accept-Encoding": "gzip, deflate"})
+    assert res.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in res.headers["Vary"]
+    assert res.headers["ETag"].strip('"').endswith("-gzip")
+    assert gzip.decompress(res.data) == CSS.encode()
+
+    plain = client.get("/static/css/site.css", headers={"Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in plain.headers and plain.data == CSS.encode()
+
+    small = client.get("/static/js/app.js", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in small.headers and "Vary" not in small.headers
+
+
+def test_brotli_is_preferred_when_available(client):
+    if assets.brotli is None:
+        pytest.skip("brotli not installed")
+    res = client.get("/static/css/site.css", headers={"Accept-Encoding": "gzip, br"})
+    assert res.headers["Content-Encoding"] == "br"
+    assert assets.brotli.decompress(res.data) == CSS.encode()
+
+
+def test_html_links_fingerprinted_static_files(client, store):
+    html = client.get("/page/page.html").data.decode()
+    assert f'href="{store.url("css/site.css")}"' in html        # relative ref
+    assert f'src="{store.url("js/app.js")}"' in html            # absolute ref
+    assert 'src="/static/missing.png"' in html                  # unknown: left alone
+
+
+def test_editing_a_file_rebuilds_it_and_the_pages_linking_it(client, store, tree):
+    css = tree / "static" / "css" / "site.css"
+    old_url = store.url("css/site.css")
+    old_page = store.entry("template", "page.html").hash
+    css.write_text(CSS + "p { margin: 0; }\n")
+
+    new_url = store.url("css/site.css")
+    assert new_url != old_url
+    assert store.entry("template", "page.html").hash != old_page
+    assert new_url in client.get("/page/page.html").data.decode()
+
+
+def test_replaced_variants_are_deleted(store, tree):
+    css = tree / "static" / "css" / "site.css"
+    old = store.entry("static", "css/site.css")
+    old_page = store.entry("template", "page.html")
+    built = [f for e in (old, old_page) for f in e.files.values() if str(tree / "out") in f]
+    assert built and all(os.path.exists(f) for f in built)
+
+    css.write_text(CSS + "p { margin: 0; }\n")
+    new_page = store.entry("template", "page.html")
+    new = store.entry("static", "css/site.css")
+
+    assert not any(os.path.exists(f) for f in built)
+    assert all(os.path.exists(f) for e in (new, new_page) for f in e.files.values())
+    assert css.exists() and (tree / "template" / "page.html").exists()   # sources stay
+
+
+def test_build_covers_every_file(store, tree):
+    assert store.build() == 3
+    assert (tree / "out" / "static" / "css").is_dir()
@@ -0,0 +1,93 @@
+"""
+LRUCache expiry and eviction, and seconds_until_midnight.
+
+    python -m pytest tests/test_cache.py
+"""
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cache  # noqa: E402
+from cache import LRUCache, seconds_until_midnight  # noqa: E402
+
+
+class _Clock:
+    """Stands in for the time module inside cache."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = _Clock()
+    monkeypatch.setattr(cache, "time", c)
+    return c
+
+
+def test_entry_expires_after_its_ttl(clock):
+    c = LRUCache(maxsize=10)
+    c.set("k", "v", ttl=5)
+    clock.now += 4.9
+    assert c.get("k") == "v"
+    clock.now += 0.2
+    assert c.get("k") is None
+    assert len(c) == 0          # an expired entry is dropped when it is seen
+    assert c.stats()["hits"] == 1 and c.stats()["misses"] == 1
+
+
+def test_default_ttl_and_per_entry_override(clock):
+    c = LRUCache(maxsize=10, ttl=10)
+    c.set("default", 1)
+    c.set("short", 2, ttl=1)
+    clock.now += 5
+    assert c.get("default") == 1 and c.get("short") is None
+    clock.now += 6
+    assert c.get("default") is None
+
+
+def test_no_ttl_lives_until_evicted(clock):
+    c = LRUCache(maxsize=10)
+    c.set("k", "v")
+    clock.now += 10 ** 9
+    assert c.get("k") == "v"
+
+
+def test_least_recently_used_is_evicted(clock):
+    c = LRUCache(maxsize=2)
+    c.set("a", 1)
+    c.set("b", 2)
+    assert c.get("a") == 1      # "a" is now the most recent
+    c.set("c", 3)
+    assert c.get("b") is None
+    assert (c.get("a"), c.get("c")) == (1, 3)
+
+
+def test_setting_again_refreshes_value_and_expiry(clock):
+    c = LRUCache(maxsize=10)
+    c.set("k", "old", ttl=5)
+    clock.now += 4
+    c.set("k", "new", ttl=5)
+    clock.now += 4
+    assert c.get("k") == "new"
+
+
+def test_falsy_values_and_defaults(clock):
+    c = LRUCache(maxsize=10)
+    c.set("zero", 0)
+    assert c.get("zero", "missing") == 0
+    assert c.get("nope", "missing") == "missing"
+    assert c.pop("zero") == 0 and c.pop("zero", "gone") == "gone"
+
+
+def test_seconds_until_midnight():
+    assert seconds_until_midnight(datetime(2024, 5, 14, 23, 59, 0)) == 60.0
+    assert seconds_until_midnight(datetime(2024, 5, 14, 0, 0, 0)) == 24 * 3600.0
+    assert seconds_until_midnight(datetime(2024, 5, 14, 23, 59, 59, 999999)) == 1.0
@@ -0,0 +1,223 @@
+"""
+ChatWriter batching, retry, bisecting of refused rows, pending rows and
+read_with_pending, plus history_page, against a fake database.
+
+    python -m pytest tests/test_chat_store.py
+"""
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pymysql = pytest.importorskip("pymysql")
+
+import chat_store  # noqa: E402
+from chat_store import ChatWriter, history_page  # noqa: E402
+
+
+class _Db:
+    """connect() for ChatWriter: keeps what was inserted in `table`."""
+
+    def __init__(self):
+        self.table = []
+        self.batches = []         # every executemany attempt, written or not
+        self.down = False
+        self.gate = None          # threading.Event an INSERT waits on, if set
+        self.entered = threading.Event()
+
+    def __call__(self):
+        return self
+
+    def __enter__(self):
+        if self.down:
+            raise pymysql.err.OperationalError(2003, "can't connect")
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def cursor(self):
+        return self
+
+    def executemany(self, sql, rows):
+        assert sql == chat_store._INSERT
+        self.batches.append(list(rows))
+        self.entered.set()
+        if self.gate is not None:
+            self.gate.wait(5)
+        if any(r[2] == "bad" for r in rows):
+            raise pymysql.err.DataError(1406, "Data too long for column 'content'")
+        self.table += rows
+
+
+@pytest.fixture
+def fake_db():
+    return _Db()
+
+
+@pytest.fixture
+def writer(fake_db):
+    # flush_every is long enough that only the test (or a full batch) flushes
+    w = ChatWriter(fake_db, max_batch=1000, flush_every=3600)
+    yield w
+    fake_db.gate = None
+    w.close()
+
+
+def _contents(rows):
+    return [r[2] for r in rows]
+
+
+def test_flush_writes_everything_queued_in_one_batch(writer, fake_db):
+    for n in range(5):
+        writer.add(1, "user", f"m{n}")
+    assert writer.flush() == 5
+    assert len(fake_db.batches) == 1 and _contents(fake_db.table) == [f"m{n}" for n in range(5)]
+    s = writer.stats()
+    assert (s["queued"], s["written"], s["batches"], s["pending"]) == (5, 5, 1, 0)
+    assert writer.flush() == 0
+
+
+def test_batches_are_capped_at_max_batch(fake_db):
+    w = ChatWriter(fake_db, max_batch=3, flush_every=3600)
+    try:
+        for n in range(7):
+            w.add(1, "user", f"m{n}")
+        w.flush()
+    finally:
+        w.close()
+    assert _contents(fake_db.table) == [f"m{n}" for n in range(7)]
+    assert max(len(b) for b in fake_db.batches) == 3
+
+
+def test_unreachable_database_keeps_rows_queued(writer, fake_db):
+    writer.add(1, "user", "a")
+    writer.add(1, "assistant", "b")
+    fake_db.down = True
+    assert writer.flush() == 0
+    assert writer.stats()["errors"] == 1
+    assert [r["content"] for r in writer.pending(1)] == ["a", "b"]
+    fake_db.down = False
+    assert writer.flush() == 2 and _contents(fake_db.table) == ["a", "b"]
+
+
+def test_refused_row_is_bisected_out_and_dead_lettered(writer, fake_db):
+    contents = ["m0", "m1", "m2", "bad", "m4", "m5", "m6", "m7"]
+    for c in contents:
+        writer.add(1, "user", c)
+    assert writer.flush() == 7
+    assert _contents(fake_db.table) == [c for c in contents if c != "bad"]
+    (row, error), = writer.dead_letters
+    assert row[2] == "bad" and "DataError" in error
+    s = writer.stats()
+    assert (s["dead_lettered"], s["pending"]) == (1, 0)
+    # halves are tried in order; the ones without the bad row go through whole
+    assert [len(b) for b in fake_db.batches] == [8, 4, 2, 2, 1, 1, 4]
+
+
+def test_oldest_rows_are_dropped_past_max_pending(fake_db):
+    w = ChatWriter(fake_db, max_batch=1000, flush_every=3600, max_pending=3)
+    try:
+        for n in range(5):
+            w.add(1, "user", f"m{n}")
+        assert [r["content"] for r in w.pending(1)] == ["m2", "m3", "m4"]
+        assert w.stats()["dropped"] == 2
+    finally:
+        w.close()
+
+
+def test_pending_is_per_session_and_includes_the_batch_in_flight(writer, fake_db):
+    writer.add(1, "user", "one")
+    writer.add(2, "user", "two")
+    fake_db.gate = threading.Event()
+    flusher = threading.Thread(target=writer.flush)
+    flusher.start()
+    assert fake_db.entered.wait(5)
+    writer.add(1, "assistant", "three")
+    rows = writer.pending(1)
+    assert [r["content"] for r in rows] == ["one", "three"]
+    assert all(r["id"] is None and r["session_id"] == 1 for r in rows)
+    fake_db.gate.set()
+    flusher.join(5)
+    # flush() keeps going until the queue is empty, rows added meanwhile included
+    assert writer.pending(1) == [] and _contents(fake_db.table) == ["one", "two", "three"]
+
+
+def test_read_with_pending_retries_across_a_flush(writer, fake_db):
+    """A batch INSERTed while the table is read shows up exactly once."""
+    writer.add(1, "user", "q")
+    writer.add(1, "assistant", "a")
+    fake_db.gate = threading.Event()
+    flusher = threading.Thread(target=writer.flush)
+    flusher.start()
+    assert fake_db.entered.wait(5)
+    reads = []
+
+    def read():
+        snapshot = _contents(fake_db.table)
+        reads.append(snapshot)
+        if len(reads) == 1:
+            # the INSERT commits right after this read saw the table without it
+            fake_db.gate.set()
+            flusher.join(5)
+        return snapshot
+
+    table, pending = writer.read_with_pending(1, read, wait=0.01)
+    assert reads[0] == [] and len(reads) == 2
+    assert table == ["q", "a"] and pending == []
+
+
+def test_read_with_pending_returns_rows_still_queued(writer, fake_db):
+    writer.add(1, "user", "queued")
+    writer.add(2, "user", "other session")
+    table, pending = writer.read_with_pending(1, lambda: "rows")
+    assert table == "rows" and [r["content"] for r in pending] == ["queued"]
+
+
+def test_close_flushes_what_is_left(fake_db):
+    w = ChatWriter(fake_db, max_batch=1000, flush_every=3600)
+    w.add(1, "user", "last words")
+    w.close()
+    assert _contents(fake_db.table) == ["last words"]
+
+
+def test_writer_thread_flushes_a_full_batch(fake_db):
+    w = ChatWriter(fake_db, max_batch=2, flush_every=3600)
+    try:
+        w.add(1, "user", "a")
+        w.add(1, "user", "b")
+        deadline = time.monotonic() + 5
+        while len(fake_db.table) < 2 and time.monotonic() < deadline:
+            time.sleep(0.005)
+        assert _contents(fake_db.table) == ["a", "b"]
+    finally:
+        w.close()
+
+
+class _Cursor:
+    def __init__(self, rows):
+        self.rows = rows
+        self.sent = []
+
+    def execute(self, sql, args):
+        self.sent.append((sql, args))
+
+    def fetchall(self):
+        return list(self.rows)
+
+
+def test_history_page_is_chronological_with_has_more():
+    newest_first = [{"id": i} for i in (9, 8, 7)]
+    cur = _Cursor(newest_first)
+    rows, has_more = history_page(cur, 5, limit=2)
+    assert [r["id"] for r in rows] == [8, 9] and has_more
+    assert cur.sent == [(chat_store._HISTORY, (5, 3))]
+
+    cur = _Cursor(newest_first[:2])
+    rows, has_more = history_page(cur, 5, before_id=10, limit=2)
+    assert [r["id"] for r in rows] == [8, 9] and not has_more
+    assert cur.sent == [(chat_store._HISTORY_BEFORE, (5, 10, 3))]
@@ -0,0 +1,212 @@
+"""
+ConnectionPool checkout, health checks and the idle reaper, against fake
+connections (no database needed).
+
+    python -m pytest tests/test_db_pool.py
+"""
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_pool  # noqa: E402
+from db_pool import ConnectionPool, PoolTimeout  # noqa: E402
+
+
+class _Con:
+    def __init__(self, n):
+        self.n = n
+        self.alive = True
+        self.closed = False
+        self.rollbacks = 0
+        self.rollback_fails = False
+
+    def ping(self, reconnect=False):
+        if not self.alive:
+            raise ConnectionError("gone away")
+
+    def rollback(self):
+        self.rollbacks += 1
+        if self.rollback_fails:
+            raise ConnectionError("gone away")
+
+    def close(self):
+        self.closed = True
+
+
+class _Clock:
+    """Stands in for the time module inside db_pool."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def perf_counter(self):
+        return self.now
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+
+@pytest.fixture
+def opened():
+    return []
+
+
+@pytest.fixture
+def make_pool(opened):
+    pools = []
+
+    def make(**kwargs):
+        def connect():
+            con = _Con(len(opened))
+            opened.append(con)
+            return con
+        # a long idle_timeout keeps the background reaper asleep; tests call reap()
+        kwargs.setdefault("idle_timeout", 300.0)
+        pool = ConnectionPool(connect, **kwargs)
+        pools.append(pool)
+        return pool
+
+    yield make
+    for pool in pools:
+        pool.close()
+
+
+def test_connection_is_reused(make_pool, opened):
+    pool = make_pool(max_size=2)
+    with pool.connection() as a:
+        pass
+    with pool.connection() as b:
+        pass
+    assert a is b and len(opened) == 1
+    s = pool.stats()
+    assert (s["created"], s["checkouts"], s["size"], s["idle"], s["in_use"]) == (1, 2, 1, 1, 0)
+
+
+def test_bad_sizes_are_rejected():
+    with pytest.raises(ValueError):
+        ConnectionPool(lambda: None, min_size=3, max_size=2)
+    with pytest.raises(ValueError):
+        ConnectionPool(lambda: None, max_size=0)
+
+
+def test_checkout_times_out_at_max_size(make_pool):
+    pool = make_pool(max_size=1, timeout=0.05)
+    con = pool.acquire()
+    with pytest.raises(PoolTimeout):
+        pool.acquire()
+    s = pool.stats()
+    assert (s["timeouts"], s["waits"], s["size"]) == (1, 1, 1)
+    pool.release(con)
+    assert pool.acquire() is con
+
+
+def test_waiter_gets_the_released_connection(make_pool, opened):
+    pool = make_pool(max_size=1, timeout=5)
+    con = pool.acquire()
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.acquire()))
+    waiter.start()
+    deadline = time.monotonic() + 5
+    while not pool.stats()["waits"] and time.monotonic() < deadline:
+        time.sleep(0.005)
+    pool.release(con)
+    waiter.join(5)
+    assert got == [con] and len(opened) == 1
+
+
+def test_failed_connect_frees_the_slot(make_pool):
+    calls = []
+
+    def connect():
+        calls.append(1)
+        if len(calls) == 1:
+            raise ConnectionError("refused")
+        return _Con(len(calls))
+
+    pool = make_pool(max_size=1, timeout=0.05)
+    pool._connect = connect
+    with pytest.raises(ConnectionError):
+        pool.acquire()
+    assert pool.stats()["size"] == 0
+    assert pool.acquire().n == 2
+
+
+def test_block_that_raised_is_rolled_back(make_pool):
+    pool = make_pool()
+    with pytest.raises(RuntimeError):
+        with pool.connection() as con:
+            raise RuntimeError("mid-statement")
+    assert con.rollbacks == 1 and not con.closed
+    assert pool.stats()["idle"] == 1
+
+
+def test_connection_that_cannot_roll_back_is_discarded(make_pool, opened):
+    pool = make_pool()
+    with pytest.raises(RuntimeError):
+        with pool.connection() as con:
+            con.rollback_fails = True
+            raise RuntimeError("mid-statement")
+    assert con.closed
+    s = pool.stats()
+    assert (s["size"], s["idle"], s["closed"]) == (0, 0, 1)
+    with pool.connection() as fresh:
+        assert fresh is not con
+
+
+def test_dead_idle_connection_is_replaced_on_checkout(make_pool, opened, monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(db_pool, "time", clock)
+    pool = make_pool(ping_after=2.0)
+    with pool.connection() as con:
+        pass
+    con.alive = False
+
+    clock.now += 1.0            # recently used: handed out without a ping
+    with pool.connection() as same:
+        assert same is con
+
+    clock.now += 5.0            # idle long enough to be pinged, and it is dead
+    with pool.connection() as fresh:
+        assert fresh is not con
+    assert con.closed
+    s = pool.stats()
+    assert (s["failed_health_checks"], s["created"], s["size"]) == (1, 2, 1)
+
+
+def test_reaper_closes_idle_connections_above_min_size(make_pool, monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(db_pool, "time", clock)
+    pool = make_pool(min_size=1, max_size=3)
+    cons = [pool.acquire() for _ in range(3)]
+    for con in cons:
+        pool.release(con)
+        clock.now += 10
+
+    assert pool.reap() == 0     # nothing idle long enough yet
+    clock.now += 285            # idle 315s, 305s and 295s: the two oldest go
+    assert pool.reap() == 2
+    assert [c.closed for c in cons] == [True, True, False]
+
+    clock.now += 1000           # min_size stays open however long it idles
+    assert pool.reap() == 0
+    assert pool.stats()["size"] == 1
+
+
+def test_close_closes_idle_and_returned_connections(make_pool):
+    pool = make_pool(max_size=2)
+    idle, busy = pool.acquire(), pool.acquire()
+    pool.release(idle)
+    pool.close()
+    assert idle.closed and not busy.closed
+    pool.release(busy)
+    assert busy.closed and pool.stats()["size"] == 0
+    with pytest.raises(RuntimeError):
+        pool.acquire()
@@ -0,0 +1,160 @@
+"""
+WeeklyBoard ranking and in-memory updates, streak_view, and the streak
+replay used by the backfills, with fake loaders / cursors.
+
+    python -m pytest tests/test_leaderboard.py
+"""
+import os
+import sys
+from datetime import date
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import leaderboard  # noqa: E402
+from leaderboard import WeeklyBoard, _replay_streaks, streak_view, week_bounds  # noqa: E402
+
+TUESDAY, NEXT_MONDAY = "2024-05-14", "2024-05-20"
+WEEK = {1: (30, "ada"), 2: (50, "bo"), 3: (30, "cy"), 4: (10, None), 5: (0, "ed")}
+
+
+class _Loader:
+    def __init__(self, weeks):
+        self.weeks = weeks        # monday -> {user_id: (leaves, username)}
+        self.calls = []
+        self.during = None        # called while a load runs, like a concurrent payout
+
+    def __call__(self, monday, sunday):
+        self.calls.append((monday, sunday))
+        if self.during:
+            self.during()
+        return dict(self.weeks.get(monday, {}))
+
+
+@pytest.fixture
+def loader():
+    return _Loader({"2024-05-13": WEEK})
+
+
+@pytest.fixture
+def board(loader):
+    return WeeklyBoard(loader, reload_every=0)
+
+
+def _ranks(rows):
+    return [(r["rank"], r["user_id"], r["leaves"]) for r in rows]
+
+
+def test_week_bounds():
+    assert week_bounds(TUESDAY) == ("2024-05-13", "2024-05-19")
+    assert week_bounds("2024-05-19") == ("2024-05-13", "2024-05-19")
+    assert week_bounds(date(2024, 5, 20)) == ("2024-05-20", "2024-05-26")
+
+
+def test_top_uses_competition_ranking(board, loader):
+    assert _ranks(board.top(TUESDAY, 10)) == [(1, 2, 50), (2, 1, 30), (2, 3, 30), (4, 4, 10)]
+    assert [r["username"] for r in board.top(TUESDAY, 2)] == ["bo", "ada"]
+    assert loader.calls == [("2024-05-13", "2024-05-19")]     # loaded once
+
+
+def test_rank_of_a_user(board):
+    assert board.rank(TUESDAY, 2) == {"rank": 1, "leaves": 50}
+    assert board.rank(TUESDAY, 3) == {"rank": 2, "leaves": 30}
+    assert board.rank(TUESDAY, 4) == {"rank": 4, "leaves": 10}
+    assert board.rank(TUESDAY, 5) is None       # nothing earned this week
+    assert board.rank(TUESDAY, 99) is None
+
+
+def test_add_moves_users_up_and_down(board):
+    board.top(TUESDAY)
+    board.add(4, TUESDAY, +35)
+    assert board.rank(TUESDAY, 4) == {"rank": 2, "leaves": 45}
+    board.add(2, TUESDAY, -50)                  # undone back to nothing: off the board
+    assert board.rank(TUESDAY, 2) is None
+    board.add(6, TUESDAY, 5)                    # first task of the week
+    board.add(1, TUESDAY, -100)                 # never below zero
+    assert _ranks(board.top(TUESDAY)) == [(1, 4, 45), (2, 3, 30), (3, 6, 5)]
+
+
+def test_add_for_another_week_waits_for_its_load(board, loader):
+    board.top(TUESDAY)
+    board.add(1, NEXT_MONDAY, 999)
+    assert board.rank(TUESDAY, 1) == {"rank": 2, "leaves": 30}
+    loader.weeks["2024-05-20"] = {1: (3, "ada")}
+    assert _ranks(board.top(NEXT_MONDAY)) == [(1, 1, 3)]
+    assert board.stats()["week"] == "2024-05-20"
+
+
+def test_payout_during_a_reload_is_replayed(board, loader):
+    board.top(TUESDAY)
+    loader.weeks["2024-05-13"] = {1: (30, "ada")}
+    loader.during = lambda: board.add(1, TUESDAY, 7)
+    board.reload_every = 1e-9                   # make the next read reload
+    assert board.rank(TUESDAY, 1) == {"rank": 1, "leaves": 37}
+    assert board.stats()["loads"] == 2
+
+
+def test_failed_load_is_retried(board, loader):
+    def broken():
+        raise ConnectionError("database down")
+
+    loader.during = broken
+    with pytest.raises(ConnectionError):
+        board.top(TUESDAY)
+    loader.during = None
+    assert len(board.top(TUESDAY)) == 4
+
+
+def test_names(board):
+    board.top(TUESDAY)
+    assert board.missing_names([1, 4, 6]) == [4, 6]
+    board.set_names({4: "di", 6: "fay"})
+    assert board.missing_names([1, 4, 6]) == []
+    assert [r["username"] for r in board.top(TUESDAY)][-1] == "di"
+
+
+def test_streak_view():
+    row = {"current_streak": 4, "longest_streak": 9, "last_active_date": date(2024, 5, 13)}
+    assert streak_view(row, "2024-05-13") == {
+        "current": 4, "longest": 9, "last_active": "2024-05-13", "active_today": True}
+    assert streak_view(row, "2024-05-14")["current"] == 4          # alive until midnight
+    assert streak_view(row, "2024-05-15") == {
+        "current": 0, "longest": 9, "last_active": "2024-05-13", "active_today": False}
+    assert streak_view(None, "2024-05-15") == {
+        "current": 0, "longest": 0, "last_active": None, "active_today": False}
+
+
+class _Cursor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def execute(self, sql, args=None):
+        assert "FROM user_daily_stats" in sql
+
+    def fetchall(self):
+        return [{"user_id": u, "stat_date": d} for u, d in self.rows]
+
+
+def test_replay_streaks_keeps_the_record_it_beat():
+    days = ["2024-05-01", "2024-05-02",                     # 2
+            "2024-05-05",                                   # broken, 1
+            "2024-05-07", "2024-05-08", "2024-05-09"]       # 3: beats the 2
+    streaks = _replay_streaks(_Cursor([(7, d) for d in days] + [(8, "2024-05-09")]))
+    s = streaks[7]
+    assert (s["current"], s["last"]) == (3, date(2024, 5, 9))
+    assert (s["longest"], s["longest_date"]) == (3, date(2024, 5, 9))
+    assert (s["prev"], s["prev_date"]) == (2, date(2024, 5, 2))     # when the 2 was set
+    assert (streaks[8]["longest"], streaks[8]["prev"], streaks[8]["prev_date"]) == (1, 0, None)
+
+
+def test_backfill_previous_writes_the_replayed_records():
+    class _Recorder(_Cursor):
+        def executemany(self, sql, rows):
+            self.sent = (sql, rows)
+
+    cur = _Recorder([(7, "2024-05-01"), (7, "2024-05-02"), (8, "2024-05-03")])
+    assert leaderboard.backfill_previous(cur) == 2
+    sql, rows = cur.sent
+    assert "prev_longest=%s" in sql
+    assert sorted(rows, key=lambda r: r[2]) == [(1, "2024-05-01", 7), (0, None, 8)]
@@ -0,0 +1,87 @@
+"""
+Hasher round trips, re-hash detection, and refusing work when every slot
+is busy (Saturated -> 429 from /signup).
+
+    python -m pytest tests/test_passwords.py
+"""
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("werkzeug")
+
+from passwords import Hasher, Saturated  # noqa: E402
+
+FAST = "pbkdf2:sha256:1000"     # the real cost isn't what is being tested
+
+
+def _occupy(hasher, n):
+    """Fill n of the hasher's slots with calls that wait; -> the Event that ends them."""
+    release = threading.Event()
+    threads = [threading.Thread(target=hasher._run, args=("hashed", release.wait, 5))
+               for _ in range(n)]
+    for t in threads:
+        t.start()
+    deadline = time.monotonic() + 5
+    while hasher.stats()["in_flight"] < n:
+        assert time.monotonic() < deadline, "slots not taken"
+        time.sleep(0.005)
+    return release, threads
+
+
+def test_hash_and_verify():
+    h = Hasher(workers=1, max_queue=1, method=FAST)
+    pw_hash = h.hash("Sunfl0wer!")
+    assert pw_hash.startswith(FAST + "$")
+    assert h.verify(pw_hash, "Sunfl0wer!") and not h.verify(pw_hash, "sunfl0wer!")
+    assert not h.verify(None, "Sunfl0wer!") and not h.verify("", "")
+    s = h.stats()
+    assert (s["hashed"], s["verified"], s["rejected"], s["in_flight"]) == (1, 2, 0, 0)
+
+
+def test_needs_rehash_on_other_parameters():
+    h = Hasher(workers=1, max_queue=0, method=FAST)
+    assert not h.needs_rehash(h.hash("x"))
+    assert h.needs_rehash(Hasher(workers=1, max_queue=0, method="pbkdf2:sha256:999").hash("x"))
+    assert h.needs_rehash(Hasher(workers=1, max_queue=0, method=FAST, salt_length=8).hash("x"))
+    assert h.needs_rehash("scrypt:32768:8:1$salt$abc")
+    assert h.needs_rehash(None)
+
+
+def test_saturated_when_workers_and_queue_are_full():
+    h = Hasher(workers=1, max_queue=1, queue_timeout=0.05, method=FAST)
+    release, threads = _occupy(h, 2)      # one running, one queued
+    try:
+        with pytest.raises(Saturated):
+            h.hash("x")
+        with pytest.raises(Saturated):
+            h.verify("pbkdf2:sha256:1000$salt$abc", "x")
+        assert h.stats()["rejected"] == 2
+    finally:
+        release.set()
+        for t in threads:
+            t.join(5)
+    assert h.verify(h.hash("x"), "x")     # slots are free again
+
+
+def test_signup_answers_429_when_saturated(monkeypatch):
+    pytest.importorskip("pymysql")
+    import app
+
+    h = Hasher(workers=1, max_queue=0, queue_timeout=0.01, method=FAST)
+    monkeypatch.setattr(app, "HASHER", h)
+    release, threads = _occupy(h, 1)
+    try:
+        res = app.app.test_client().post("/signup", data={
+            "username": "fern", "email": "fern@example.com",
+            "password": "Sunfl0wer!", "password2": "Sunfl0wer!"})
+    finally:
+        release.set()
+        for t in threads:
+            t.join(5)
+    assert res.status_code == 429 and res.headers["Retry-After"] == "1"
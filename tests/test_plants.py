@@ -0,0 +1,101 @@
+"""
+Plant search indexes and the moon-phase recommendation buckets built by
+plants.build_index, on a small inline catalog and on the shipped one.
+
+    python -m pytest tests/test_plants.py
+"""
+import json
+import os
+import sys
+from datetime import date, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import plants  # noqa: E402
+from lunar import PHASE_NAMES  # noqa: E402
+
+NEW, FULL, WANING_GIBBOUS = 0, 4, 5
+SHIPPED = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                       "static", "data", "indoor_plants.json")
+
+DOC = [
+    {"id": "p1", "plant": "Basil", "category": "Herb", "indoor": True, "edible": True,
+     "moon_phase": {"growing": "New Moon, Waxing Crescent Moon", "harvesting": "Full Moon"}},
+    {"id": "p2", "plant": "Snake Plant", "category": "Indoor", "indoor": True, "edible": False,
+     "moon_phase": {"growing": "New Moon", "resting": "Waning Crescent Moon"}},
+    {"id": "p3", "plant": "Tomato", "category": "Vegetable", "indoor": False, "edible": True,
+     "moon_phase": {"harvesting": "Full Moon, Waning Gibbous Moon", "resting": "Last Quarter"}},
+    {"id": "p4", "plant": "Fern", "category": "Indoor", "indoor": True, "edible": False},
+]
+
+
+@pytest.fixture(scope="module")
+def view():
+    return plants.build_index(DOC)
+
+
+def test_buckets_per_phase(view):
+    assert view["reco"][NEW]["all"] == {
+        "grow": ["Basil", "Snake Plant"], "harvest": [], "rest": [], "neutral": ["Tomato", "Fern"]}
+    assert view["reco"][FULL]["all"] == {
+        "grow": [], "harvest": ["Basil", "Tomato"], "rest": [], "neutral": ["Snake Plant", "Fern"]}
+    assert view["reco"][WANING_GIBBOUS]["all"]["harvest"] == ["Tomato"]
+
+
+def test_buckets_per_filter(view):
+    full = view["reco"][FULL]
+    assert full["edible"]["harvest"] == ["Basil", "Tomato"]
+    assert full["ornamental"] == {"grow": [], "harvest": [], "rest": [], "neutral": ["Snake Plant", "Fern"]}
+
+
+def test_every_plant_is_in_some_bucket(view):
+    names = [p["plant"] for p in DOC]
+    for code in range(len(PHASE_NAMES)):
+        b = view["reco"][code]["all"]
+        placed = set(b["grow"]) | set(b["harvest"]) | set(b["rest"])
+        assert set(b["neutral"]) == set(names) - placed, PHASE_NAMES[code]
+
+
+def test_search_intersects_filters(view):
+    def names(**kw):
+        return [DOC[i]["plant"] for i in plants.search(view, **kw)]
+
+    assert names() == ["Basil", "Snake Plant", "Tomato", "Fern"]
+    assert names(category="indoor") == ["Snake Plant", "Fern"]
+    assert names(indoor=True, edible=False) == ["Snake Plant", "Fern"]
+    assert names(growing=NEW, edible=True) == ["Basil"]
+    assert names(q="snake pl") == ["Snake Plant"]      # last word matches as a prefix
+    assert names(q="tom", category="herb") == []
+
+
+def test_shipped_catalog_has_harvest_advice():
+    with open(SHIPPED, encoding="utf-8") as f:
+        doc = json.load(f)
+    reco = plants.build_index(doc)["reco"]
+    assert reco[FULL]["all"]["harvest"]
+    assert reco[FULL]["edible"]["harvest"]
+
+
+def test_recommendations_endpoint_returns_harvest(monkeypatch):
+    pytest.importorskip("pymysql")
+    import app
+
+    class _Offline:
+        """MOON_CACHE without the upstream API: always the local phase."""
+        def get(self, key, fallback):
+            return fallback(key)
+
+    monkeypatch.setattr(app, "MOON_CACHE", _Offline())
+    client = app.app.test_client()
+    start = date(2026, 10, 1)
+    for d in (start + timedelta(days=n) for n in range(31)):
+        body = client.get(f"/api/recommendations?date={d.isoformat()}&type=edible").get_json()
+        if body["phase"] == "Full Moon":
+            break
+    else:
+        pytest.fail("no full moon in a month")
+    reco = app.PLANTS.get()["reco"][FULL]["edible"]
+    assert body["harvest"] == reco["harvest"] and body["harvest"]
+    assert body["grow"] == reco["grow"] and body["neutral"] == reco["neutral"]
@@ -0,0 +1,211 @@
+"""
+EXPLAIN the hot queries of app.py, wallet.py and chat_store.py against a
+scratch MySQL database built by migrate.py, and fail on any statement that
+reads a whole table or index (type ALL / index, or no key), or that sorts
+rows it should read in key order (filesort under ORDER BY).
+
+    python -m pytest tests/test_query_plans.py
+
+The SQL is imported from the modules, not copied, so a changed or new hot
+query is checked as it runs. Batches are split on ';' and each SELECT /
+UPDATE / DELETE / INSERT .. SELECT in them is explained on its own.
+
+Uses the server in app.DB; the scratch database (BLOOM_PLANS_DB, default
+bloom_garden_plans) is created, seeded with enough rows that MySQL has no
+reason to prefer a scan, and dropped afterwards. Skipped when the server
+is not reachable.
+"""
+import os
+import re
+import sys
+from datetime import date, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pymysql = pytest.importorskip("pymysql")
+
+import app  # noqa: E402
+import chat_store  # noqa: E402
+import migrate  # noqa: E402
+import wallet  # noqa: E402
+from leaderboard import backfill, week_bounds  # noqa: E402
+
+SCRATCH_DB = os.getenv("BLOOM_PLANS_DB", "bloom_garden_plans")
+USERS, DAYS, TASKS = 300, 60, ("water", "prune", "repot")
+SESSIONS, MESSAGES = 40, 50
+UID, SID = 7, 3
+
+TODAY = date.today()
+DAY = TODAY.isoformat()
+MONDAY, SUNDAY = week_bounds(DAY)
+
+# Values that make every condition on a user variable true, so that no
+# statement is planned away as "Impossible WHERE".
+_SESSION_VARS = """
+SET @new = 1, @awarded = 3, @removed = 1, @day_done = 0, @bump = 1, @raised = 0,
+    @cur = 1, @last = NULL, @longest = 0, @claimed = 0, @done = 3, @bonus = 1,
+    @granted = 1, @paid = 0
+"""
+
+_SKIP_RE = re.compile(r"^(START|COMMIT|ROLLBACK|SET)\b", re.I)
+_INTO_VARS_RE = re.compile(r"\bINTO\s+@\w+(\s*,\s*@\w+)*", re.I)
+_FOR_UPDATE_RE = re.compile(r"\bFOR\s+UPDATE\b", re.I)
+
+
+class _Recorder:
+    """Cursor stand-in that keeps what wallet.py would send."""
+    description = None
+
+    def __init__(self):
+        self.sent = []
+
+    def execute(self, sql, args=None):
+        self.sent.append((sql, args))
+
+    def fetchall(self):
+        return []
+
+    def nextset(self):
+        return False
+
+
+def _sent(fn, *args):
+    cur = _Recorder()
+    fn(cur, *args)
+    (sql, sql_args), = cur.sent
+    return sql, sql_args
+
+
+HOT_QUERIES = [
+    # app.py: sign-in
+    ("login by email", app._USER_BY_EMAIL, (f"user{UID}@example.com",)),
+    ("login by username", app._USER_BY_USERNAME, (f"user{UID}",)),
+    ("rehash", app._REHASH, ("x", UID, "y")),
+    # app.py: tasks, wallet, dashboard
+    ("username", app._USERNAME, (UID,)),
+    ("wallet", app._WALLET, (UID,)),
+    ("balances", app._BALANCES, (UID,)),
+    ("today's ticks", app._TODAY_DONE, (UID, DAY)),
+    ("no-repeat window", app._RECENT_TASKS, (UID, (TODAY - timedelta(days=3)).isoformat(), DAY)),
+    ("dashboard", app._DASHBOARD, (UID, UID, UID, DAY, UID, DAY, UID)),
+    # app.py: leaderboard + streaks
+    ("week scores", app._WEEK_SCORES, (MONDAY, SUNDAY)),
+    ("usernames", app._USERNAMES.format("%s,%s,%s"), (1, 2, UID)),
+    ("streak + my week", app._STREAK_WEEK, (UID, UID, MONDAY)),
+    # wallet.py
+    ("complete task", *_sent(wallet.complete_task, UID, "water", DAY, 3)),
+    ("undo task", *_sent(wallet.undo_task, UID, "water", DAY)),
+    ("claim bonus", *_sent(wallet.claim_bonus, UID, DAY, 3, 1)),
+    ("redeem (leaves)", *_sent(wallet.redeem_sticker, UID, "sunflower", "leaves", 25, DAY)),
+    ("redeem (plants)", *_sent(wallet.redeem_sticker, UID, "sunflower", "plants", 2, DAY)),
+    # chat_store.py
+    ("chat history", chat_store._HISTORY, (SID, 51)),
+    ("chat older page", chat_store._HISTORY_BEFORE, (SID, SID * MESSAGES, 51)),
+]
+
+
+def statements(sql, args):
+    """[(statement, its args)] of a batch, minus what has no plan."""
+    out, i = [], 0
+    for stmt in sql.split(";"):
+        stmt = stmt.strip()
+        n = stmt.count("%s")
+        stmt_args, i = tuple(args[i:i + n]), i + n
+        if not stmt or _SKIP_RE.match(stmt):
+            continue
+        if stmt.upper().startswith("INSERT") and not re.search(r"\bSELECT\b", stmt, re.I):
+            continue   # INSERT .. VALUES writes by key, reads nothing
+        stmt = _FOR_UPDATE_RE.sub("", _INTO_VARS_RE.sub("", stmt))
+        out.append((stmt, stmt_args))
+    assert i == len(args), "placeholders and args don't line up"
+    return out
+
+
+def problems(stmt, plan):
+    bad = []
+    for row in plan:
+        table = row.get("table")
+        if not table or table.startswith("<") or row.get("select_type") in ("INSERT", "REPLACE"):
+            continue   # no table read, a derived table, or the row being written
+        if row.get("type") == "ALL":
+            bad.append(f"full table scan of {table}")
+        elif row.get("type") == "index":
+            bad.append(f"full index scan of {table}")
+        elif not row.get("key"):
+            bad.append(f"{table} read without a key")
+        if re.search(r"\bORDER\s+BY\b", stmt, re.I) and "filesort" in (row.get("Extra") or ""):
+            bad.append(f"filesort on {table}")
+    return bad
+
+
+def _seed(cur):
+    days = [(TODAY - timedelta(days=d)).isoformat() for d in range(DAYS)]
+    users = range(1, USERS + 1)
+    cur.executemany("INSERT INTO users (ID, Username, Email, Password_hashed) VALUES (%s, %s, %s, 'x')",
+                    [(u, f"user{u}", f"user{u}@example.com") for u in users])
+    cur.executemany("INSERT INTO user_wallet (user_id, leaves, plants, beans_lifetime) "
+                    "VALUES (%s, 100, 10, 0)", [(u,) for u in users])
+    cur.executemany("INSERT INTO user_task_log (user_id, task_date, task_id, awarded_plants) "
+                    "VALUES (%s, %s, %s, 3)", [(u, d, t) for u in users for d in days for t in TASKS])
+    cur.executemany("INSERT INTO user_daily_bonus (user_id, bonus_date, awarded_plants) VALUES (%s, %s, 1)",
+                    [(u, d) for u in users for d in days[::2]])
+    cur.executemany("INSERT INTO user_stickers (user_id, sticker_id, acquired_at) VALUES (%s, %s, %s)",
+                    [(u, f"s{n:03d}", DAY) for u in users for n in range(5)])
+    cur.executemany("INSERT INTO chat_sessions (id, user_id) VALUES (%s, %s)",
+                    [(s, s % USERS + 1) for s in range(1, SESSIONS + 1)])
+    cur.executemany("INSERT INTO chat_messages (session_id, role, content) VALUES (%s, 'user', 'hi')",
+                    [(s,) for _ in range(MESSAGES) for s in range(1, SESSIONS + 1)])
+    backfill(cur)
+    for table in ("users", "user_wallet", "user_task_log", "user_daily_bonus", "user_stickers",
+                  "user_daily_stats", "user_streaks", "chat_sessions", "chat_messages"):
+        cur.execute(f"ANALYZE TABLE `{table}`")
+        cur.fetchall()
+
+
+@pytest.fixture(scope="module")
+def cur():
+    try:
+        con = pymysql.connect(**dict(app.DB_BATCH, database=None, connect_timeout=2))
+    except pymysql.err.OperationalError as e:
+        pytest.skip(f"no MySQL at {app.DB['host']}:{app.DB['port']}: {e}")
+    try:
+        with con.cursor() as c:
+            c.execute(f"DROP DATABASE IF EXISTS `{SCRATCH_DB}`")
+            c.execute(f"CREATE DATABASE `{SCRATCH_DB}` DEFAULT CHARSET utf8mb4")
+        con.select_db(SCRATCH_DB)
+        migrate.migrate(con)
+        with con.cursor() as c:
+            _seed(c)
+            c.execute(_SESSION_VARS)
+            yield c
+    finally:
+        with con.cursor() as c:
+            c.execute(f"DROP DATABASE IF EXISTS `{SCRATCH_DB}`")
+        con.close()
+
+
+@pytest.mark.parametrize("name,sql,args", HOT_QUERIES, ids=[q[0] for q in HOT_QUERIES])
+def test_hot_query_uses_an_index(cur, name, sql, args):
+    failures = []
+    for stmt, stmt_args in statements(sql, args):
+        cur.execute("EXPLAIN " + stmt, stmt_args)
+        plan = cur.fetchall()
+        bad = problems(stmt, plan)
+        if bad:
+            rows = "\n".join(f"      {r.get('table')} type={r.get('type')} key={r.get('key')} "
+                             f"rows={r.get('rows')} extra={r.get('Extra')}" for r in plan)
+            failures.append(f"{'; '.join(bad)}\n    {' '.join(stmt.split())}\n{rows}")
+    assert not failures, f"{name}:\n  " + "\n  ".join(failures)
+
+
+def test_batches_split_into_explainable_statements():
+    """No MySQL needed: every hot query yields statements, the args line up,
+    and nothing EXPLAIN rejects (INTO @var, FOR UPDATE) is left in them."""
+    explained = {name: [stmt for stmt, _ in statements(sql, args)] for name, sql, args in HOT_QUERIES}
+    assert all(explained.values())
+    for stmt in (s for stmts in explained.values() for s in stmts):
+        assert not _INTO_VARS_RE.search(stmt) and not _FOR_UPDATE_RE.search(stmt), stmt
+    assert any(s.startswith("SELECT 1 FROM user_daily_bonus") for s in explained["dashboard"])
+    assert any("FROM user_streaks WHERE user_id=%s" in s for s in explained["complete task"])
@@ -0,0 +1,183 @@
+"""
+CircuitBreaker state changes and SWRCache fresh / stale / degraded /
+fallback paths, with a fake upstream and clock (no network needed).
+
+    python -m pytest tests/test_upstream.py
+"""
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("requests")
+
+import cache  # noqa: E402
+import upstream  # noqa: E402
+from upstream import CircuitBreaker, SWRCache  # noqa: E402
+
+
+class _Clock:
+    """Stands in for the time module inside upstream and cache."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+
+class _Upstream:
+    """fetch() for SWRCache: returns "<key>@<call>" or raises while down."""
+
+    def __init__(self):
+        self.calls = 0
+        self.down = False
+        self.gate = None          # threading.Event the call waits on, if set
+        self.done = threading.Event()
+
+    def __call__(self, key):
+        self.calls += 1
+        try:
+            if self.gate is not None:
+                self.gate.wait(5)
+            if self.down:
+                raise ConnectionError("upstream down")
+            return f"{key}@{self.calls}"
+        finally:
+            self.done.set()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = _Clock()
+    monkeypatch.setattr(upstream, "time", c)
+    monkeypatch.setattr(cache, "time", c)
+    return c
+
+
+def _wait_for(cond, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not cond():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+# ---- CircuitBreaker -------------------------------------------------
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    b = CircuitBreaker(failures=3, reset_after=60)
+    b.failure()
+    b.failure()
+    b.success()                 # resets the count
+    b.failure()
+    b.failure()
+    assert b.state == "closed" and b.allow()
+    b.failure()
+    assert b.state == "open" and not b.allow()
+
+
+def test_half_open_lets_one_probe_through(clock):
+    b = CircuitBreaker(failures=1, reset_after=60)
+    b.failure()
+    clock.now += 59
+    assert not b.allow()
+    clock.now += 1
+    assert b.state == "half-open"
+    assert b.allow()
+    assert not b.allow()        # the probe is still out
+    b.success()
+    assert b.state == "closed" and b.allow()
+
+
+def test_failed_probe_reopens_for_another_period(clock):
+    b = CircuitBreaker(failures=1, reset_after=60)
+    b.failure()
+    clock.now += 60
+    assert b.allow()
+    b.failure()
+    assert b.state == "open" and not b.allow()
+    clock.now += 60
+    assert b.allow()
+
+
+# ---- SWRCache -------------------------------------------------------
+
+def test_fresh_hit_skips_upstream(clock):
+    up = _Upstream()
+    swr = SWRCache(up, ttl=10, stale_ttl=100)
+    assert swr.get("k", lambda k: "fallback") == "k@1"
+    clock.now += 9
+    assert swr.get("k", lambda k: "fallback") == "k@1"
+    assert up.calls == 1
+    assert swr.stats()["fresh"] == 1 and swr.stats()["miss"] == 1
+
+
+def test_stale_hit_is_served_and_refreshed_in_background(clock):
+    up = _Upstream()
+    swr = SWRCache(up, ttl=10, stale_ttl=100)
+    swr.get("k", lambda k: "fallback")
+    clock.now += 11
+    up.done.clear()
+    assert swr.get("k", lambda k: "fallback") == "k@1"
+    assert up.done.wait(5)
+    _wait_for(lambda: swr.stats()["inflight"] == 0)
+    assert swr.get("k", lambda k: "fallback") == "k@2"
+    assert swr.stats()["stale"] == 1
+
+
+def test_miss_without_a_known_value_uses_fallback(clock):
+    up = _Upstream()
+    up.down = True
+    swr = SWRCache(up, ttl=10, stale_ttl=100, breaker=CircuitBreaker(failures=2))
+    for _ in range(3):
+        assert swr.get("k", lambda k: f"local {k}") == "local k"
+    s = swr.stats()
+    # the third call never reached upstream: the breaker was open
+    assert (up.calls, s["upstream_error"], s["short_circuit"], s["fallback"]) == (2, 2, 1, 3)
+    assert s["breaker"] == "open"
+
+
+def test_expired_entry_degrades_to_last_known_value(clock):
+    up = _Upstream()
+    swr = SWRCache(up, ttl=10, stale_ttl=10)
+    swr.get("k", lambda k: "fallback")
+    clock.now += 25             # past ttl + stale_ttl: a miss again
+    up.down = True
+    assert swr.get("k", lambda k: "fallback") == "k@1"
+    assert swr.stats()["degraded"] == 1
+
+
+def test_slow_upstream_serves_last_known_value(clock):
+    up = _Upstream()
+    swr = SWRCache(up, ttl=10, stale_ttl=10, slow_after=0.05)
+    swr.get("k", lambda k: "fallback")
+    clock.now += 25
+    up.gate, up.done = threading.Event(), threading.Event()
+    assert swr.get("k", lambda k: "fallback") == "k@1"
+    up.gate.set()               # the fetch finishes in the background
+    assert up.done.wait(5)
+    _wait_for(lambda: swr.stats()["inflight"] == 0)
+    assert swr.get("k", lambda k: "fallback") == "k@2"
+
+
+def test_concurrent_misses_share_one_fetch(clock):
+    up = _Upstream()
+    up.gate = threading.Event()
+    swr = SWRCache(up, ttl=10, stale_ttl=10)
+    got = []
+    threads = [threading.Thread(target=lambda: got.append(swr.get("k", lambda k: "fallback")))
+               for _ in range(5)]
+    for t in threads:
+        t.start()
+    _wait_for(lambda: swr.stats()["coalesced"] == 4)
+    up.gate.set()
+    for t in threads:
+        t.join(5)
+    assert got == ["k@1"] * 5 and up.calls == 1
@@ -0,0 +1,193 @@
+"""
+Helpers for calling slow third-party APIs (ipgeolocation, OpenWeather)
+without letting them stall request threads.
+
+CircuitBreaker   stop calling an upstream after N consecutive failures,
+                 let one trial call through after `reset_after` seconds.
+SWRCache         TTL cache that serves stale values while a background
+                 worker refreshes them, and consults a breaker on misses.
+                 Concurrent misses for one key share a single upstream
+                 call; when upstream is down (or slower than `slow_after`)
+                 the last value ever fetched for the key is served instead.
+http_session()   requests.Session with a keep-alive connection pool, so
+                 repeat calls skip the TCP/TLS handshake.
+"""
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from cache import LRUCache
+
+# shared by every SWRCache; refreshes are short I/O-bound calls
+_REFRESHERS = ThreadPoolExecutor(max_workers=4, thread_name_prefix="swr-refresh")
+
+
+def http_session(pool_maxsize=16):
+    """Shared, thread-safe Session; pool_maxsize = idle connections kept per host."""
+    s = requests.Session()
+    adapter = HTTPAdapter(pool_connections=8, pool_maxsize=pool_maxsize)
+    s.mount("http://", adapter)
+    s.mount("https://", adapter)
+    return s
+
+
+class CircuitBreaker:
+    def __init__(self, failures=3, reset_after=60.0):
+        self.max_failures = failures
+        self.reset_after = reset_after
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.reset_after:
+                return "half-open"
+            return "open"
+
+    def allow(self):
+        """True if a call may go upstream now."""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_after or self._trial:
+                return False
+            self._trial = True       # half-open: exactly one probe at a time
+            return True
+
+    def success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial = False
+            if self._failures >= self.max_failures:
+                self._opened_at = time.monotonic()
+
+
+class SWRCache:
+    def __init__(self, fetch, ttl, stale_ttl, breaker=None, maxsize=256, slow_after=None):
+        """
+        fetch       key -> value; raises on upstream failure
+        ttl         seconds a value is served as fresh
+        stale_ttl   extra seconds it may be served while being refreshed
+        breaker     CircuitBreaker guarding `fetch` (one is made if omitted)
+        slow_after  on a miss with a last known value, wait at most this many
+                    seconds for upstream before serving that value (the
+                    fetch carries on in the background); None = wait it out
+        """
+        self._fetch = fetch
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.slow_after = slow_after
+        self.breaker = breaker or CircuitBreaker()
+        self._entries = LRUCache(maxsize=maxsize, ttl=ttl + stale_ttl)  # key -> (fetched_at, value)
+        self._last = LRUCache(maxsize=maxsize)                           # key -> value, never expires
+        self._inflight = {}                                              # key -> Future
+        self._lock = threading.Lock()
+        self.counts = {"fresh": 0, "stale": 0, "miss": 0, "coalesced": 0, "degraded": 0,
+                       "fallback": 0, "upstream_ok": 0, "upstream_error": 0, "short_circuit": 0}
+
+    def get(self, key, fallback):
+        """
+        Cached value for key, else a (shared) fetch, else the last known
+        value, else fallback(key).
+        """
+        hit = self._entries.get(key)
+        if hit is not None:
+            fetched_at, value = hit
+            if time.time() - fetched_at < self.ttl:
+                self._count("fresh")
+            else:
+                self._count("stale")
+                self._start_fetch(key, background=True)
+            return value
+
+        self._count("miss")
+        last = self._last.get(key)
+        # with nothing to fall back on the caller waits anyway: fetch inline
+        fut = self._start_fetch(key, background=last is not None)
+        try:
+            value = fut.result(timeout=self.slow_after if last is not None else None)
+        except FutureTimeout:
+            value = None
+        if value is not None:
+            return value
+        if last is not None:
+            self._count("degraded")
+            return last
+        self._count("fallback")
+        return fallback(key)
+
+    def put(self, key, value):
+        self._entries.set(key, (time.time(), value))
+        self._last.set(key, value)
+
+    def stats(self):
+        with self._lock:
+            out = dict(self.counts)
+            out["inflight"] = len(self._inflight)
+        out["entries"] = len(self._entries)
+        out["last_known"] = len(self._last)
+        out["breaker"] = self.breaker.state
+        return out
+
+    # ---- internals --------------------------------------------------
+
+    def _count(self, name):
+        with self._lock:
+            self.counts[name] += 1
+
+    def _fetch_now(self, key):
+        if not self.breaker.allow():
+            self._count("short_circuit")
+            return None
+        try:
+            value = self._fetch(key)
+        except Exception:
+            self.breaker.failure()
+            self._count("upstream_error")
+            return None
+        self.breaker.success()
+        self._count("upstream_ok")
+        self.put(key, value)
+        return value
+
+    def _start_fetch(self, key, background):
+        """
+        Future for the upstream call for key (value, or None on failure).
+        Joins the call already in flight if there is one, so a burst of
+        misses (or of stale hits) for one key costs a single request.
+        """
+        with self._lock:
+            fut = self._inflight.get(key)
+            if fut is not None:
+                self.counts["coalesced"] += 1
+                return fut
+            fut = self._inflight[key] = Future()
+
+        def run():
+            value = None
+            try:
+                value = self._fetch_now(key)
+            finally:
+                with self._lock:
+                    self._inflight.pop(key, None)
+                fut.set_result(value)
+
+        if background:
+            _REFRESHERS.submit(run)
+        else:
+            run()
+        return fut
@@ -0,0 +1,249 @@
+"""
+Wallet / ledger mutations for the tasks and sticker shop.
+
+Every function here performs one reward or purchase as a single short
+transaction sent in ONE round trip, on a cursor of a connection opened
+with CLIENT.MULTI_STATEMENTS (app.batch_db()). The "did anything change?"
+decision is taken inside MySQL from ROW_COUNT() of a conditional INSERT
+IGNORE / UPDATE, so there is no read-check-then-write window in Python:
+two concurrent clicks can never both be paid out, and a balance can never
+go below zero.
+
+The same transactions keep the per-day aggregates and streaks behind the
+leaderboard up to date (user_daily_stats, user_streaks; see leaderboard.py),
+so nothing ever has to GROUP BY the task log to show them.
+
+Relies on the unique keys created by migrations/ (python migrate.py):
+    user_task_log     (user_id, task_date, task_id)
+    user_daily_bonus  (user_id, bonus_date)
+    user_stickers     (user_id, sticker_id)
+    user_wallet       (user_id)
+    user_daily_stats  (user_id, stat_date)
+    user_streaks      (user_id)
+"""
+from datetime import date, timedelta
+
+# wallet columns a price may be charged against (never user input)
+CURRENCIES = ("leaves", "plants")
+
+# final statement of every batch: balances after the change, even when the
+# user has no wallet row yet
+_WALLET_AFTER = """
+SELECT {extra}
+       COALESCE(w.leaves, 0) AS leaves,
+       COALESCE(w.plants, 0) AS plants
+FROM (SELECT 1) AS one
+LEFT JOIN user_wallet w ON w.user_id = %s
+"""
+
+
+def _batch(cur, sql, args):
+    """Run a multi-statement batch; return the rows of the last SELECT.
+
+    All result sets must be drained, otherwise an error in a later
+    statement would go unnoticed and the connection would go back to the
+    pool with unread results.
+    """
+    cur.execute(sql, args)
+    rows = cur.fetchall() if cur.description else None
+    while cur.nextset():
+        if cur.description:
+            rows = cur.fetchall()
+    return rows or [{}]
+
+
+def _balances(row):
+    return {"leaves": int(row.get("leaves") or 0), "plants": int(row.get("plants") or 0)}
+
+
+def _yesterday(day):
+    return (date.fromisoformat(str(day)) - timedelta(days=1)).isoformat()
+
+
+# A day counts for the streak once it has at least one task. New values are
+# computed into variables first: MySQL applies SET / ON DUPLICATE KEY UPDATE
+# assignments left to right, so columns must not read each other there.
+# Raising the record keeps the one it beats in prev_longest(_date), so an
+# undo the same day can put it back exactly.
+# args: user_id, day; user_id; yesterday; user_id, day, day
+_STREAK_BUMP = """
+SELECT COALESCE(MAX(tasks_done), 0) INTO @day_done
+  FROM user_daily_stats WHERE user_id=%s AND stat_date=%s;
+SELECT COALESCE(MAX(current_streak), 0), MAX(last_active_date),
+       COALESCE(MAX(longest_streak), 0), MAX(longest_date)
+  INTO @cur, @last, @longest, @longest_date
+  FROM user_streaks WHERE user_id=%s FOR UPDATE;
+SET @bump := @new AND @day_done = 1;
+SET @cur := IF(@bump, IF(@last = %s, @cur + 1, 1), @cur);
+SET @raised := @bump AND @cur > @longest;
+INSERT INTO user_streaks (user_id, current_streak, longest_streak, last_active_date, longest_date,
+                          prev_longest, prev_longest_date)
+  SELECT %s, @cur, GREATEST(@longest, @cur), %s, %s, @longest, @longest_date FROM DUAL WHERE @bump
+  ON DUPLICATE KEY UPDATE
+    current_streak = VALUES(current_streak),
+    longest_streak = VALUES(longest_streak),
+    last_active_date = VALUES(last_active_date),
+    prev_longest = IF(@raised, @longest, prev_longest),
+    prev_longest_date = IF(@raised, @longest_date, prev_longest_date),
+    longest_date = IF(@raised, VALUES(longest_date), longest_date);
+"""
+
+# Undoing the day's last task gives the day back: the streak ends yesterday
+# again (or is gone if it started today), and a record set today goes back
+# to the one it beat. Column order matters here (see above): each one reads
+# only itself or columns assigned after it.
+# args: user_id, day; day, day, yesterday, user_id, day
+_STREAK_DROP = """
+SELECT COALESCE(MAX(tasks_done), 0) INTO @day_done
+  FROM user_daily_stats WHERE user_id=%s AND stat_date=%s;
+UPDATE user_streaks SET
+    longest_streak = IF(longest_date = %s, prev_longest, longest_streak),
+    longest_date = IF(longest_date = %s, prev_longest_date, longest_date),
+    last_active_date = IF(current_streak > 1, %s, NULL),
+    current_streak = IF(current_streak > 1, current_streak - 1, 0)
+  WHERE user_id=%s AND last_active_date = %s AND @removed > 0 AND @day_done = 0;
+"""
+
+
+# args: user_id, task_id, day, leaves; leaves; user_id; user_id, day;
+#       _STREAK_BUMP; user_id
+_COMPLETE_TASK = """
+START TRANSACTION;
+INSERT IGNORE INTO user_task_log (user_id, task_id, task_date, awarded_plants)
+  VALUES (%s, %s, %s, %s);
+SET @new := ROW_COUNT() > 0;
+SET @awarded := IF(@new, %s, 0);
+INSERT INTO user_wallet (user_id, leaves, plants, beans_lifetime)
+  VALUES (%s, @awarded, 0, 0)
+  ON DUPLICATE KEY UPDATE leaves = leaves + VALUES(leaves);
+INSERT INTO user_daily_stats (user_id, stat_date, tasks_done, leaves_earned, bonus_plants)
+  SELECT %s, %s, 1, @awarded, 0 FROM DUAL WHERE @new
+  ON DUPLICATE KEY UPDATE
+    tasks_done = tasks_done + 1,
+    leaves_earned = leaves_earned + VALUES(leaves_earned);
+""" + _STREAK_BUMP + """
+COMMIT;
+""" + _WALLET_AFTER.format(extra="@awarded AS awarded,")
+
+# args: user_id, task_id, day; user_id, task_id, day; user_id; user_id, day;
+#       _STREAK_DROP; user_id
+_UNDO_TASK = """
+START TRANSACTION;
+SELECT COALESCE(SUM(awarded_plants), 0) INTO @awarded
+  FROM user_task_log
+  WHERE user_id=%s AND task_id=%s AND task_date=%s
+  FOR UPDATE;
+DELETE FROM user_task_log WHERE user_id=%s AND task_id=%s AND task_date=%s;
+SET @removed := ROW_COUNT();
+UPDATE user_wallet SET leaves = leaves - LEAST(leaves, @awarded) WHERE user_id=%s;
+UPDATE user_daily_stats SET
+    tasks_done = GREATEST(tasks_done, 1) - 1,
+    leaves_earned = leaves_earned - LEAST(leaves_earned, @awarded)
+  WHERE user_id=%s AND stat_date=%s AND @removed > 0;
+""" + _STREAK_DROP + """
+COMMIT;
+""" + _WALLET_AFTER.format(extra="@awarded AS awarded,")
+
+# args: user_id, day; user_id, day; user_id, day, plants, required; plants;
+#       user_id; user_id, day; user_id
+_CLAIM_BONUS = """
+START TRANSACTION;
+SELECT COUNT(*) INTO @claimed FROM user_daily_bonus WHERE user_id=%s AND bonus_date=%s;
+SELECT COUNT(*) INTO @done FROM user_task_log WHERE user_id=%s AND task_date=%s;
+INSERT IGNORE INTO user_daily_bonus (user_id, bonus_date, awarded_plants)
+  SELECT %s, %s, %s FROM DUAL WHERE @done >= %s;
+SET @bonus := IF(ROW_COUNT() > 0, %s, 0);
+INSERT INTO user_wallet (user_id, leaves, plants, beans_lifetime)
+  VALUES (%s, 0, @bonus, 0)
+  ON DUPLICATE KEY UPDATE plants = plants + VALUES(plants);
+INSERT INTO user_daily_stats (user_id, stat_date, tasks_done, leaves_earned, bonus_plants)
+  SELECT %s, %s, 0, 0, @bonus FROM DUAL WHERE @bonus > 0
+  ON DUPLICATE KEY UPDATE bonus_plants = bonus_plants + VALUES(bonus_plants);
+COMMIT;
+""" + _WALLET_AFTER.format(
+    extra="@bonus AS awarded, @claimed AS claimed, @done AS done_count,")
+
+# {currency} is one of CURRENCIES
+# args: user_id, sticker_id, day; cost, user_id, cost; cost; user_id, sticker_id; user_id
+_REDEEM_STICKER = """
+START TRANSACTION;
+INSERT IGNORE INTO user_stickers (user_id, sticker_id, acquired_at) VALUES (%s, %s, %s);
+SET @granted := ROW_COUNT();
+UPDATE user_wallet SET {currency} = {currency} - %s
+  WHERE user_id=%s AND @granted > 0 AND {currency} >= %s;
+SET @paid := IF(%s > 0, ROW_COUNT(), @granted);
+DELETE FROM user_stickers
+  WHERE user_id=%s AND sticker_id=%s AND @granted > 0 AND @paid = 0;
+COMMIT;
+""" + _WALLET_AFTER.format(extra="@granted AS granted, @paid AS paid,")
+
+
+def complete_task(cur, user_id, task_id, day, leaves):
+    """Log task_id as done on `day` and pay `leaves` once. Re-ticks pay 0."""
+    day = str(day)
+    args = (user_id, task_id, day, leaves, leaves, user_id,
+            user_id, day,
+            user_id, day, user_id, _yesterday(day), user_id, day, day,
+            user_id)
+    row = _batch(cur, _COMPLETE_TASK, args)[0]
+    return {"awarded": int(row.get("awarded") or 0), **_balances(row)}
+
+
+def undo_task(cur, user_id, task_id, day):
+    """Remove today's log row (if any) and take back what it paid."""
+    day = str(day)
+    args = (user_id, task_id, day, user_id, task_id, day, user_id,
+            user_id, day,
+            user_id, day, day, day, _yesterday(day), user_id, day,
+            user_id)
+    row = _batch(cur, _UNDO_TASK, args)[0]
+    return {"awarded": int(row.get("awarded") or 0), **_balances(row)}
+
+
+def claim_bonus(cur, user_id, day, required, plants):
+    """Pay the all-done bonus once per day if `required` tasks are logged.
+
+    Returns awarded (0 when refused) plus already_claimed / done_count so
+    the caller can explain a refusal.
+    """
+    args = (user_id, day, user_id, day,
+            user_id, day, plants, required, plants,
+            user_id, user_id, day,
+            user_id)
+    row = _batch(cur, _CLAIM_BONUS, args)[0]
+    awarded = int(row.get("awarded") or 0)
+    return {
+        "awarded": awarded,
+        # a concurrent claim can win between our two reads; either way it's taken
+        "already_claimed": int(row.get("claimed") or 0) > 0 or (
+            awarded == 0 and int(row.get("done_count") or 0) >= required),
+        "done_count": int(row.get("done_count") or 0),
+        **_balances(row),
+    }
+
+
+def redeem_sticker(cur, user_id, sticker_id, currency, cost, day):
+    """Buy a sticker: grant it and charge `cost` from `currency` atomically.
+
+    The grant goes first so the unique key serialises concurrent buys of the
+    same sticker; the charge is a conditional UPDATE, and if it could not be
+    paid the grant is undone inside the same transaction. (A zero-cost
+    UPDATE changes no rows, hence the cost > 0 guard on @paid.)
+
+    Returns status "ok", "already_owned" or "insufficient" plus balances.
+    """
+    if currency not in CURRENCIES:
+        raise ValueError(f"unknown currency {currency!r}")
+    args = (user_id, sticker_id, day,
+            cost, user_id, cost,
+            cost,
+            user_id, sticker_id,
+            user_id)
+    row = _batch(cur, _REDEEM_STICKER.format(currency=currency), args)[0]
+    if not int(row.get("granted") or 0):
+        status = "already_owned"
+    elif not int(row.get("paid") or 0):
+        status = "insufficient"
+    else:
+        status = "ok"
+    return {"status": status, **_balances(row)}